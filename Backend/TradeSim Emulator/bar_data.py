@@ -0,0 +1,189 @@
+"""
+Bar data helpers shared by the backtesting code.
+
+Long ranges are loaded into ``BarArray``, which preallocates one typed array per
+requested column and fills it in place as MT5 chunks arrive, instead of keeping
+every MT5 field and concatenating chunk DataFrames.
+
+Multi-timeframe support works from a single load of the finest timeframe:
+higher timeframes are aggregated locally with vectorized OHLC reductions, and
+values computed on them are mapped back onto execution bars using only higher
+timeframe bars that had already closed (no lookahead).
+"""
+import math
+from datetime import datetime, timedelta
+from typing import Dict, Sequence
+
+import MetaTrader5 as mt5
+import numpy as np
+import pandas as pd
+
+# MT5 timeframe of each supported bar size in minutes
+TIMEFRAMES = {
+    1: mt5.TIMEFRAME_M1,
+    5: mt5.TIMEFRAME_M5,
+    15: mt5.TIMEFRAME_M15,
+    30: mt5.TIMEFRAME_M30,
+    60: mt5.TIMEFRAME_H1,
+    240: mt5.TIMEFRAME_H4,
+    1440: mt5.TIMEFRAME_D1
+}
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+VOLUME_COLUMNS = ('tick_volume', 'spread', 'real_volume')
+
+
+def data_source() -> str:
+    """Trade server of the logged-in MT5 account; bars of the same symbol differ between servers."""
+    account = mt5.account_info()
+    return account.server if account is not None else ''
+
+
+def epoch_seconds(index: pd.DatetimeIndex) -> np.ndarray:
+    return index.values.astype('datetime64[s]').astype(np.int64)
+
+
+def _to_epoch(value: datetime) -> int:
+    """Epoch seconds; naive datetimes are UTC, matching MT5 bar times."""
+    if value.tzinfo is None:
+        return int((value - datetime(1970, 1, 1)).total_seconds())
+    return int(value.timestamp())
+
+
+def resample_ohlc(df: pd.DataFrame, target_minutes: int) -> pd.DataFrame:
+    """
+    Aggregate time-indexed bars into ``target_minutes`` buckets.
+
+    Buckets are aligned to multiples of the target length since the epoch, which
+    matches MT5's own bar boundaries (H4 and D1 start at server midnight). The
+    result is indexed by bucket open time, like MT5 rates. Only columns present
+    in ``df`` are aggregated: open=first, high=max, low=min, close=last, volumes=sum.
+    """
+    if df.empty:
+        return df.copy()
+
+    seconds = epoch_seconds(df.index)
+    buckets = seconds // (target_minutes * 60)
+    # Bars are time-ordered, so each bucket is a contiguous run
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+
+    aggregated: Dict[str, np.ndarray] = {}
+    for column in df.columns:
+        values = df[column].to_numpy()
+        if column == 'open':
+            aggregated[column] = values[starts]
+        elif column == 'high':
+            aggregated[column] = np.maximum.reduceat(values, starts)
+        elif column == 'low':
+            aggregated[column] = np.minimum.reduceat(values, starts)
+        elif column in ('tick_volume', 'real_volume'):
+            aggregated[column] = np.add.reduceat(values, starts)
+        else:
+            # close, spread and anything else: last value in the bucket
+            aggregated[column] = values[ends]
+
+    index = pd.to_datetime(buckets[starts] * target_minutes * 60, unit='s')
+    return pd.DataFrame(aggregated, index=pd.DatetimeIndex(index, name=df.index.name))
+
+
+def align_to_execution(series: pd.Series, series_minutes: int,
+                       execution_index: pd.DatetimeIndex, execution_minutes: int) -> pd.Series:
+    """
+    Map values computed on ``series_minutes`` bars onto execution bars.
+
+    Each execution bar (stamped with its open time) acts at its close, so it sees
+    the value of the latest analysis bar whose close is at or before that moment.
+    A still-forming analysis bar is never used.
+    """
+    value_ready = epoch_seconds(series.index) + series_minutes * 60
+    decision_time = epoch_seconds(execution_index) + execution_minutes * 60
+    latest = np.searchsorted(value_ready, decision_time, side='right') - 1
+
+    values = np.full(len(execution_index), np.nan)
+    available = latest >= 0
+    values[available] = series.to_numpy()[latest[available]]
+    return pd.Series(values, index=execution_index, name=series.name)
+
+
+class BarArray:
+    """
+    Fixed-capacity columnar bar storage.
+
+    Times are kept as int64 epoch seconds; price columns use ``price_dtype``
+    (float32 halves their footprint, which is enough for indicator work) and
+    volume columns stay int64. Capacity doubles if a range holds more bars than
+    estimated, so appends never concatenate.
+    """
+
+    def __init__(self, capacity: int, columns: Sequence[str] = ('close',), price_dtype=np.float64):
+        unknown = [c for c in columns if c not in PRICE_COLUMNS + VOLUME_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown bar columns: {unknown}")
+        self.columns = tuple(columns)
+        self.price_dtype = np.dtype(price_dtype)
+        self.size = 0
+        capacity = max(int(capacity), 1)
+        self.time = np.empty(capacity, dtype=np.int64)
+        self.values = {
+            c: np.empty(capacity, dtype=self.price_dtype if c in PRICE_COLUMNS else np.int64)
+            for c in self.columns
+        }
+
+    @property
+    def capacity(self) -> int:
+        return len(self.time)
+
+    @property
+    def nbytes(self) -> int:
+        return self.time[:self.size].nbytes + sum(v[:self.size].nbytes for v in self.values.values())
+
+    def _grow(self, needed: int):
+        capacity = max(needed, self.capacity * 2)
+        self.time = np.resize(self.time, capacity)
+        self.values = {c: np.resize(v, capacity) for c, v in self.values.items()}
+
+    def append(self, rates: np.ndarray):
+        """Copy the requested fields of an MT5 rates array in after the last stored bar."""
+        n = len(rates)
+        if n == 0:
+            return
+        if self.size + n > self.capacity:
+            self._grow(self.size + n)
+        end = self.size + n
+        self.time[self.size:end] = rates['time']
+        for column, target in self.values.items():
+            target[self.size:end] = rates[column]
+        self.size = end
+
+    def to_frame(self) -> pd.DataFrame:
+        """DataFrame indexed by bar open time, backed by the stored arrays (no column copies)."""
+        index = pd.DatetimeIndex(pd.to_datetime(self.time[:self.size], unit='s'), name='time')
+        return pd.DataFrame({c: v[:self.size] for c, v in self.values.items()}, index=index, copy=False)
+
+
+def load_bars(symbol: str, timeframe_mt5: int, timeframe_minutes: int, start: datetime, end: datetime,
+              columns: Sequence[str] = ('close',), price_dtype=np.float64,
+              chunk_bars: int = 10000) -> BarArray:
+    """
+    Load bars for [start, end] into a BarArray sized from the range.
+
+    ``copy_rates_range`` includes both ends of each request, so the bar at a chunk
+    boundary is dropped from the earlier chunk and only stored once.
+    """
+    bar = timedelta(minutes=timeframe_minutes)
+    bars = BarArray(math.ceil((end - start) / bar) + 1, columns, price_dtype)
+    current = start
+
+    while current < end:
+        chunk_end = min(current + bar * chunk_bars, end)
+        rates = mt5.copy_rates_range(symbol, timeframe_mt5, current, chunk_end)
+        if rates is None:
+            raise ValueError(f"Failed to fetch data for {symbol}")
+
+        if chunk_end < end and len(rates):
+            rates = rates[rates['time'] < _to_epoch(chunk_end)]
+        bars.append(rates)
+        current = chunk_end
+
+    return bars
@@ -0,0 +1,11 @@
+"""
+Offline benchmark suite for the TradeSim backend.
+
+The real MetaTrader5 package only works against a running Windows terminal,
+so everything in here runs against ``benchmarks.fake_mt5``, a drop-in module
+that serves deterministic synthetic bars, ticks and a simulated broker.
+
+Usage (from the ``TradeSim Emulator`` directory):
+    python -m benchmarks.run_benchmarks --save baseline
+    python -m benchmarks.run_benchmarks --compare baseline
+"""
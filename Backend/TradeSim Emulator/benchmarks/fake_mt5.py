@@ -0,0 +1,528 @@
+"""
+Drop-in fake of the ``MetaTrader5`` package for offline benchmarking.
+
+Bars are generated per (symbol, timeframe) on a fixed grid starting at
+2000-01-01 UTC. Every symbol's log-returns load on a shared market factor with
+a slowly oscillating weight, so rolling correlations between any two symbols
+drift through positive and negative regimes the way real FX crosses do.
+Generation is block based and seeded per block, which makes any bar range
+reproducible without generating the history before it.
+
+Ticks are derived from the M1 bars, and ``order_send``/``positions_get`` are
+backed by a small in-memory broker that marks positions to the fake ticks.
+
+Call ``install()`` before importing any backend module:
+
+    from benchmarks import fake_mt5
+    fake_mt5.install()
+    import mt5_api
+"""
+import sys
+import time as _time
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import count
+
+import numpy as np
+
+__version__ = "5.0.0-fake"
+
+# ---------------------------------------------------------------------------
+# Constants (values match the real package)
+# ---------------------------------------------------------------------------
+TIMEFRAME_M1 = 1
+TIMEFRAME_M5 = 5
+TIMEFRAME_M15 = 15
+TIMEFRAME_M30 = 30
+TIMEFRAME_H1 = 16385
+TIMEFRAME_H4 = 16388
+TIMEFRAME_D1 = 16408
+
+COPY_TICKS_ALL = -1
+COPY_TICKS_INFO = 1
+COPY_TICKS_TRADE = 2
+
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+
+TRADE_ACTION_DEAL = 1
+
+ORDER_FILLING_FOK = 0
+ORDER_FILLING_IOC = 1
+ORDER_FILLING_RETURN = 2
+
+ORDER_TIME_GTC = 0
+
+TRADE_RETCODE_DONE = 10009
+TRADE_RETCODE_INVALID = 10013
+TRADE_RETCODE_POSITION_CLOSED = 10036
+
+_TIMEFRAME_MINUTES = {
+    TIMEFRAME_M1: 1,
+    TIMEFRAME_M5: 5,
+    TIMEFRAME_M15: 15,
+    TIMEFRAME_M30: 30,
+    TIMEFRAME_H1: 60,
+    TIMEFRAME_H4: 240,
+    TIMEFRAME_D1: 1440,
+}
+
+RATES_DTYPE = np.dtype([
+    ('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+    ('close', '<f8'), ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8'),
+])
+
+TICKS_DTYPE = np.dtype([
+    ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'),
+    ('volume', '<u8'), ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+])
+
+# ---------------------------------------------------------------------------
+# Named tuples mirroring the objects returned by the real package
+# ---------------------------------------------------------------------------
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'balance', 'equity', 'margin', 'margin_free', 'currency', 'leverage', 'name', 'server',
+])
+TerminalInfo = namedtuple('TerminalInfo', ['connected', 'trade_allowed', 'name', 'build'])
+SymbolInfo = namedtuple('SymbolInfo', [
+    'name', 'visible', 'select', 'trade_mode', 'digits', 'point', 'spread', 'bid', 'ask',
+    'volume_min', 'volume_max', 'volume_step',
+])
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'time_msc', 'type', 'magic', 'identifier', 'volume',
+    'price_open', 'price_current', 'swap', 'profit', 'symbol', 'comment',
+])
+TradeDeal = namedtuple('TradeDeal', [
+    'ticket', 'order', 'time', 'type', 'entry', 'magic', 'position_id', 'volume',
+    'price', 'profit', 'symbol', 'comment',
+])
+TradeOrder = namedtuple('TradeOrder', [
+    'ticket', 'time_setup', 'type', 'magic', 'position_id', 'volume_initial',
+    'price_open', 'symbol', 'comment',
+])
+OrderSendResult = namedtuple('OrderSendResult', [
+    'retcode', 'deal', 'order', 'volume', 'price', 'bid', 'ask', 'comment', 'request_id',
+])
+
+# ---------------------------------------------------------------------------
+# Synthetic market
+# ---------------------------------------------------------------------------
+SEED = 20240101
+EPOCH = 946684800  # 2000-01-01 00:00:00 UTC
+BLOCK = 4096  # bars generated per seeded block
+MAX_BLOCKS = 1 << 16
+BASE_VOLATILITY = 0.0005  # M1 log-return standard deviation
+REGIME_PERIOD = 5000  # bars per full swing of a symbol's factor loading
+DEFAULT_SYMBOLS = (
+    'EURUSD', 'GBPUSD', 'AUDUSD', 'NZDUSD', 'USDCAD', 'USDCHF', 'USDJPY',
+    'EURGBP', 'EURAUD', 'EURNZD', 'EURCAD', 'EURCHF', 'EURJPY',
+    'GBPAUD', 'GBPNZD', 'GBPCAD', 'GBPCHF', 'GBPJPY',
+    'AUDNZD', 'AUDCAD', 'AUDCHF', 'AUDJPY',
+    'NZDCAD', 'NZDCHF', 'NZDJPY', 'CADCHF', 'CADJPY', 'CHFJPY',
+)
+
+
+def _symbol_seed(symbol: str) -> int:
+    return zlib.crc32(symbol.encode('utf-8'))
+
+
+def _pip_size(symbol: str) -> float:
+    return 0.01 if symbol.endswith('JPY') else 0.0001
+
+
+def _base_price(symbol: str) -> float:
+    if symbol.endswith('JPY'):
+        return 80.0 + _symbol_seed(symbol) % 80
+    return 0.6 + (_symbol_seed(symbol) % 90) / 100.0
+
+
+def _minutes(timeframe: int) -> int:
+    minutes = _TIMEFRAME_MINUTES.get(timeframe)
+    if minutes is None:
+        raise ValueError(f"Unsupported timeframe constant: {timeframe}")
+    return minutes
+
+
+def _loading(symbol: str, bar_index: np.ndarray) -> np.ndarray:
+    """Time-varying weight of the symbol on the common factor, in [-0.25, 0.95]."""
+    phase = (_symbol_seed(symbol) % 628) / 100.0
+    return 0.35 + 0.6 * np.sin(2 * np.pi * bar_index / REGIME_PERIOD + phase)
+
+
+@lru_cache(maxsize=256)
+def _block_levels(symbol: str, minutes: int) -> np.ndarray:
+    """Log-price level at the start of every block (mean-reverting AR(1))."""
+    factor = np.random.default_rng([SEED, 0, minutes, 1]).standard_normal(MAX_BLOCKS)
+    own = np.random.default_rng([SEED, _symbol_seed(symbol), minutes, 1]).standard_normal(MAX_BLOCKS)
+    a = _loading(symbol, np.arange(MAX_BLOCKS) * BLOCK + BLOCK // 2)
+    steps = 0.03 * (a * factor + np.sqrt(1 - a ** 2) * own)
+    levels = np.empty(MAX_BLOCKS + 1)
+    levels[0] = 0.0
+    for b in range(MAX_BLOCKS):
+        levels[b + 1] = 0.95 * levels[b] + steps[b]
+    return levels
+
+
+@lru_cache(maxsize=1024)
+def _block_closes(symbol: str, minutes: int, block: int) -> np.ndarray:
+    """Log close prices for one block, bridged between the block levels."""
+    sigma = BASE_VOLATILITY * np.sqrt(minutes)
+    factor = np.random.default_rng([SEED, 0, minutes, 2, block]).standard_normal(BLOCK)
+    own = np.random.default_rng([SEED, _symbol_seed(symbol), minutes, 2, block]).standard_normal(BLOCK)
+    a = _loading(symbol, np.arange(block * BLOCK, (block + 1) * BLOCK))
+    returns = sigma * (a * factor + np.sqrt(1 - a ** 2) * own)
+    levels = _block_levels(symbol, minutes)
+    start, end = levels[block], levels[block + 1]
+    path = np.cumsum(returns)
+    path -= np.arange(1, BLOCK + 1) / BLOCK * (path[-1] - (end - start))
+    return start + path
+
+
+def _log_closes(symbol: str, minutes: int, first: int, last: int) -> np.ndarray:
+    """Log close prices for bar indices [first, last)."""
+    out = np.empty(last - first)
+    pos = 0
+    for block in range(first // BLOCK, (last - 1) // BLOCK + 1):
+        closes = _block_closes(symbol, minutes, block)
+        lo = max(first - block * BLOCK, 0)
+        hi = min(last - block * BLOCK, BLOCK)
+        out[pos:pos + hi - lo] = closes[lo:hi]
+        pos += hi - lo
+    return out
+
+
+def _wicks(symbol: str, minutes: int, first: int, last: int) -> np.ndarray:
+    """Deterministic non-negative wick sizes, keyed on bar index."""
+    idx = np.arange(first, last, dtype=np.uint64)
+    h = (idx * np.uint64(2654435761) + np.uint64(_symbol_seed(symbol) + minutes)) % np.uint64(1000)
+    return h.astype(np.float64) / 1000.0
+
+
+def generate_rates(symbol: str, timeframe: int, first: int, last: int) -> np.ndarray:
+    """Structured MT5 rates array for bar indices [first, last)."""
+    minutes = _minutes(timeframe)
+    first = max(first, 0)
+    if last <= first:
+        return np.empty(0, dtype=RATES_DTYPE)
+    sigma = BASE_VOLATILITY * np.sqrt(minutes)
+    base = _base_price(symbol)
+    closes = base * np.exp(_log_closes(symbol, minutes, max(first - 1, 0), last))
+    if first == 0:
+        closes = np.concatenate(([base], closes))
+    opens, closes = closes[:-1], closes[1:]
+    wick = _wicks(symbol, minutes, first, last) * sigma * closes
+    digits = 3 if symbol.endswith('JPY') else 5
+
+    rates = np.empty(last - first, dtype=RATES_DTYPE)
+    rates['time'] = EPOCH + np.arange(first, last, dtype=np.int64) * minutes * 60
+    rates['open'] = np.round(opens, digits)
+    rates['close'] = np.round(closes, digits)
+    rates['high'] = np.round(np.maximum(opens, closes) + wick, digits)
+    rates['low'] = np.round(np.minimum(opens, closes) - wick, digits)
+    rates['tick_volume'] = 20 + (wick / (sigma * closes) * 200).astype(np.uint64)
+    rates['spread'] = 8 if digits == 5 else 12
+    rates['real_volume'] = 0
+    return rates
+
+
+# ---------------------------------------------------------------------------
+# Module state: clock, broker, configuration
+# ---------------------------------------------------------------------------
+class _State:
+    def __init__(self):
+        self.now = None  # None means follow the wall clock
+        self.ticks_per_minute = 20
+        self.symbols = list(DEFAULT_SYMBOLS)
+        self.balance = 10000.0
+        self.positions = {}
+        self.deals = []
+        self.orders = []
+        self.tickets = count(1000001)
+        self.initialized = False
+
+
+_state = _State()
+
+
+def reset(now=None, ticks_per_minute: int = 20, balance: float = 10000.0, symbols=None):
+    """Reset broker state and optionally pin the clock."""
+    global _state
+    _state = _State()
+    _state.now = None if now is None else _to_ts(now)
+    _state.ticks_per_minute = ticks_per_minute
+    _state.balance = balance
+    if symbols is not None:
+        _state.symbols = list(symbols)
+
+
+def set_time(now) -> None:
+    """Pin the fake clock; positions and "current" bars follow it."""
+    _state.now = None if now is None else _to_ts(now)
+
+
+def current_time() -> int:
+    return int(_time.time()) if _state.now is None else int(_state.now)
+
+
+def install():
+    """Register this module as ``MetaTrader5`` so backend imports pick it up."""
+    sys.modules['MetaTrader5'] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+def _to_ts(value) -> float:
+    """Convert MT5 date arguments to epoch seconds. Naive datetimes are UTC."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if hasattr(value, 'timestamp'):
+        return value.timestamp()
+    return float(value)
+
+
+def _bar_index_floor(ts: float, minutes: int) -> int:
+    return int((ts - EPOCH) // (minutes * 60))
+
+
+def _bar_index_ceil(ts: float, minutes: int) -> int:
+    return int(-((EPOCH - ts) // (minutes * 60)))
+
+
+# ---------------------------------------------------------------------------
+# Terminal / account API
+# ---------------------------------------------------------------------------
+def initialize(*args, **kwargs) -> bool:
+    _state.initialized = True
+    return True
+
+
+def login(account, password=None, server=None, timeout=None) -> bool:
+    return True
+
+
+def shutdown() -> None:
+    _state.initialized = False
+
+
+def last_error():
+    return (1, 'Success')
+
+
+def terminal_info():
+    return TerminalInfo(connected=True, trade_allowed=True, name='Fake MetaTrader 5', build=4874)
+
+
+def account_info():
+    profit = sum(p.profit for p in positions_get())
+    return AccountInfo(
+        login=12345678, balance=_state.balance, equity=_state.balance + profit, margin=0.0,
+        margin_free=_state.balance + profit, currency='USD', leverage=100,
+        name='Benchmark Account', server='Fake-Server',
+    )
+
+
+def symbol_info(symbol: str):
+    if symbol not in _state.symbols:
+        return None
+    tick = symbol_info_tick(symbol)
+    digits = 3 if symbol.endswith('JPY') else 5
+    return SymbolInfo(
+        name=symbol, visible=True, select=True, trade_mode=4, digits=digits,
+        point=10.0 ** -digits, spread=8 if digits == 5 else 12, bid=tick.bid, ask=tick.ask,
+        volume_min=0.01, volume_max=100.0, volume_step=0.01,
+    )
+
+
+def symbols_get(group=None):
+    return tuple(symbol_info(s) for s in _state.symbols)
+
+
+# ---------------------------------------------------------------------------
+# Market data API
+# ---------------------------------------------------------------------------
+def copy_rates_range(symbol, timeframe, date_from, date_to):
+    """Bars whose open time lies in [date_from, date_to], clipped to the clock."""
+    if symbol not in _state.symbols:
+        return None
+    minutes = _minutes(timeframe)
+    end_ts = min(_to_ts(date_to), current_time())
+    first = _bar_index_ceil(_to_ts(date_from), minutes)
+    last = _bar_index_floor(end_ts, minutes) + 1
+    return generate_rates(symbol, timeframe, first, last)
+
+
+def copy_rates_from(symbol, timeframe, date_from, count):
+    """``count`` bars ending at the last bar opened at or before ``date_from``."""
+    if symbol not in _state.symbols:
+        return None
+    minutes = _minutes(timeframe)
+    last = _bar_index_floor(min(_to_ts(date_from), current_time()), minutes) + 1
+    return generate_rates(symbol, timeframe, last - int(count), last)
+
+
+def copy_rates_from_pos(symbol, timeframe, start_pos, count):
+    """``count`` bars counting back from position ``start_pos`` (0 = forming bar)."""
+    if symbol not in _state.symbols:
+        return None
+    minutes = _minutes(timeframe)
+    last = _bar_index_floor(current_time(), minutes) + 1 - int(start_pos)
+    return generate_rates(symbol, timeframe, last - int(count), last)
+
+
+def _ticks_for_minutes(symbol: str, first_minute: int, last_minute: int) -> np.ndarray:
+    """Ticks interpolated along the M1 bars [first_minute, last_minute)."""
+    n = _state.ticks_per_minute
+    bars = generate_rates(symbol, TIMEFRAME_M1, first_minute, last_minute)
+    if len(bars) == 0:
+        return np.empty(0, dtype=TICKS_DTYPE)
+    frac = np.arange(n) / n
+    mids = bars['open'][:, None] + (bars['close'] - bars['open'])[:, None] * frac[None, :]
+    jitter = np.sin(np.arange(len(bars) * n).reshape(len(bars), n) * 1.7) * (bars['high'] - bars['low'])[:, None] * 0.25
+    mids = (mids + jitter).ravel()
+    half_spread = bars['spread'].repeat(n) * _pip_size(symbol) / 20.0
+
+    ticks = np.empty(len(bars) * n, dtype=TICKS_DTYPE)
+    time_msc = (bars['time'] * 1000)[:, None] + (np.arange(n) * (60000 // n))[None, :]
+    ticks['time_msc'] = time_msc.ravel()
+    ticks['time'] = ticks['time_msc'] // 1000
+    ticks['bid'] = mids - half_spread
+    ticks['ask'] = mids + half_spread
+    ticks['last'] = 0.0
+    ticks['volume'] = 0
+    ticks['flags'] = 6  # TICK_FLAG_BID | TICK_FLAG_ASK
+    ticks['volume_real'] = 0.0
+    return ticks
+
+
+def copy_ticks_range(symbol, date_from, date_to, flags=COPY_TICKS_ALL):
+    if symbol not in _state.symbols:
+        return None
+    start_ms = int(_to_ts(date_from) * 1000)
+    end_ms = int(min(_to_ts(date_to), current_time()) * 1000)
+    ticks = _ticks_for_minutes(symbol, _bar_index_floor(start_ms / 1000, 1), _bar_index_floor(end_ms / 1000, 1) + 1)
+    lo = np.searchsorted(ticks['time_msc'], start_ms, side='left')
+    hi = np.searchsorted(ticks['time_msc'], end_ms, side='right')
+    return ticks[lo:hi]
+
+
+def copy_ticks_from(symbol, date_from, count, flags=COPY_TICKS_ALL):
+    if symbol not in _state.symbols:
+        return None
+    start_ms = int(_to_ts(date_from) * 1000)
+    first_minute = _bar_index_floor(start_ms / 1000, 1)
+    last_minute = min(first_minute + int(count) // _state.ticks_per_minute + 2,
+                      _bar_index_floor(current_time(), 1) + 1)
+    ticks = _ticks_for_minutes(symbol, first_minute, last_minute)
+    ticks = ticks[(ticks['time_msc'] >= start_ms) & (ticks['time_msc'] <= current_time() * 1000)]
+    return ticks[:int(count)]
+
+
+def symbol_info_tick(symbol):
+    if symbol not in _state.symbols:
+        return None
+    now = current_time()
+    minute = _bar_index_floor(now, 1)
+    ticks = _ticks_for_minutes(symbol, minute, minute + 1)
+    t = ticks[min(int((now % 60) * _state.ticks_per_minute // 60), len(ticks) - 1)]
+    return Tick(int(t['time']), float(t['bid']), float(t['ask']), 0.0, 0, int(t['time_msc']), 6, 0.0)
+
+
+# ---------------------------------------------------------------------------
+# Simulated broker
+# ---------------------------------------------------------------------------
+def _position_profit(symbol: str, position_type: int, volume: float, price_open: float, price_current: float) -> float:
+    # Same pip-value model as PairedTradingBacktester: $10 per pip per standard lot.
+    diff = price_current - price_open if position_type == ORDER_TYPE_BUY else price_open - price_current
+    return diff / _pip_size(symbol) * 10.0 * volume
+
+
+def _mark(position):
+    tick = symbol_info_tick(position.symbol)
+    price = tick.bid if position.type == ORDER_TYPE_BUY else tick.ask
+    return position._replace(
+        price_current=price,
+        profit=_position_profit(position.symbol, position.type, position.volume, position.price_open, price),
+    )
+
+
+def positions_get(symbol=None, group=None, ticket=None, magic=None):
+    positions = [_mark(p) for p in _state.positions.values()]
+    if symbol is not None:
+        positions = [p for p in positions if p.symbol == symbol]
+    if ticket is not None:
+        positions = [p for p in positions if p.ticket == ticket]
+    if magic is not None:
+        positions = [p for p in positions if p.magic == magic]
+    return tuple(positions)
+
+
+def positions_total() -> int:
+    return len(_state.positions)
+
+
+def orders_get(symbol=None, group=None, ticket=None):
+    return ()
+
+
+def history_deals_get(date_from=None, date_to=None, **kwargs):
+    return tuple(_state.deals)
+
+
+def history_orders_get(date_from=None, date_to=None, **kwargs):
+    return tuple(_state.orders)
+
+
+def _result(retcode, request, order=0, deal=0, price=0.0, comment='Request executed'):
+    tick = symbol_info_tick(request.get('symbol')) if request.get('symbol') in _state.symbols else None
+    return OrderSendResult(
+        retcode=retcode, deal=deal, order=order, volume=float(request.get('volume', 0.0)), price=price,
+        bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0, comment=comment, request_id=0,
+    )
+
+
+def order_send(request: dict):
+    """Fill market deals instantly at the current fake bid/ask."""
+    symbol = request.get('symbol')
+    if request.get('action') != TRADE_ACTION_DEAL or symbol not in _state.symbols:
+        return _result(TRADE_RETCODE_INVALID, request, comment='Invalid request')
+
+    tick = symbol_info_tick(symbol)
+    order_type = request.get('type')
+    price = tick.ask if order_type == ORDER_TYPE_BUY else tick.bid
+    now = current_time()
+    order_ticket = next(_state.tickets)
+    deal_ticket = next(_state.tickets)
+
+    if request.get('position'):
+        position = _state.positions.pop(request['position'], None)
+        if position is None:
+            return _result(TRADE_RETCODE_POSITION_CLOSED, request, comment='Position doesn\'t exist')
+        profit = _position_profit(symbol, position.type, position.volume, position.price_open, price)
+        _state.balance += profit
+        position_id = position.ticket
+    else:
+        profit = 0.0
+        position_id = order_ticket
+        _state.positions[order_ticket] = TradePosition(
+            ticket=order_ticket, time=int(now), time_msc=int(now * 1000), type=order_type,
+            magic=int(request.get('magic', 0)), identifier=order_ticket, volume=float(request['volume']),
+            price_open=price, price_current=price, swap=0.0, profit=0.0, symbol=symbol,
+            comment=request.get('comment', ''),
+        )
+
+    _state.orders.append(TradeOrder(
+        ticket=order_ticket, time_setup=int(now), type=order_type, magic=int(request.get('magic', 0)),
+        position_id=position_id, volume_initial=float(request['volume']), price_open=price,
+        symbol=symbol, comment=request.get('comment', ''),
+    ))
+    _state.deals.append(TradeDeal(
+        ticket=deal_ticket, order=order_ticket, time=int(now), type=order_type,
+        entry=1 if request.get('position') else 0, magic=int(request.get('magic', 0)),
+        position_id=position_id, volume=float(request['volume']), price=price, profit=profit,
+        symbol=symbol, comment=request.get('comment', ''),
+    ))
+    return _result(TRADE_RETCODE_DONE, request, order=order_ticket, deal=deal_ticket, price=price)
@@ -0,0 +1,124 @@
+"""
+Run the offline benchmark suites and save or compare JSON baselines.
+
+    python -m benchmarks.run_benchmarks                      # run everything
+    python -m benchmarks.run_benchmarks --suites backtester --sizes 10000 100000
+    python -m benchmarks.run_benchmarks --save v1            # write baselines/v1.json
+    python -m benchmarks.run_benchmarks --compare v1         # exit 1 on regressions
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks import fake_mt5
+
+fake_mt5.install()
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def _metadata() -> dict:
+    import numpy as np
+    import pandas as pd
+
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def _case_key(result: dict) -> str:
+    return f"{result['name']} {json.dumps(result['params'], sort_keys=True)}"
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare median timings against a baseline.
+    Returns (key, baseline_median, current_median, ratio) for every case slower
+    than ``1 + threshold`` times its baseline.
+    """
+    previous = {_case_key(r): r for r in baseline["results"]}
+    regressions = []
+    print(f"\n{'case':<70} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for result in current["results"]:
+        key = _case_key(result)
+        if key not in previous:
+            print(f"{key:<70} {'-':>12} {result['median'] * 1000:>10.2f}ms {'new':>8}")
+            continue
+        old, new = previous[key]["median"], result["median"]
+        ratio = new / old if old > 0 else float("inf")
+        marker = "  <-- regression" if ratio > 1 + threshold else ""
+        print(f"{key:<70} {old * 1000:>10.2f}ms {new * 1000:>10.2f}ms {ratio:>7.2f}x{marker}")
+        if ratio > 1 + threshold:
+            regressions.append((key, old, new, ratio))
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="TradeSim offline benchmarks")
+    parser.add_argument("--suites", nargs="+", help="Suites to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES,
+                        help="Bar counts for the backtester suites")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case")
+    parser.add_argument("--save", metavar="NAME", help="Save results as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against baselines/NAME.json")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed slowdown before a case counts as a regression (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+
+    from benchmarks import suites
+
+    selected = args.suites or list(suites.SUITES)
+    unknown = [name for name in selected if name not in suites.SUITES]
+    if unknown:
+        parser.error(f"Unknown suites: {unknown}. Available: {list(suites.SUITES)}")
+
+    fake_mt5.reset(now=suites.BENCH_NOW)
+    report = {"meta": _metadata(), "config": vars(args), "results": []}
+    for name in selected:
+        print(f"[{name}]")
+        report["results"].extend(suites.SUITES[name](args))
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save}.json")
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved baseline to {path}")
+
+    if args.compare:
+        path = os.path.join(BASELINE_DIR, f"{args.compare}.json")
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+            return 1
+        print("\nNo regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
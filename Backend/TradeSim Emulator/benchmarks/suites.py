@@ -0,0 +1,365 @@
+"""
+Benchmark definitions. Each suite is a function taking the run configuration
+and returning a list of result dicts produced by ``measure``.
+
+``fake_mt5.install()`` must have been called before this module is imported,
+because the backend modules bind ``MetaTrader5`` at import time.
+"""
+import asyncio
+import contextlib
+import io
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks import fake_mt5
+
+import indicator_utils
+import indicator_websocket
+import mt5_api
+import plot_renderer
+
+# Fixed clock so "latest bar" style queries are reproducible between runs.
+BENCH_NOW = datetime(2026, 1, 1)
+BACKTEST_START = datetime(2020, 1, 6)
+
+STRATEGY_DEFAULTS = {
+    "name": "Benchmark",
+    "lotSize": ["0.1", "0.1"],
+    "magicNumber": "777",
+    "tradeComment": "bench",
+    "rsiPeriod": 14,
+    "correlationWindow": 50,
+    "rsiOverbought": 70,
+    "rsiOversold": 30,
+    "entryThreshold": 0.0,
+    "exitThreshold": 0.6,
+    "startingBalance": 10000,
+}
+
+PAIR_COMBINATIONS = [
+    ("GBPUSD", "EURUSD"), ("EURAUD", "EURNZD"), ("AUDJPY", "NZDJPY"),
+    ("AUDUSD", "NZDUSD"), ("EURJPY", "GBPJPY"), ("USDCAD", "USDCHF"),
+    ("EURGBP", "EURCHF"), ("GBPAUD", "GBPNZD"), ("AUDCAD", "NZDCAD"),
+    ("CADJPY", "CHFJPY"),
+]
+
+
+def measure(name: str, fn, repeat: int, params: dict = None, units: int = None, warmup: bool = False) -> dict:
+    """
+    Time ``fn`` ``repeat`` times and summarise.
+
+    Parameters:
+        name: Benchmark identifier, used to match results against baselines
+        fn: Zero-argument callable to time
+        repeat: Number of timed runs
+        params: Parameters identifying this case (bars, clients, ...)
+        units: Work units per run; adds a per-second throughput figure
+        warmup: Run once untimed first
+    """
+    if warmup:
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    median = statistics.median(timings)
+    result = {
+        "name": name,
+        "params": params or {},
+        "repeat": repeat,
+        "min": min(timings),
+        "median": median,
+        "mean": statistics.fmean(timings),
+        "max": max(timings),
+    }
+    if units:
+        result["throughput_per_sec"] = units / median if median > 0 else None
+    print(f"  {name} {json.dumps(params or {})}: median {median * 1000:.2f} ms")
+    return result
+
+
+@contextlib.contextmanager
+def _quiet():
+    """The backend prints a lot; keep benchmark output readable."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+def _backtest_request(pair1: str, pair2: str, bars: int, timeframe: int = 1, **overrides) -> mt5_api.BacktestRequest:
+    fields = dict(STRATEGY_DEFAULTS)
+    fields.update(
+        id=1,
+        currencyPairs=[pair1, pair2],
+        timeFrame=timeframe,
+        startDate=BACKTEST_START,
+        endDate=BACKTEST_START + timedelta(minutes=timeframe * bars),
+    )
+    fields.update(overrides)
+    return mt5_api.BacktestRequest(**fields)
+
+
+def _strategy_params(strategy_id: int, pair1: str, pair2: str, timeframe: int = 15) -> dict:
+    params = dict(STRATEGY_DEFAULTS)
+    params.update(
+        id=strategy_id,
+        currencyPairs=[pair1, pair2],
+        timeFrame=timeframe,
+        magicNumber=str(1000 + strategy_id),
+        cooldownPeriod=24,
+        status="active",
+    )
+    return params
+
+
+def bench_backtester(config) -> list:
+    """Data load + indicators, bar loop, and full run at several bar counts."""
+    results = []
+    for bars in config.sizes:
+        request = _backtest_request("GBPUSD", "EURUSD", bars)
+        holder = {}
+
+        def load():
+            with _quiet():
+                holder["bt"] = mt5_api.PairedTradingBacktester(request)
+
+        def run():
+            with _quiet():
+                mt5_api.PairedTradingBacktester(request).run_backtest()
+
+        results.append(measure("backtester.load", load, config.repeat, {"bars": bars}, units=bars))
+
+        def loop():
+            with _quiet():
+                bt = holder["bt"]
+                bt.active_trades, bt.trades, bt.last_entry_time = [], mt5_api.TradeTable(), None
+                bt.run_backtest()
+
+        results.append(measure("backtester.run_backtest", loop, config.repeat, {"bars": bars}, units=bars))
+        results.append(measure("backtester.total", run, config.repeat, {"bars": bars}, units=bars))
+    return results
+
+
+def bench_tick_backtest(config) -> list:
+    """Tick-mode backtest: streamed, merged ticks with per-tick exit evaluation."""
+    results = []
+    for days in (1, 7):
+        bars = days * 24 * 12
+        request = _backtest_request("GBPUSD", "EURUSD", bars, timeframe=5, tickMode=True)
+        ticks = 2 * bars * 5 * fake_mt5._state.ticks_per_minute
+
+        def run():
+            with _quiet():
+                mt5_api.PairedTradingBacktester(request).run_backtest()
+
+        results.append(measure("backtester.tick_mode", run, config.repeat, {"days": days}, units=ticks))
+    return results
+
+
+def bench_indicators(config) -> list:
+    """Live indicator helpers and the backtester's vectorised indicator pass."""
+    results = []
+    for window in (20, 100, 500):
+        results.append(measure(
+            "indicator_utils.calculate_correlation",
+            lambda: indicator_utils.calculate_correlation("GBPUSD", "EURUSD", window, 15),
+            config.repeat, {"window": window},
+        ))
+        results.append(measure(
+            "indicator_utils.calculate_rsi",
+            lambda: indicator_utils.calculate_rsi("GBPUSD", window, 15),
+            config.repeat, {"period": window},
+        ))
+    results.append(measure(
+        "indicator_utils.get_tick_data",
+        lambda: indicator_utils.get_tick_data("GBPUSD"),
+        config.repeat,
+    ))
+
+    for bars in config.sizes:
+        with _quiet():
+            bt = mt5_api.PairedTradingBacktester(_backtest_request("GBPUSD", "EURUSD", bars))
+        results.append(measure(
+            "backtester.calculate_indicators", bt._calculate_indicators,
+            config.repeat, {"bars": bars}, units=bars,
+        ))
+
+    # analysisTimeframe above the execution timeframe: one M15 load, H4 resampled locally
+    for bars in config.sizes:
+        request = _backtest_request("GBPUSD", "EURUSD", bars, timeframe=15, analysisTimeframe=240)
+
+        def load():
+            with _quiet():
+                mt5_api.PairedTradingBacktester(request)
+
+        results.append(measure(
+            "backtester.load_multi_timeframe", load, config.repeat, {"bars": bars}, units=bars,
+        ))
+    return results
+
+
+def bench_plot_indicators(config) -> list:
+    """The /mt5/plot-indicators endpoint: 30 days of data, indicators and a PNG."""
+    # The endpoint anchors its 30-day window on the wall clock, not on MT5 time.
+    fake_mt5.set_time(None)
+    results = []
+    for timeframe in (60, 15, 5):
+        fields = _strategy_params(1, "GBPUSD", "EURUSD", timeframe)
+        fields.pop("cooldownPeriod")
+        request = mt5_api.IndicatorRequest(**fields)
+
+        def run():
+            with _quiet():
+                asyncio.run(mt5_api.plot_indicators(request))
+
+        results.append(measure("plot_indicators", run, config.repeat, {"timeframe": timeframe}))
+    fake_mt5.set_time(BENCH_NOW)
+    return results
+
+
+def bench_backtest_plots(config) -> list:
+    """The three backtest plots, rendered as /mt5/backtest-results/{id}/plots/{name} does (default size, 100 dpi)."""
+    with _quiet():
+        bt = mt5_api.PairedTradingBacktester(_backtest_request("GBPUSD", "EURUSD", 10_000))
+        results = bt.run_backtest()
+    plot_data = bt.plot_data(results["metrics"])
+    return [
+        measure(f"plot.{name.replace('-', '_')}",
+                lambda render=plot_renderer.RENDERERS[name], figsize=figsize: render(plot_data, figsize, 100),
+                config.repeat, {"trades": len(bt.trades)})
+        for name, figsize in plot_renderer.PLOTS.items()
+    ]
+
+
+def bench_portfolio(config) -> list:
+    """PortfolioBacktester: N strategies on one shared account over a year of M15 bars."""
+    bars = 365 * 24 * 4
+    results = []
+    for strategies in (5, 20):
+        requests = [
+            _backtest_request(*PAIR_COMBINATIONS[k % len(PAIR_COMBINATIONS)], bars, timeframe=15,
+                              id=k, correlationWindow=20 + k)
+            for k in range(strategies)
+        ]
+        with _quiet():
+            data, _ = mt5_api.load_batch_data(requests)
+            backtesters = [mt5_api.PairedTradingBacktester(request, data=pair_data)
+                           for request, pair_data in zip(requests, data)]
+
+        def run():
+            mt5_api.PortfolioBacktester(backtesters, 10000).run()
+
+        results.append(measure(
+            "portfolio.run", run, config.repeat, {"strategies": strategies, "bars": bars},
+            units=strategies * bars,
+        ))
+    return results
+
+
+class _FakeWebSocket:
+    """Serialises like Starlette's ``send_json`` and discards the frame."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_json(self, data, mode: str = "text"):
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+        self.sent += 1
+
+
+def bench_websocket_fanout(config) -> list:
+    """ConnectionManager.broadcast of one indicator frame to N clients."""
+    message = {
+        "timestamp": BENCH_NOW.isoformat(),
+        "correlation": 0.1234,
+        "rsi_values": {"GBPUSD": 55.1, "EURUSD": 44.9},
+        "current_prices": {"GBPUSD": 1.2712, "EURUSD": 1.0841},
+        "thresholds": {"entry": 0.0, "exit": 0.6, "rsi_overbought": 70, "rsi_oversold": 30},
+    }
+    results = []
+    for clients in (1, 10, 100, 1000):
+        manager = indicator_websocket.ConnectionManager()
+        manager.active_connections["bench"] = [_FakeWebSocket() for _ in range(clients)]
+
+        async def fanout(rounds: int = 10):
+            for _ in range(rounds):
+                await manager.broadcast(message, "bench")
+
+        results.append(measure(
+            "websocket.broadcast", lambda: asyncio.run(fanout()), config.repeat,
+            {"clients": clients}, units=clients * 10,
+        ))
+    return results
+
+
+def bench_monitor_loop(config) -> list:
+    """One pass of the StrategyMonitor loop body across N concurrent strategies."""
+    results = []
+    for strategies in (1, 10, 50):
+        async def build():
+            monitors = []
+            for sid in range(strategies):
+                pair1, pair2 = PAIR_COMBINATIONS[sid % len(PAIR_COMBINATIONS)]
+                monitor = mt5_api.StrategyMonitor(sid, _strategy_params(sid, pair1, pair2))
+                await monitor.initialize()
+                monitors.append(monitor)
+            return monitors
+
+        async def sweep(monitors):
+            # One iteration of StrategyMonitor.monitor_trades without the sleep.
+            for monitor in monitors:
+                await monitor.run_iteration()
+
+        with _quiet():
+            fake_mt5.reset(now=BENCH_NOW)
+            monitors = asyncio.run(build())
+
+        def run():
+            with _quiet():
+                asyncio.run(sweep(monitors))
+
+        results.append(measure(
+            "monitor.sweep", run, config.repeat, {"strategies": strategies}, units=strategies,
+        ))
+    return results
+
+
+def bench_replay(config) -> list:
+    """ReplayEngine driving StrategyMonitor over recorded M15 bars on a virtual clock."""
+    import replay_engine
+
+    start = datetime(2025, 6, 2)
+    results = []
+    for days in (3, 14):
+        end = start + timedelta(days=days)
+        bars = {
+            (symbol, 15): fake_mt5.copy_rates_range(
+                symbol, fake_mt5.TIMEFRAME_M15, start - timedelta(minutes=15 * 200), end)
+            for symbol in ("GBPUSD", "EURUSD")
+        }
+        params = _strategy_params(1, "GBPUSD", "EURUSD", 15)
+
+        def run():
+            sim = replay_engine.SimulatedMT5(bars)
+            replay_engine.ReplayEngine(sim, [params], step_seconds=300).run_sync(start, end)
+
+        results.append(measure(
+            "replay.run", run, config.repeat, {"days": days, "step_seconds": 300},
+            units=days * 24 * 12,
+        ))
+    return results
+
+
+SUITES = {
+    "backtester": bench_backtester,
+    "ticks": bench_tick_backtest,
+    "indicators": bench_indicators,
+    "plot_indicators": bench_plot_indicators,
+    "backtest_plots": bench_backtest_plots,
+    "portfolio": bench_portfolio,
+    "websocket": bench_websocket_fanout,
+    "monitor": bench_monitor_loop,
+    "replay": bench_replay,
+}
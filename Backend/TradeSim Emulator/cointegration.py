@@ -0,0 +1,305 @@
+"""
+Rolling hedge ratio and Engle–Granger cointegration of a pair.
+
+Over each window of ``window`` bars, pair1's closes are regressed on pair2's:
+
+    hedge regression:  y_t = alpha + beta * x_t                (OLS on the window's closes)
+    Dickey-Fuller:     e_t - e_{t-1} = gamma * e_{t-1}         (on the residuals e = y - alpha - beta * x)
+
+``beta`` is the hedge ratio; the t-statistic of ``gamma`` is the Engle–Granger
+ADF statistic (no lagged differences), compared against MacKinnon's asymptotic
+critical values for two variables with a constant, and -ln 2 / ln(1 + gamma) is
+the spread's half-life in bars.
+
+Neither regression is refitted per window. Both are functions of a few sums over
+the window: the closes' sums (x, y, xx, xy, yy) and the sums over consecutive
+bar pairs of lagged closes times differences (see ``_diff_terms``). Expanding the
+residuals in those sums gives the Dickey-Fuller regression without computing a
+single residual, so:
+
+- ``rolling_cointegration`` (batch) takes rolling sums of the term columns and
+  evaluates every window at once
+- ``RollingCointegration`` (live) is recursive least squares over a sliding
+  window: each bar adds its terms to the normal-equation sums and removes those
+  of the bar leaving the window, O(1) per bar; sums are rebuilt from its ring
+  buffer every ``window`` bars so rounding does not accumulate
+
+Closes are centred before their products are summed (the regressions do not
+depend on a shift of either series), which keeps the sums of squares of prices
+from swamping the small residuals. ``CointegrationTracker`` adds bar times on
+top, as ``CorrelationTracker`` does for correlation.
+"""
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from correlation_kernels import PairBarTracker
+from equity_analytics import pip_size
+
+# MacKinnon (2010) asymptotic critical values of the Engle-Granger statistic, two variables with a constant
+EG_CRITICAL_VALUES: Dict[int, float] = {1: -3.90, 5: -3.34, 10: -3.04}
+DEFAULT_SIGNIFICANCE = 5
+MIN_WINDOW = 4  # The Dickey-Fuller regression needs two degrees of freedom
+MIN_LIVE_WINDOW = 30  # Live orders: shorter regressions give betas too noisy to size a real lot by
+LOT_STEP = 0.01
+MIN_LOT = 0.01
+DEFAULT_MAX_LOT_MULTIPLE = 3.0  # Hedged lot cap, in multiples of the fixed pair2 lot
+
+STATS = ('hedge_ratio', 'intercept', 'adf_stat', 'half_life')
+SUMMARY_COLUMNS = ('hedge_ratio', 'adf_stat', 'pct_cointegrated', 'half_life')  # cointegration_summary
+
+
+def validate_window(window: int, minimum: int = MIN_WINDOW) -> int:
+    if int(window) < minimum:
+        raise ValueError(f"Cointegration window must be at least {minimum}")
+    return int(window)
+
+
+def _level_terms(x, y) -> np.ndarray:
+    """x, y, xx, xy and yy of each bar."""
+    if np.ndim(x) == 0:
+        return np.array((x, y, x * x, x * y, y * y))
+    return np.stack((x, y, x * x, x * y, y * y), axis=-1)
+
+
+def _diff_terms(x_lag, y_lag, x, y) -> np.ndarray:
+    """Lagged closes times differences, differences, and products of differences of each pair of consecutive bars."""
+    dx, dy = x - x_lag, y - y_lag
+    if np.ndim(x) == 0:
+        return np.array((x_lag * dx, x_lag * dy, y_lag * dx, y_lag * dy, dx, dy, dx * dx, dx * dy, dy * dy))
+    return np.stack((x_lag * dx, x_lag * dy, y_lag * dx, y_lag * dy, dx, dy, dx * dx, dx * dy, dy * dy), axis=-1)
+
+
+def _hedge(levels: np.ndarray, window: int):
+    """OLS intercept and slope of y on x from the window sums of _level_terms."""
+    sx, sy, sxx, sxy = (levels[..., k] for k in range(4))
+    mean_x, mean_y = sx / window, sy / window
+    var_x = sxx - sx * mean_x
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = np.where(var_x > 0, (sxy - sx * mean_y) / var_x, np.nan)
+    return mean_y - beta * mean_x, beta
+
+
+def _engle_granger(levels: np.ndarray, diffs: np.ndarray, last_x, last_y, window: int) -> Dict[str, np.ndarray]:
+    """
+    Hedge regression and Dickey-Fuller regression of its residuals, from window sums.
+
+    Parameters:
+        levels: Sums of _level_terms over the window's bars
+        diffs: Sums of _diff_terms over the window's consecutive bar pairs
+        last_x, last_y: Closes of the window's last bar (left out of the lagged sums)
+        window: Bars per window
+    """
+    alpha, beta = _hedge(levels, window)
+    sx, sy, sxx, sxy, syy = (levels[..., k] for k in range(5))
+    xl_dx, xl_dy, yl_dx, yl_dy, s_dx, s_dy, dx_dx, dx_dy, dy_dy = (diffs[..., k] for k in range(9))
+    # Sums over the lagged bars: the window without its last bar
+    lx, ly = sx - last_x, sy - last_y
+    lxx, lxy, lyy = sxx - last_x * last_x, sxy - last_x * last_y, syy - last_y * last_y
+    n = window - 1
+
+    # e_{t-1} = y_{t-1} - alpha - beta x_{t-1} and de_t = dy_t - beta dx_t, expanded
+    see = lyy - 2 * beta * lxy + beta * beta * lxx - 2 * alpha * (ly - beta * lx) + n * alpha * alpha
+    sed = (yl_dy - beta * yl_dx) - beta * (xl_dy - beta * xl_dx) - alpha * (s_dy - beta * s_dx)
+    sdd = dy_dy - 2 * beta * dx_dy + beta * beta * dx_dx
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gamma = np.where(see > 0, sed / see, np.nan)
+        residual_variance = (sdd - gamma * sed) / (n - 1)
+        adf_stat = np.where(residual_variance > 0, gamma * np.sqrt(see / residual_variance), np.nan)
+        half_life = np.where((gamma < 0) & (gamma > -1), -np.log(2) / np.log1p(gamma), np.nan)
+    return {'hedge_ratio': beta, 'intercept': alpha, 'adf_stat': adf_stat, 'half_life': half_life}
+
+
+def _centres(closes1: np.ndarray, closes2: np.ndarray):
+    finite = np.isfinite(closes1) & np.isfinite(closes2)
+    if not finite.any():
+        return 0.0, 0.0
+    return float(closes2[finite].mean()), float(closes1[finite].mean())
+
+
+def rolling_cointegration(closes1, closes2, window: int) -> Dict[str, np.ndarray]:
+    """
+    Hedge ratio (pair1 per unit of pair2), intercept, Engle-Granger ADF statistic and
+    spread half-life (bars; NaN when the spread does not revert) over the last ``window``
+    bars at every bar. NaN during warm-up and for windows with a missing close.
+
+    Parameters:
+        closes1: Closes of pair1, the regression's dependent series
+        closes2: Closes of pair2, on the same bars
+        window: Bars per regression
+    """
+    window = validate_window(window)
+    closes1 = np.asarray(closes1, dtype=np.float64)
+    closes2 = np.asarray(closes2, dtype=np.float64)
+    centre_x, centre_y = _centres(closes1, closes2)
+    x, y = closes2 - centre_x, closes1 - centre_y
+    x_lag = np.concatenate(([np.nan], x[:-1]))
+    y_lag = np.concatenate(([np.nan], y[:-1]))
+
+    # Rolling sums are compensated, and NaN for any window with a missing term
+    levels = pd.DataFrame(_level_terms(x, y)).rolling(window).sum().to_numpy()
+    diffs = pd.DataFrame(_diff_terms(x_lag, y_lag, x, y)).rolling(window - 1).sum().to_numpy()
+    stats = _engle_granger(levels, diffs, x, y, window)
+    stats['intercept'] = stats['intercept'] + centre_y - stats['hedge_ratio'] * centre_x
+    return stats
+
+
+def hedge_ratio(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Indicator store kernel: rolling OLS slope of the first close series on the second."""
+    window = validate_window(window)
+    closes1 = np.asarray(inputs[0], dtype=np.float64)
+    closes2 = np.asarray(inputs[1], dtype=np.float64)
+    centre_x, centre_y = _centres(closes1, closes2)
+    levels = pd.DataFrame(_level_terms(closes2 - centre_x, closes1 - centre_y)).rolling(window).sum().to_numpy()
+    return _hedge(levels, window)[1]
+
+
+def cointegration_summary(stats: Dict[str, np.ndarray], significance: int = DEFAULT_SIGNIFICANCE) -> Dict:
+    """
+    Latest hedge ratio and ADF statistic of rolling_cointegration output, how often
+    (percent of tested windows) the pair tested cointegrated, and its median half-life
+    in bars; None where unknown.
+
+    Parameters:
+        stats: Output of rolling_cointegration
+        significance: Test level in percent, a key of EG_CRITICAL_VALUES
+    """
+    if significance not in EG_CRITICAL_VALUES:
+        raise ValueError(f"Unknown significance {significance}. Available: {list(EG_CRITICAL_VALUES)}")
+    adf = stats['adf_stat']
+    tested = np.flatnonzero(~np.isnan(adf))
+    half_lives = stats['half_life'][~np.isnan(stats['half_life'])]
+    last = tested[-1] if len(tested) else None
+    return {
+        'hedge_ratio': float(stats['hedge_ratio'][last]) if last is not None else None,
+        'adf_stat': float(adf[last]) if last is not None else None,
+        'pct_cointegrated': float((adf[tested] < EG_CRITICAL_VALUES[significance]).mean() * 100)
+        if len(tested) else 0,
+        'half_life': float(np.median(half_lives)) if len(half_lives) else None,
+    }
+
+
+def hedge_lot(lot1: float, beta: float, pair1: str, pair2: str, fallback: float,
+              max_multiple: float = DEFAULT_MAX_LOT_MULTIPLE, volume_min: float = MIN_LOT,
+              volume_max: Optional[float] = None, volume_step: float = LOT_STEP) -> float:
+    """
+    Lot of pair2 whose P&L offsets ``lot1`` of pair1 when pair1 moves ``beta`` times
+    pair2's move: pip values scale with 1 / pip size, so lot2 = lot1 * |beta| * pip2 / pip1.
+
+    Parameters:
+        lot1: Lot of pair1
+        beta: Hedge ratio of pair1 on pair2; ``fallback`` is returned while it is unknown
+        pair1, pair2: Symbols, for their pip sizes
+        fallback: The fixed pair2 lot
+        max_multiple: The lot is capped at this multiple of ``fallback``
+        volume_min, volume_max, volume_step: The symbol's volume limits (``mt5.symbol_info``)
+    """
+    if beta is None or not np.isfinite(beta) or beta == 0:
+        return fallback
+    lot = min(lot1 * abs(beta) * pip_size(pair2) / pip_size(pair1), fallback * max_multiple)
+    if volume_max is not None:
+        lot = min(lot, volume_max)
+    steps = np.floor(lot / volume_step + 1e-9)  # Down to a whole step, never above the caps
+    lot = max(volume_min, steps * volume_step)
+    return round(lot, max(0, int(np.ceil(-np.log10(volume_step) - 1e-9))))
+
+
+class RollingCointegration:
+    def __init__(self, window: int):
+        """
+        Parameters:
+            window: Bars per regression
+        """
+        self.window = validate_window(window)
+        self._buffer = np.zeros((self.window, 2))  # Centred (x, y) = (pair2, pair1) closes
+        self._head = 0  # Oldest bar once the buffer is full, next slot before
+        self._count = 0
+        self._shift = np.zeros(2)
+        self._levels = np.zeros(5)
+        self._diffs = np.zeros(9)
+        self._since_rebuild = 0
+
+    def push(self, closes1, closes2) -> None:
+        """Commit the closes of one or more closed bars."""
+        x = np.atleast_1d(np.asarray(closes2, dtype=np.float64))
+        y = np.atleast_1d(np.asarray(closes1, dtype=np.float64))
+        if len(x) >= self.window:
+            # Batched: the window is just the last bars
+            self._buffer[:, 0] = x[-self.window:]
+            self._buffer[:, 1] = y[-self.window:]
+            self._head = 0
+            self._count = self.window
+            self._shift = np.zeros(2)
+            self._rebuild()
+            return
+        for row in np.column_stack((x, y)):
+            if self._count == 0:
+                self._shift = row.copy()
+            row = row - self._shift
+            if self._count:
+                last = self._buffer[(self._head - 1) % self.window]
+                self._diffs += _diff_terms(last[0], last[1], row[0], row[1])
+            if self._count == self.window:
+                # Recursive downdate: the oldest bar and its pair with the next one leave the window
+                oldest, second = self._buffer[self._head], self._buffer[(self._head + 1) % self.window]
+                self._levels -= _level_terms(oldest[0], oldest[1])
+                self._diffs -= _diff_terms(oldest[0], oldest[1], second[0], second[1])
+            else:
+                self._count += 1
+            self._buffer[self._head] = row
+            self._levels += _level_terms(row[0], row[1])
+            self._head = (self._head + 1) % self.window
+            self._since_rebuild += 1
+            if self._since_rebuild >= self.window:
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Sums recomputed from the buffer, in bar order and around the buffer's mean."""
+        if self._count == self.window:
+            rows = np.roll(self._buffer, -self._head, axis=0) + self._shift
+            self._head = 0
+        else:
+            rows = self._buffer[:self._count] + self._shift
+        self._shift = rows.mean(axis=0)
+        rows = rows - self._shift
+        self._buffer[:self._count] = rows
+        self._levels = _level_terms(rows[:, 0], rows[:, 1]).sum(axis=0)
+        self._diffs = _diff_terms(rows[:-1, 0], rows[:-1, 1], rows[1:, 0], rows[1:, 1]).sum(axis=0)
+        self._since_rebuild = 0
+
+    def current(self, closes1: Optional[float] = None, closes2: Optional[float] = None) -> Dict[str, float]:
+        """
+        Hedge ratio, intercept, ADF statistic and half-life of the last ``window`` bars,
+        with a forming bar's closes when given; NaN until ready.
+        """
+        levels, diffs, count = self._levels, self._diffs, self._count
+        last = self._buffer[(self._head - 1) % self.window]
+        if closes1 is not None and count:
+            row = np.array([closes2, closes1], dtype=np.float64) - self._shift
+            diffs = diffs + _diff_terms(last[0], last[1], row[0], row[1])
+            levels = levels + _level_terms(row[0], row[1])
+            if count == self.window:
+                oldest, second = self._buffer[self._head], self._buffer[(self._head + 1) % self.window]
+                levels = levels - _level_terms(oldest[0], oldest[1])
+                diffs = diffs - _diff_terms(oldest[0], oldest[1], second[0], second[1])
+            else:
+                count += 1
+            last = row
+        if count < self.window:
+            return {name: float('nan') for name in STATS}
+        stats = _engle_granger(levels, diffs, last[0], last[1], self.window)
+        stats['intercept'] = stats['intercept'] + self._shift[1] - stats['hedge_ratio'] * self._shift[0]
+        return {name: float(value) for name, value in stats.items()}
+
+
+class CointegrationTracker(PairBarTracker):
+    def __init__(self, window: int):
+        """
+        Live hedge ratio and cointegration of two symbols' bars (see PairBarTracker).
+
+        Parameters:
+            window: Bars per regression
+        """
+        super().__init__(RollingCointegration(window), history_bars=int(window))
+        self.window = int(window)
@@ -0,0 +1,422 @@
+"""
+Selectable correlation kernels for backtests and live monitors.
+
+    price:        Pearson of closes over the last ``window`` bars (the backtester's original kernel)
+    returns:      Pearson of bar-to-bar percentage returns (as in ``mt5_bridge``)
+    log_returns:  Pearson of log returns
+    ewma:         Exponentially weighted correlation of percentage returns, span ``window``
+    spearman:     Rank correlation of percentage returns over the last ``window`` bars
+
+Each kernel has a vectorized batch form, registered in the indicator store
+(``CORRELATION_KERNELS`` maps kernel names to store kernels), and an
+incremental form for live monitors (``incremental_correlation``):
+
+- Pearson kernels keep running sums over a ring buffer: one bar in, one bar out,
+  O(1) per bar. Sums are rebuilt from the buffer every ``window`` bars so
+  rounding does not accumulate
+- EWMA keeps exponentially decayed sums (pandas' ``adjust=True`` weights), O(1)
+  per bar
+- Spearman re-ranks its ring buffer, O(window log window) per bar: a new bar can
+  shift the rank of every other bar in the window, so there are no running sums
+  to keep
+
+Incremental kernels take the closes of committed bars with ``push`` (several
+at once on warm-up) and evaluate a still forming bar with ``current(x, y)``
+without committing it. ``CorrelationTracker`` (a ``PairBarTracker``) adds
+bar times on top, replacing the forming bar until a later bar arrives.
+"""
+import threading
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Kernel name (request field) -> indicator store kernel
+CORRELATION_KERNELS: Dict[str, str] = {
+    'price': 'rolling_corr',
+    'returns': 'returns_corr',
+    'log_returns': 'log_returns_corr',
+    'ewma': 'ewma_corr',
+    'spearman': 'spearman_corr',
+}
+DEFAULT_KERNEL = 'price'
+
+# EWMA warm-up for live monitors, in spans: older bars weigh less than e^-19 of the newest
+EWMA_HISTORY_SPANS = 10
+SPEARMAN_CHUNK_ROWS = 65536
+
+
+def validate_kernel(kernel: str) -> str:
+    if kernel not in CORRELATION_KERNELS:
+        raise ValueError(f"Unknown correlation kernel '{kernel}'. Available: {list(CORRELATION_KERNELS)}")
+    return kernel
+
+
+def warmup_bars(kernel: str, window: int) -> Optional[int]:
+    """Bars before a given bar that its correlation depends on; None when it depends on all of them (EWMA)."""
+    validate_kernel(kernel)
+    if kernel == 'ewma':
+        return None
+    return int(window) - 1 if kernel == 'price' else int(window)
+
+
+def live_history_bars(kernel: str, window: int) -> int:
+    """Bars a live monitor loads before its first value: the window, or enough EWMA spans to forget its start."""
+    lookback = warmup_bars(kernel, window)
+    return EWMA_HISTORY_SPANS * int(window) + 1 if lookback is None else lookback + 1
+
+
+# Batch kernels: inputs are the two close series, as for every indicator store kernel
+
+def log_returns_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Rolling Pearson of log returns."""
+    returns1 = np.log(pd.Series(inputs[0])).diff()
+    returns2 = np.log(pd.Series(inputs[1])).diff()
+    return returns1.rolling(window).corr(returns2).to_numpy()
+
+
+def ewma_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Exponentially weighted correlation of percentage returns, span ``window``, from ``window`` returns on."""
+    returns1 = pd.Series(inputs[0]).pct_change()
+    returns2 = pd.Series(inputs[1]).pct_change()
+    return returns1.ewm(span=window, min_periods=window).corr(returns2).to_numpy()
+
+
+def _average_ranks(values: np.ndarray) -> np.ndarray:
+    """Ranks along the last axis (0-based), ties sharing their average rank."""
+    rows, width = values.shape
+    order = np.argsort(values, axis=1)
+    positions = np.broadcast_to(np.arange(width, dtype=np.float64), (rows, width))
+    ranks = np.empty((rows, width))
+    np.put_along_axis(ranks, order, positions, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    tied = ordered[:, 1:] == ordered[:, :-1]
+    tied_rows = np.flatnonzero(tied.any(axis=1))
+    if len(tied_rows):
+        # Each run of equal values gets the mean of its first and last position
+        positions = positions[:len(tied_rows)]
+        starts = np.ones((len(tied_rows), width), dtype=bool)
+        starts[:, 1:] = ~tied[tied_rows]
+        ends = np.ones((len(tied_rows), width), dtype=bool)
+        ends[:, :-1] = starts[:, 1:]
+        first = np.maximum.accumulate(np.where(starts, positions, 0), axis=1)
+        last = np.minimum.accumulate(np.where(ends, positions, width - 1)[:, ::-1], axis=1)[:, ::-1]
+        averaged = np.empty((len(tied_rows), width))
+        np.put_along_axis(averaged, order[tied_rows], (first + last) / 2, axis=1)
+        ranks[tied_rows] = averaged
+    return ranks
+
+
+def _rank_corr(values1: np.ndarray, values2: np.ndarray) -> np.ndarray:
+    """Spearman correlation of each row pair of two (rows x window) matrices."""
+    ranks1 = _average_ranks(values1)
+    ranks2 = _average_ranks(values2)
+    # Average ranks always sum to the same total, so the mean rank is known
+    middle = (values1.shape[1] - 1) / 2
+    ranks1 -= middle
+    ranks2 -= middle
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (np.einsum('ij,ij->i', ranks1, ranks2)
+                / np.sqrt(np.einsum('ij,ij->i', ranks1, ranks1) * np.einsum('ij,ij->i', ranks2, ranks2)))
+
+
+def spearman_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Rolling Spearman correlation of percentage returns; windows with a missing return are NaN."""
+    returns1 = pd.Series(inputs[0]).pct_change().to_numpy()
+    returns2 = pd.Series(inputs[1]).pct_change().to_numpy()
+    correlation = np.full(len(returns1), np.nan)
+    if len(returns1) < window:
+        return correlation
+    windows1 = np.lib.stride_tricks.sliding_window_view(returns1, window)
+    windows2 = np.lib.stride_tricks.sliding_window_view(returns2, window)
+    # Row k is the window ending at bar k + window - 1; ranked in chunks to bound memory
+    for start in range(0, len(windows1), SPEARMAN_CHUNK_ROWS):
+        chunk1 = windows1[start:start + SPEARMAN_CHUNK_ROWS]
+        chunk2 = windows2[start:start + SPEARMAN_CHUNK_ROWS]
+        values = _rank_corr(chunk1, chunk2)
+        values[np.isnan(chunk1).any(axis=1) | np.isnan(chunk2).any(axis=1)] = np.nan
+        correlation[start + window - 1:start + window - 1 + len(values)] = values
+    return correlation
+
+
+# Incremental kernels
+
+class _ReturnsInput:
+    """Turns closes into the kernel's input: the closes themselves, or their returns on the previous close."""
+
+    def __init__(self, transform: str):
+        self.transform = transform
+        self.last_close: Optional[float] = None
+
+    def values(self, closes: np.ndarray) -> np.ndarray:
+        """Inputs for ``closes`` following the last committed close; one fewer before the first close."""
+        if self.transform == 'price':
+            return closes
+        previous = closes[:-1] if self.last_close is None else np.concatenate(([self.last_close], closes[:-1]))
+        current = closes[1:] if self.last_close is None else closes
+        if self.transform == 'log_returns':
+            return np.log(current / previous)
+        return current / previous - 1
+
+    def commit(self, closes: np.ndarray) -> None:
+        if len(closes):
+            self.last_close = float(closes[-1])
+
+
+def _kernel_inputs(inputs, closes1, closes2, commit: bool) -> np.ndarray:
+    """(bars x 2) kernel inputs of both symbols' closes."""
+    closes1 = np.atleast_1d(np.asarray(closes1, dtype=np.float64))
+    closes2 = np.atleast_1d(np.asarray(closes2, dtype=np.float64))
+    rows = np.column_stack((inputs[0].values(closes1), inputs[1].values(closes2)))
+    if commit:
+        inputs[0].commit(closes1)
+        inputs[1].commit(closes2)
+    return rows
+
+
+def _pearson(sums: np.ndarray) -> float:
+    """Correlation from the means of x, y, xx, yy and xy."""
+    mean_x, mean_y, mean_xx, mean_yy, mean_xy = sums
+    covariance = mean_xy - mean_x * mean_y
+    variance = (mean_xx - mean_x * mean_x) * (mean_yy - mean_y * mean_y)
+    if variance <= 0:
+        return float('nan')
+    return float(np.clip(covariance / np.sqrt(variance), -1.0, 1.0))
+
+
+def _terms(rows: np.ndarray) -> np.ndarray:
+    """x, y, xx, yy and xy of each (x, y) row."""
+    x, y = rows[:, 0], rows[:, 1]
+    return np.column_stack((x, y, x * x, y * y, x * y))
+
+
+class RollingPearson:
+    def __init__(self, window: int, transform: str = 'price'):
+        """
+        Parameters:
+            window: Observations per correlation
+            transform: 'price', 'returns' or 'log_returns'
+        """
+        if window < 2:
+            raise ValueError("Correlation window must be at least 2")
+        self.window = int(window)
+        self._inputs = (_ReturnsInput(transform), _ReturnsInput(transform))
+        self._buffer = np.zeros((self.window, 2))
+        self._head = 0
+        self._count = 0
+        self._shift = np.zeros(2)  # Subtracted from inputs so sums of squares of prices keep their precision
+        self._sums = np.zeros(5)  # x, y, xx, yy, xy of the shifted inputs
+        self._since_rebuild = 0
+
+    def push(self, closes1, closes2) -> None:
+        """Commit the closes of one or more closed bars."""
+        rows = _kernel_inputs(self._inputs, closes1, closes2, commit=True)
+        if len(rows) >= self.window:
+            # Batched: the window is just the last rows
+            self._buffer[:] = rows[-self.window:]
+            self._head = 0
+            self._count = self.window
+            self._shift = np.zeros(2)
+            self._rebuild()
+            return
+        for row in rows:
+            if self._count == 0:
+                self._shift = row.copy()
+            row = row - self._shift
+            if self._count == self.window:
+                self._sums -= _terms(self._buffer[self._head:self._head + 1])[0]
+            else:
+                self._count += 1
+            self._buffer[self._head] = row
+            self._sums += _terms(row[None, :])[0]
+            self._head = (self._head + 1) % self.window
+            self._since_rebuild += 1
+            if self._since_rebuild >= self.window:
+                self._rebuild()
+
+    def _rebuild(self) -> None:
+        """Running sums recomputed from the buffer, around the buffer's mean."""
+        rows = self._buffer[:self._count] + self._shift
+        self._shift = rows.mean(axis=0)
+        rows = rows - self._shift
+        self._buffer[:self._count] = rows
+        self._sums = _terms(rows).sum(axis=0)
+        self._since_rebuild = 0
+
+    def current(self, x: Optional[float] = None, y: Optional[float] = None) -> float:
+        """Correlation of the last ``window`` observations, with a forming bar's closes when given; NaN until ready."""
+        sums, count = self._sums, self._count
+        if x is not None:
+            rows = _kernel_inputs(self._inputs, x, y, commit=False)
+            if len(rows):
+                sums = sums + _terms(rows - self._shift)[0]
+                if count == self.window:
+                    sums = sums - _terms(self._buffer[self._head:self._head + 1])[0]
+                else:
+                    count += 1
+        if count < self.window:
+            return float('nan')
+        return _pearson(sums / count)
+
+
+class EwmaCorrelation:
+    def __init__(self, window: int):
+        """
+        Parameters:
+            window: EWMA span in bars; values start after ``window`` returns
+        """
+        if window < 2:
+            raise ValueError("Correlation window must be at least 2")
+        self.window = int(window)
+        self.decay = 1 - 2 / (self.window + 1)
+        self._inputs = (_ReturnsInput('returns'), _ReturnsInput('returns'))
+        self._count = 0
+        self._weight = 0.0
+        self._sums = np.zeros(5)  # Decayed x, y, xx, yy, xy
+
+    def push(self, closes1, closes2) -> None:
+        """Commit the closes of one or more closed bars."""
+        rows = _kernel_inputs(self._inputs, closes1, closes2, commit=True)
+        n = len(rows)
+        if n == 0:
+            return
+        # The newest row has weight 1, each older one ``decay`` times the next
+        weights = self.decay ** np.arange(n - 1, -1, -1)
+        self._sums = self._sums * self.decay ** n + weights @ _terms(rows)
+        self._weight = self._weight * self.decay ** n + weights.sum()
+        self._count += n
+
+    def current(self, x: Optional[float] = None, y: Optional[float] = None) -> float:
+        """EWMA correlation, with a forming bar's closes when given; NaN until ready."""
+        sums, weight, count = self._sums, self._weight, self._count
+        if x is not None:
+            rows = _kernel_inputs(self._inputs, x, y, commit=False)
+            if len(rows):
+                sums = sums * self.decay + _terms(rows)[0]
+                weight = weight * self.decay + 1
+                count += 1
+        if count < self.window:
+            return float('nan')
+        return _pearson(sums / weight)
+
+
+class RollingSpearman:
+    def __init__(self, window: int):
+        """
+        Parameters:
+            window: Returns per correlation
+        """
+        if window < 2:
+            raise ValueError("Correlation window must be at least 2")
+        self.window = int(window)
+        self._inputs = (_ReturnsInput('returns'), _ReturnsInput('returns'))
+        self._buffer = np.zeros((self.window, 2))
+        self._head = 0
+        self._count = 0
+
+    def push(self, closes1, closes2) -> None:
+        """Commit the closes of one or more closed bars."""
+        rows = _kernel_inputs(self._inputs, closes1, closes2, commit=True)[-self.window:]
+        for row in rows:
+            self._buffer[self._head] = row
+            self._head = (self._head + 1) % self.window
+        self._count = min(self._count + len(rows), self.window)
+
+    def current(self, x: Optional[float] = None, y: Optional[float] = None) -> float:
+        """Rank correlation of the last ``window`` returns, with a forming bar's closes when given; NaN until ready."""
+        buffer, count = self._buffer, self._count
+        if x is not None:
+            rows = _kernel_inputs(self._inputs, x, y, commit=False)
+            if len(rows):
+                # The forming bar's return takes the place of the oldest one
+                buffer = buffer.copy()
+                buffer[self._head] = rows[0]
+                count = min(count + 1, self.window)
+        if count < self.window:
+            return float('nan')
+        return float(_rank_corr(buffer[:, 0][None, :], buffer[:, 1][None, :])[0])
+
+
+def incremental_correlation(kernel: str, window: int):
+    """Incremental form of ``kernel``: ``push`` closed bars, ``current`` for the latest value."""
+    validate_kernel(kernel)
+    if kernel == 'ewma':
+        return EwmaCorrelation(window)
+    if kernel == 'spearman':
+        return RollingSpearman(window)
+    return RollingPearson(window, kernel)
+
+
+class PairBarTracker:
+    def __init__(self, engine, history_bars: int):
+        """
+        Live state of two symbols' bars: closed bars are committed to an incremental
+        engine once; the newest bar is kept apart as pending, since it may still be
+        forming, and replaced by the next update that includes its time.
+
+        Parameters:
+            engine: Incremental kernel with ``push(closes1, closes2)`` and ``current(close1, close2)``
+            history_bars: Bars to load before the first value
+        """
+        self.history_bars = int(history_bars)
+        self._engine = engine
+        self.last_time: Optional[int] = None  # Last committed bar
+        self.pending_time: Optional[int] = None
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def update(self, times: np.ndarray, closes1: np.ndarray, closes2: np.ndarray) -> int:
+        """
+        Feed bars both symbols have, ascending; bars before the pending bar are ignored.
+        Returns the number of new or replaced bars.
+        """
+        times = np.asarray(times, dtype=np.int64)
+        closes1 = np.asarray(closes1, dtype=np.float64)
+        closes2 = np.asarray(closes2, dtype=np.float64)
+        with self._lock:
+            if self.pending_time is not None:
+                new = times >= self.pending_time
+                if (times > self.pending_time).any() and not (times == self.pending_time).any():
+                    # Later bars arrived without a replacement for the pending bar: keep it as it was
+                    self._commit(np.array([self.pending_time]), *(np.array([close]) for close in self._pending))
+            elif self.last_time is not None:
+                new = times > self.last_time
+            else:
+                new = np.ones(len(times), dtype=bool)
+            times, closes1, closes2 = times[new], closes1[new], closes2[new]
+            if len(times) == 0:
+                return 0
+            self._commit(times[:-1], closes1[:-1], closes2[:-1])
+            self.pending_time = int(times[-1])
+            self._pending = (float(closes1[-1]), float(closes2[-1]))
+            return len(times)
+
+    def _commit(self, times: np.ndarray, closes1: np.ndarray, closes2: np.ndarray) -> None:
+        self.pending_time = None
+        self._pending = None
+        if len(times) == 0:
+            return
+        self._engine.push(closes1, closes2)
+        self.last_time = int(times[-1])
+
+    def value(self):
+        """The engine's value at the newest bar, pending bar included."""
+        with self._lock:
+            if self._pending is None:
+                return self._engine.current()
+            return self._engine.current(*self._pending)
+
+
+class CorrelationTracker(PairBarTracker):
+    def __init__(self, kernel: str, window: int):
+        """
+        Live correlation of two symbols' bars with the incremental form of ``kernel``;
+        ``value`` is NaN until ready.
+
+        Parameters:
+            kernel: Name in CORRELATION_KERNELS
+            window: Kernel window in bars
+        """
+        super().__init__(incremental_correlation(kernel, window), live_history_bars(kernel, window))
+        self.kernel = kernel
+        self.window = int(window)
@@ -0,0 +1,188 @@
+"""
+Rolling correlation of every pair of symbols in a universe.
+
+Closes of all symbols are aligned on the bar times they share, turned into
+bar-to-bar percentage returns (as in ``mt5_bridge``) and kept as a (bars x
+symbols) matrix. The correlation matrix over the last ``window`` returns comes
+from running sums: the sum of each symbol's returns and the (symbols x symbols)
+sum of their cross products. A new bar adds its return vector's outer product
+and removes the one leaving the window, so every pair is updated in one
+O(symbols^2) step rather than one rolling correlation per pair.
+
+Like the indicator store, the newest bar is kept apart as pending, since it may
+still be forming: it counts towards the matrix but is replaced by the next
+update that includes its time. Sums are rebuilt from the window's returns as a
+single matrix product on large updates and every ``window`` bars, so rounding
+does not accumulate.
+"""
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MAX_SYMBOLS = 100
+
+
+def align_closes(rates: Dict[str, np.ndarray], symbols: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Bar times every symbol has, and the (bars x symbols) matrix of closes at those times.
+
+    Parameters:
+        rates: MT5 rate arrays per symbol, ascending by time
+        symbols: Column order of the close matrix
+    """
+    common_times = rates[symbols[0]]['time']
+    for symbol in symbols[1:]:
+        common_times = np.intersect1d(common_times, rates[symbol]['time'])
+    closes = np.empty((len(common_times), len(symbols)), dtype=np.float64)
+    for column, symbol in enumerate(symbols):
+        symbol_rates = rates[symbol]
+        closes[:, column] = symbol_rates['close'][np.isin(symbol_rates['time'], common_times)]
+    return common_times.astype(np.int64), closes
+
+
+class RollingCorrelationMatrix:
+    def __init__(self, symbols: Sequence[str], window: int):
+        """
+        Parameters:
+            symbols: Universe of up to MAX_SYMBOLS distinct symbols
+            window: Returns per correlation
+        """
+        if len(symbols) < 2 or len(symbols) > MAX_SYMBOLS:
+            raise ValueError(f"A correlation matrix needs between 2 and {MAX_SYMBOLS} symbols")
+        if len(set(symbols)) != len(symbols):
+            raise ValueError("Symbols must be distinct")
+        if window < 2:
+            raise ValueError("Correlation window must be at least 2")
+        self.symbols = list(symbols)
+        self.window = int(window)
+        n = len(self.symbols)
+        self._returns = np.zeros((self.window, n))  # Ring buffer of the committed window
+        self._head = 0  # Row the next committed return goes to
+        self._count = 0
+        self._sum = np.zeros(n)
+        self._cross = np.zeros((n, n))
+        self._since_rebuild = 0
+        self._last_close: Optional[np.ndarray] = None
+        self.last_time: Optional[int] = None  # Last committed bar
+        self.pending_time: Optional[int] = None
+        self._pending_close: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full window of returns, pending bar included, is available."""
+        return self._count + (self._pending_close is not None and self._last_close is not None) >= self.window
+
+    def update(self, times: np.ndarray, closes: np.ndarray) -> int:
+        """
+        Feed aligned bars (see align_closes); bars before the pending bar are ignored.
+        Returns the number of new or replaced bars.
+
+        Parameters:
+            times: Bar times, ascending
+            closes: (bars x symbols) closes in the order of ``symbols``
+        """
+        times = np.asarray(times, dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+        with self._lock:
+            if self.pending_time is not None:
+                new = times >= self.pending_time
+                if (times > self.pending_time).any() and not (times == self.pending_time).any():
+                    # Later bars arrived without a replacement for the pending bar: keep it as it was
+                    self._commit(np.array([self.pending_time]), self._pending_close[None, :])
+            elif self.last_time is not None:
+                new = times > self.last_time
+            else:
+                new = np.ones(len(times), dtype=bool)
+            times, closes = times[new], closes[new]
+            if len(times) == 0:
+                return 0
+            self._commit(times[:-1], closes[:-1])
+            self.pending_time = int(times[-1])
+            self._pending_close = closes[-1].copy()
+            return len(times)
+
+    def _commit(self, times: np.ndarray, closes: np.ndarray) -> None:
+        if len(times) == 0:
+            return
+        if self._last_close is None:
+            # The first bar only provides the close the first return is measured from
+            self._last_close = closes[0].copy()
+            self.last_time = int(times[0])
+            times, closes = times[1:], closes[1:]
+            if len(times) == 0:
+                return
+        previous = np.vstack((self._last_close, closes[:-1]))
+        returns = closes / previous - 1
+        if len(returns) >= self.window:
+            # Batched: the window is just the last returns
+            self._returns[:] = returns[-self.window:]
+            self._head = 0
+            self._count = self.window
+            self._rebuild()
+        else:
+            for row in returns:
+                if self._count == self.window:
+                    leaving = self._returns[self._head]
+                    self._sum -= leaving
+                    self._cross -= np.outer(leaving, leaving)
+                else:
+                    self._count += 1
+                self._returns[self._head] = row
+                self._sum += row
+                self._cross += np.outer(row, row)
+                self._head = (self._head + 1) % self.window
+                self._since_rebuild += 1
+            if self._since_rebuild >= self.window:
+                self._rebuild()
+        self._last_close = closes[-1].copy()
+        self.last_time = int(times[-1])
+
+    def _rebuild(self) -> None:
+        """Running sums recomputed from the committed window."""
+        window = self._returns if self._count == self.window else self._returns[:self._count]
+        self._sum = window.sum(axis=0)
+        self._cross = window.T @ window
+        self._since_rebuild = 0
+
+    def matrix(self) -> np.ndarray:
+        """(symbols x symbols) Pearson correlation over the last ``window`` returns, pending bar included; NaN until ready."""
+        with self._lock:
+            n = len(self.symbols)
+            if not self.ready:
+                return np.full((n, n), np.nan)
+            total, cross = self._sum, self._cross
+            if self._pending_close is not None:
+                # The pending return enters the window; the oldest committed return leaves it
+                row = self._pending_close / self._last_close - 1
+                total, cross = total + row, cross + np.outer(row, row)
+                if self._count == self.window:
+                    leaving = self._returns[self._head]
+                    total, cross = total - leaving, cross - np.outer(leaving, leaving)
+            mean = total / self.window
+            covariance = cross / self.window - np.outer(mean, mean)
+        std = np.sqrt(np.clip(np.diag(covariance), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            correlation = covariance / np.outer(std, std)
+        correlation = np.clip(correlation, -1.0, 1.0)
+        np.fill_diagonal(correlation, np.where(std > 0, 1.0, np.nan))
+        return correlation
+
+    def lowest_pairs(self, count: int, correlation: Optional[np.ndarray] = None) -> List[Dict]:
+        """
+        The ``count`` least correlated symbol pairs (lowest correlation first), as
+        {"pair1", "pair2", "correlation"}.
+        """
+        if correlation is None:
+            correlation = self.matrix()
+        rows, columns = np.triu_indices(len(self.symbols), k=1)
+        values = correlation[rows, columns]
+        valid = np.flatnonzero(~np.isnan(values))
+        count = min(count, len(valid))
+        if count == 0:
+            return []
+        best = valid[np.argpartition(values[valid], count - 1)[:count]]
+        best = best[np.argsort(values[best], kind='stable')]
+        return [{'pair1': self.symbols[rows[k]], 'pair2': self.symbols[columns[k]], 'correlation': float(values[k])}
+                for k in best]
@@ -0,0 +1,189 @@
+"""
+Decorrelation episodes of a rolling correlation series.
+
+An episode is a run of consecutive bars with correlation below a threshold,
+found by run-length encoding the below-threshold mask: the mask's edges are the
+episode starts and ends, so a whole series is split into episodes without a
+Python loop. For each episode:
+
+    duration:        From its first bar to the first bar back at or above the threshold
+    time to revert:  From its first bar to the first bar at or above ``revert_threshold``
+                     (e.g. a strategy's exitThreshold); the same as the duration by default,
+                     or when ``revert_threshold`` is below the threshold
+
+Episodes still running at the last bar, or never reverting, are counted but left
+out of the duration statistics, as their length is not known yet.
+
+Durations are in hours, the unit of ``cooldownPeriod``, as percentile summaries
+and histograms. ``analyze_universe`` runs the analysis for every combination of a
+symbol list, in worker processes, on closes loaded once (see ``pair_screener``).
+"""
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from pair_screener import THRESHOLDS, pair_correlation
+from worker_pool import spawn_pool, worker_data
+
+# Histogram bucket edges in hours; the last bucket is open-ended
+HISTOGRAM_HOURS = (0, 1, 2, 4, 8, 12, 24, 48, 96, 168)
+PERCENTILES = (25, 50, 75, 90, 95)
+
+
+def episodes(times: np.ndarray, correlation: np.ndarray, threshold: float,
+             revert_threshold: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """
+    Columns of the episode table: start and end bar times, bars, hours, minimum
+    correlation, and whether and after how many hours the episode reverted.
+
+    Parameters:
+        times: Bar times (int64 epoch seconds), ascending
+        correlation: Rolling correlation at ``times``; NaN counts as not below
+        threshold: Episodes are runs of bars below this
+        revert_threshold: Level that ends the time to revert; ``threshold`` when omitted
+    """
+    times = np.asarray(times, dtype=np.int64)
+    correlation = np.asarray(correlation, dtype=np.float64)
+    n = len(correlation)
+    with np.errstate(invalid='ignore'):
+        below = correlation < threshold
+    edges = np.diff(np.concatenate(([0], below.view(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)  # First bar back at or above the threshold; n if still below
+
+    ended = ends < n
+    end_times = times[np.minimum(ends, n - 1)]
+    # Minimum over each [start, end): reduceat over (start, end) pairs, with a sentinel for end == n
+    bounds = np.column_stack((starts, ends)).ravel()
+    minimum = np.minimum.reduceat(np.append(correlation, np.nan), bounds)[::2] if len(starts) else np.zeros(0)
+
+    if revert_threshold is None or revert_threshold <= threshold:
+        revert_index, reverted = ends, ended
+    else:
+        with np.errstate(invalid='ignore'):
+            recovered = np.flatnonzero(correlation >= revert_threshold)
+        position = np.searchsorted(recovered, starts)
+        reverted = position < len(recovered)
+        revert_index = np.where(reverted, recovered[np.minimum(position, len(recovered) - 1)], n)
+    revert_hours = np.where(reverted, (times[np.minimum(revert_index, n - 1)] - times[starts]) / 3600, np.nan)
+
+    return {
+        'start': times[starts],
+        'end': end_times,
+        'bars': ends - starts,
+        'hours': (end_times - times[starts]) / 3600,
+        'min_correlation': minimum,
+        'ended': ended,
+        'reverted': reverted,
+        'revert_hours': revert_hours,
+    }
+
+
+def distribution(values: np.ndarray) -> Dict[str, float]:
+    """Count, mean, max and percentiles of ``values`` (hours); None for an empty sample."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) == 0:
+        return {'count': 0, 'mean': None, 'max': None, **{f'p{p}': None for p in PERCENTILES}}
+    bands = np.percentile(values, PERCENTILES)
+    return {'count': int(len(values)), 'mean': float(values.mean()), 'max': float(values.max()),
+            **{f'p{p}': float(v) for p, v in zip(PERCENTILES, bands)}}
+
+
+def histogram(hours: np.ndarray, edges: Sequence[float] = HISTOGRAM_HOURS) -> Dict[str, List]:
+    """Episodes per bucket [edges[k], edges[k + 1]); the last bucket has no upper edge."""
+    counts, _ = np.histogram(hours, bins=np.append(np.asarray(edges, dtype=np.float64), np.inf))
+    return {'edges': list(edges), 'counts': counts.tolist()}
+
+
+def regime_report(times: np.ndarray, correlation: np.ndarray, thresholds: Sequence[float] = THRESHOLDS,
+                  revert_threshold: Optional[float] = None, include_episodes: bool = False) -> List[Dict]:
+    """
+    Episode statistics for each threshold: how many episodes, the distribution
+    and histogram of their durations and of their time to revert.
+
+    Parameters:
+        times: Bar times (int64 epoch seconds), ascending
+        correlation: Rolling correlation at ``times``
+        thresholds: One report per threshold
+        revert_threshold: See episodes
+        include_episodes: Also return each threshold's episode table
+    """
+    report = []
+    for threshold in thresholds:
+        table = episodes(times, correlation, threshold, revert_threshold)
+        regime = {
+            'threshold': float(threshold),
+            'revert_threshold': float(threshold if revert_threshold is None else max(threshold, revert_threshold)),
+            'episodes': int(len(table['start'])),
+            'ongoing': int((~table['ended']).sum()),
+            'not_reverted': int((~table['reverted']).sum()),
+            'bars_below': int(table['bars'].sum()),
+            'duration_hours': distribution(table['hours'][table['ended']]),
+            'duration_histogram': histogram(table['hours'][table['ended']]),
+            'revert_hours': distribution(table['revert_hours'][table['reverted']]),
+            'revert_histogram': histogram(table['revert_hours'][table['reverted']]),
+        }
+        if include_episodes:
+            regime['table'] = table
+        report.append(regime)
+    return report
+
+
+def episode_records(table: Dict[str, np.ndarray]) -> List[Dict]:
+    """Episode table rows as dicts with Timestamps and Python scalars (NaN as None)."""
+    start = pd.to_datetime(table['start'], unit='s')
+    end = pd.to_datetime(table['end'], unit='s')
+    return [
+        {
+            'start': start[k],
+            'end': end[k],
+            'bars': int(table['bars'][k]),
+            'hours': float(table['hours'][k]),
+            'min_correlation': float(table['min_correlation'][k]),
+            'ended': bool(table['ended'][k]),
+            'reverted': bool(table['reverted'][k]),
+            'revert_hours': float(table['revert_hours'][k]) if table['reverted'][k] else None,
+        }
+        for k in range(len(start))
+    ]
+
+
+def analyze_pair(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pair1: str, pair2: str, period: int,
+                 thresholds: Sequence[float] = THRESHOLDS, revert_threshold: Optional[float] = None,
+                 include_episodes: bool = False) -> Dict:
+    """regime_report of one combination's rolling returns correlation."""
+    times, correlation = pair_correlation(closes, pair1, pair2, period)
+    return {'pair1': pair1, 'pair2': pair2,
+            'regimes': regime_report(times, correlation, thresholds, revert_threshold, include_episodes)}
+
+
+def _analyze_pair_job(pair1, pair2, period, thresholds, revert_threshold, include_episodes) -> Dict:
+    return analyze_pair(worker_data(), pair1, pair2, period, thresholds, revert_threshold, include_episodes)
+
+
+def analyze_universe(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], period: int = 20,
+                     thresholds: Sequence[float] = THRESHOLDS, revert_threshold: Optional[float] = None,
+                     include_episodes: bool = False, processes: int = 1) -> List[Dict]:
+    """
+    analyze_pair for every combination of the loaded symbols, in combination order.
+
+    Parameters:
+        closes: Output of pair_screener.load_closes
+        period: Rolling correlation window in bars
+        thresholds: One report per threshold
+        revert_threshold: See episodes
+        include_episodes: Also return the episode tables
+        processes: Worker processes; 1 runs in the calling process
+    """
+    combinations = list(itertools.combinations(closes, 2))
+    workers = min(processes, len(combinations))
+    if workers > 1:
+        n = len(combinations)
+        with spawn_pool(workers, closes) as executor:
+            return list(executor.map(_analyze_pair_job, [p1 for p1, _ in combinations], [p2 for _, p2 in combinations],
+                                     [period] * n, [thresholds] * n, [revert_threshold] * n, [include_episodes] * n,
+                                     chunksize=max(1, n // (4 * workers))))
+    return [analyze_pair(closes, pair1, pair2, period, thresholds, revert_threshold, include_episodes)
+            for pair1, pair2 in combinations]
@@ -0,0 +1,179 @@
+"""
+Headless HTML correlation report for any number of pairs.
+
+``mt5_bridge.plot_correlation_analysis`` puts every bar of every pair into SVG
+traces of one figure and opens it in a browser. The report instead writes one
+self-contained HTML file (plotly.js inlined):
+
+- Each pair's correlation is min/max-downsampled on the server
+  (``downsample.minmax_indices``), so a section holds a few thousand points
+  whatever the history length, with every dip and spike intact
+- Traces are WebGL (``scattergl``)
+- Sections are lazy: each figure is stored as JSON and only plotted while its
+  section is on screen, and purged once it scrolls away, so the page holds a
+  handful of WebGL contexts however many pairs it has
+- Pair sections (correlation, stats and figure JSON) are built in worker
+  processes from closes loaded once per symbol (see ``pair_screener``)
+"""
+import html
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import plotly.graph_objects as go
+
+from downsample import minmax_indices
+from pair_screener import THRESHOLDS, correlation_stats, pair_correlation, threshold_label
+from worker_pool import spawn_pool, worker_data
+
+DEFAULT_BUCKETS = 1500  # Per pair: up to two points per bucket
+THRESHOLD_COLORS = ('rgba(255,0,0,0.3)', 'rgba(0,0,0,0.3)', 'rgba(0,255,0,0.3)')
+
+
+def pair_figure(times: np.ndarray, correlation: np.ndarray, title: str,
+                thresholds: Sequence[float] = THRESHOLDS, buckets: int = DEFAULT_BUCKETS) -> go.Figure:
+    """WebGL line of the min/max-downsampled correlation, with dashed threshold lines."""
+    valid = ~np.isnan(correlation)
+    times, correlation = times[valid], correlation[valid]
+    keep = minmax_indices(correlation, buckets)
+
+    fig = go.Figure(go.Scattergl(
+        x=times[keep] * 1000,  # Epoch milliseconds on a date axis
+        y=correlation[keep],
+        mode='lines',
+        line=dict(color='rgb(0,100,180)', width=1.5),
+        name=title,
+    ))
+    for k, threshold in enumerate(thresholds):
+        fig.add_hline(y=threshold, line_dash='dash', line_width=1,
+                      line_color=THRESHOLD_COLORS[k % len(THRESHOLD_COLORS)],
+                      annotation_text=f'{threshold:.2f}', annotation_position='right')
+    fig.update_layout(
+        template='none',
+        height=360,
+        margin=dict(t=40, b=40, l=60, r=50),
+        title=dict(text=title, x=0.5),
+        showlegend=False,
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+    )
+    fig.update_xaxes(type='date', showgrid=True, gridcolor='rgba(128,128,128,0.2)', tickformat='%b %Y')
+    fig.update_yaxes(range=[-1, 1], showgrid=True, gridcolor='rgba(128,128,128,0.2)', tickformat='.2f',
+                     title_text='Correlation')
+    return fig
+
+
+def pair_section(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pair1: str, pair2: str, period: int,
+                 thresholds: Sequence[float] = THRESHOLDS, buckets: int = DEFAULT_BUCKETS) -> Dict:
+    """Stats and figure JSON of one pair's rolling returns correlation."""
+    times, correlation = pair_correlation(closes, pair1, pair2, period)
+    figure = pair_figure(times, correlation, f'{pair1} vs {pair2}', thresholds, buckets)
+    return {
+        'pair1': pair1,
+        'pair2': pair2,
+        'stats': correlation_stats(times, correlation, thresholds),
+        'figure': figure.to_json(),
+    }
+
+
+def _pair_section_job(pair1, pair2, period, thresholds, buckets) -> Dict:
+    return pair_section(worker_data(), pair1, pair2, period, thresholds, buckets)
+
+
+def build_sections(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pairs: Sequence[Tuple[str, str]],
+                   period: int = 20, thresholds: Sequence[float] = THRESHOLDS, buckets: int = DEFAULT_BUCKETS,
+                   processes: int = 1) -> List[Dict]:
+    """
+    pair_section for each of ``pairs``, in order.
+
+    Parameters:
+        closes: Output of pair_screener.load_closes, covering every symbol of ``pairs``
+        pairs: (pair1, pair2) combinations to report
+        period: Rolling correlation window in bars
+        thresholds: Threshold lines and below-threshold counts
+        buckets: Downsampling buckets per pair
+        processes: Worker processes; 1 builds the sections in the calling process
+    """
+    workers = min(processes, len(pairs))
+    if workers > 1:
+        n = len(pairs)
+        with spawn_pool(workers, closes) as executor:
+            return list(executor.map(_pair_section_job, [p1 for p1, _ in pairs], [p2 for _, p2 in pairs],
+                                     [period] * n, [thresholds] * n, [buckets] * n,
+                                     chunksize=max(1, n // (4 * workers))))
+    return [pair_section(closes, pair1, pair2, period, thresholds, buckets) for pair1, pair2 in pairs]
+
+
+# Plots a section while it is near the viewport and purges it once it leaves, so only a few
+# WebGL contexts exist at a time
+_LAZY_PLOT_SCRIPT = """
+const observer = new IntersectionObserver((entries) => {
+  for (const entry of entries) {
+    const div = entry.target;
+    if (entry.isIntersecting && !div.dataset.plotted) {
+      const figure = JSON.parse(document.getElementById(div.dataset.figure).textContent);
+      Plotly.newPlot(div, figure.data, figure.layout, {responsive: true, displaylogo: false});
+      div.dataset.plotted = "1";
+    } else if (!entry.isIntersecting && div.dataset.plotted) {
+      Plotly.purge(div);
+      delete div.dataset.plotted;
+    }
+  }
+}, {rootMargin: "400px 0px"});
+document.querySelectorAll(".plot").forEach((div) => observer.observe(div));
+"""
+
+_STYLE = """
+body { font-family: sans-serif; margin: 24px; color: #222; }
+table { border-collapse: collapse; font-size: 13px; margin-bottom: 32px; }
+th, td { border-bottom: 1px solid #ddd; padding: 4px 10px; text-align: right; }
+th:first-child, td:first-child { text-align: left; }
+.pair { margin-bottom: 32px; }
+.plot { height: 360px; }
+.stats { font-size: 13px; color: #555; }
+"""
+
+
+def render_html(sections: Sequence[Dict], title: str, thresholds: Sequence[float] = THRESHOLDS) -> str:
+    """The report page: a summary table linking to one lazily plotted section per pair."""
+    from plotly.offline import get_plotlyjs
+
+    labels = [threshold_label(threshold) for threshold in thresholds]
+    header = ''.join(f'<th>Below {threshold:.2f}</th>' for threshold in thresholds)
+    rows, bodies = [], []
+    for k, section in enumerate(sections):
+        stats = section['stats']
+        name = html.escape(f"{section['pair1']} vs {section['pair2']}")
+        counts = ''.join(f"<td>{stats[f'below_{label}']} ({stats[f'pct_below_{label}']:.1f}%)</td>" for label in labels)
+        average = 'n/a' if np.isnan(stats['avg_corr']) else f"{stats['avg_corr']:.3f}"
+        rows.append(f'<tr><td><a href="#pair-{k}">{name}</a></td><td>{average}</td>{counts}'
+                    f"<td>{stats['total_periods']}</td><td>{stats['min_date']} to {stats['max_date']}</td></tr>")
+        # "</" would end the script element early
+        figure = section['figure'].replace('</', '<\\/')
+        bodies.append(
+            f'<section class="pair" id="pair-{k}"><h2>{name}</h2>'
+            f'<div class="stats">Average {average}, {stats["total_periods"]} periods</div>'
+            f'<div class="plot" data-figure="figure-{k}"></div>'
+            f'<script type="application/json" id="figure-{k}">{figure}</script></section>'
+        )
+
+    return (
+        '<!DOCTYPE html>\n<html><head><meta charset="utf-8">'
+        f'<title>{html.escape(title)}</title><style>{_STYLE}</style>'
+        f'<script>{get_plotlyjs()}</script></head><body>'
+        f'<h1>{html.escape(title)}</h1>'
+        f'<p>{len(sections)} pairs, generated {datetime.now():%Y-%m-%d %H:%M}</p>'
+        f'<table><tr><th>Pair</th><th>Average</th>{header}<th>Periods</th><th>Range</th></tr>{"".join(rows)}</table>'
+        f'{"".join(bodies)}<script>{_LAZY_PLOT_SCRIPT}</script></body></html>'
+    )
+
+
+def write_report(path: str, closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pairs: Sequence[Tuple[str, str]],
+                 period: int = 20, thresholds: Sequence[float] = THRESHOLDS, buckets: int = DEFAULT_BUCKETS,
+                 processes: int = 1, title: str = None) -> List[Dict]:
+    """Build the sections of ``pairs`` and write the report to ``path``; returns the sections."""
+    sections = build_sections(closes, pairs, period, thresholds, buckets, processes)
+    page = render_html(sections, title or f'{period}-Period Rolling Correlations', thresholds)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return sections
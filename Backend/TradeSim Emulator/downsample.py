@@ -0,0 +1,112 @@
+"""
+Series downsampling for charts.
+
+Largest-Triangle-Three-Buckets (LTTB) keeps the points that define a line's
+visual shape: the first and last points, plus one point per bucket chosen to
+maximise the triangle it forms with the previous pick and the next bucket's
+mean. Buckets holding the series minimum or maximum keep that point instead,
+so extremes (e.g. correlation dips through the entry threshold) never vanish.
+
+Min/max bucketing is the cheaper alternative for long series: it keeps each
+bucket's lowest and highest point, so every local extreme survives, in one
+vectorized pass instead of a loop over buckets.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Indices of the points LTTB keeps when reducing ``(x, y)`` to ``threshold`` points.
+    NaN values must be removed beforehand.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket edges over the interior points; first and last points are always kept
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    global_extremes = {int(np.argmin(y)), int(np.argmax(y))}
+    previous = 0
+    for b in range(threshold - 2):
+        start, end = edges[b], edges[b + 1]
+        if end <= start:
+            end = start + 1
+        forced = [i for i in global_extremes if start <= i < end]
+        if forced:
+            # Keep the series extreme that falls in this bucket
+            previous = max(forced, key=lambda i: abs(y[i] - y[previous]))
+            selected[b + 1] = previous
+            continue
+
+        next_start = end
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        ax, ay = x[previous], y[previous]
+        areas = np.abs((ax - next_x) * (y[start:end] - ay) - (ax - x[start:end]) * (next_y - ay))
+        previous = start + int(np.argmax(areas))
+        selected[b + 1] = previous
+
+    return selected
+
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Indices of the first and last points and of each bucket's minimum and maximum,
+    ascending, when reducing ``y`` to about ``2 * buckets`` points. NaN values must
+    be removed beforehand.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if 2 * buckets + 2 >= n or buckets < 1:
+        return np.arange(n)
+
+    size = -(-n // buckets)  # Points per bucket, rounded up
+    rows = -(-n // size)
+    # Pad the last bucket so buckets form the rows of a matrix; padding never wins
+    low = np.full(rows * size, np.inf)
+    high = np.full(rows * size, -np.inf)
+    low[:n] = y
+    high[:n] = y
+    offsets = np.arange(rows) * size
+    keep = np.concatenate(([0, n - 1],
+                           offsets + low.reshape(rows, size).argmin(axis=1),
+                           offsets + high.reshape(rows, size).argmax(axis=1)))
+    return np.unique(keep)
+
+
+def downsample_series(times: np.ndarray, values: np.ndarray, width: int) -> Dict[str, List]:
+    """
+    Compact chart payload: ``{"t": [epoch seconds], "v": [values]}`` reduced to at
+    most ``width`` points. NaN values (indicator warm-up) are dropped.
+    """
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype('datetime64[s]').astype(np.int64)
+    values = np.asarray(values, dtype=np.float64)
+
+    valid = ~np.isnan(values)
+    times, values = times[valid], values[valid]
+    keep = lttb_indices(times, values, width)
+    return {
+        "t": times[keep].astype(np.int64).tolist(),
+        "v": np.round(values[keep], 6).tolist(),
+        "points": int(len(times)),
+    }
+
+
+def clip_range(times: np.ndarray, *columns: np.ndarray, start=None, end=None) -> Tuple[np.ndarray, ...]:
+    """Restrict time-sorted columns to [start, end] (epoch seconds; either may be None)."""
+    seconds = times.astype('datetime64[s]').astype(np.int64) if np.issubdtype(times.dtype, np.datetime64) else times
+    lo = 0 if start is None else int(np.searchsorted(seconds, start, side='left'))
+    hi = len(seconds) if end is None else int(np.searchsorted(seconds, end, side='right'))
+    return (times[lo:hi],) + tuple(column[lo:hi] for column in columns)
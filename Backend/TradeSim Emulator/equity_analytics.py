@@ -0,0 +1,175 @@
+"""
+Vectorized equity accounting for backtests.
+
+Open positions are marked to market on every bar of a shared timeline without
+looping over bars: each symbol's signed lots and signed cost basis are step
+functions that change only at entries and exits, so they are built with one
+cumulative sum each, and unrealized P&L is ``units * price - cost`` scaled by
+the symbol's pip value. Realized P&L is a cumulative sum of trade profits at
+their exit bars. Cost is O(bars + trades) per symbol.
+
+P&L follows ``PairedTradingBacktester._calculate_position_profit``: a standard
+lot earns $10 per pip, a pip being 0.01 for JPY pairs and 0.0001 otherwise.
+"""
+from typing import Dict, Mapping, Optional, Sequence, Union
+
+import numpy as np
+
+from trade_log import TradeTable, as_trade_array
+
+STANDARD_PIP_VALUE = 10.0
+
+
+def pip_size(symbol: str) -> float:
+    return 0.01 if symbol.endswith('JPY') else 0.0001
+
+
+def leg_profit(pair: str, entry_price: float, price, lot_size: float, is_long: bool):
+    # Same arithmetic as PairedTradingBacktester._calculate_position_profit, for scalars or arrays
+    price_diff = price - entry_price if is_long else entry_price - price
+    return (price_diff / pip_size(pair)) * (STANDARD_PIP_VALUE * lot_size)
+
+
+def exit_bar(exit_signal: np.ndarray, long_close: np.ndarray, short_close: np.ndarray,
+             trade: Mapping, i: int) -> Optional[int]:
+    """
+    First bar after entry bar ``i`` where the pair strategy closes ``trade``: the
+    exit signal is set (correlation above the exit threshold) and the trade is in
+    profit. None if it stays open to the last bar. A trade's exit depends only on
+    its own P&L, so it is found once, at entry, scanning ahead in growing blocks.
+
+    Parameters:
+        exit_signal: Exit condition of every bar
+        long_close, short_close: Closes of the long and short legs on the same bars
+        trade: ``long_pair``, ``short_pair``, ``long_entry_price``, ``short_entry_price``,
+            ``long_lot`` and ``short_lot``
+        i: Entry bar
+    """
+    n = len(exit_signal)
+    start, size = i + 1, 64
+    while start < n:
+        stop = min(n, start + size)
+        profit = leg_profit(trade['long_pair'], trade['long_entry_price'], long_close[start:stop],
+                            trade['long_lot'], True) + \
+                 leg_profit(trade['short_pair'], trade['short_entry_price'], short_close[start:stop],
+                            trade['short_lot'], False)
+        hits = np.flatnonzero(exit_signal[start:stop] & (profit > 0))
+        if len(hits):
+            return start + int(hits[0])
+        start, size = stop, size * 4
+    return None
+
+
+def mark_to_market(timeline: np.ndarray, prices: Dict[str, np.ndarray],
+                   trades: Union[TradeTable, np.ndarray, Sequence[Dict]]) -> Dict[str, np.ndarray]:
+    """
+    Realized and unrealized P&L in dollars at every bar of ``timeline``.
+
+    A trade is open from its entry bar up to, not including, its exit bar, where
+    its profit moves from unrealized to realized. Trades filled between bars (tick
+    mode) count from the next bar.
+
+    Parameters:
+        timeline: Ascending bar times (datetime64 or int64), in the same unit as the trade times
+        prices: Close price per symbol aligned to ``timeline`` (forward-filled where a symbol has no bar)
+        trades: Closed trades (trade log, TRADE_DTYPE array or dicts) with times, prices, lots and ``total_profit``
+    """
+    timeline = np.asarray(timeline)
+    n = len(timeline)
+    realized = np.zeros(n)
+    unrealized = np.zeros(n)
+    trades = as_trade_array(trades)
+    if len(trades) == 0 or n == 0:
+        return {'realized': realized, 'unrealized': unrealized, 'pnl': realized + unrealized}
+
+    entry_index = np.minimum(n - 1, np.searchsorted(timeline, trades['entry_time'].astype(timeline.dtype)))
+    exit_index = np.minimum(n - 1, np.searchsorted(timeline, trades['exit_time'].astype(timeline.dtype)))
+
+    np.add.at(realized, exit_index, trades['total_profit'])
+    realized = np.cumsum(realized)
+
+    # Per symbol: signed lots, signed lots * entry price and open legs change only at entries and exits
+    legs = (('long_pair', 'long_entry_price', 'long_lot', 1.0),
+            ('short_pair', 'short_entry_price', 'short_lot', -1.0))
+    symbols = np.unique(np.concatenate((trades['long_pair'], trades['short_pair'])))
+    for symbol in symbols:
+        units = np.zeros(n + 1)
+        cost = np.zeros(n + 1)
+        count = np.zeros(n + 1, dtype=np.int64)
+        for pair_field, price_field, lot_field, side in legs:
+            mask = trades[pair_field] == symbol
+            lots = side * trades[lot_field][mask]
+            for index, sign in ((entry_index[mask], 1), (exit_index[mask], -1)):
+                np.add.at(units, index, sign * lots)
+                np.add.at(cost, index, sign * lots * trades[price_field][mask])
+                np.add.at(count, index, sign)
+
+        units = np.cumsum(units[:n])
+        cost = np.cumsum(cost[:n])
+        is_open = np.cumsum(count[:n]) > 0
+        value = (units * np.asarray(prices[str(symbol)], dtype=np.float64) - cost) / pip_size(str(symbol)) * STANDARD_PIP_VALUE
+        # Summed cost bases leave rounding residue once flat, and prices may be NaN before a symbol's first bar
+        unrealized += np.where(is_open, value, 0.0)
+
+    return {'realized': realized, 'unrealized': unrealized, 'pnl': realized + unrealized}
+
+
+# Dollars equity must be below its peak to count as under water
+UNDER_WATER_TOLERANCE = 1e-6
+
+
+def drawdown(equity: np.ndarray) -> Dict[str, np.ndarray]:
+    """Distance below the running peak of ``equity``, in dollars and percent of the peak."""
+    equity = np.asarray(equity, dtype=np.float64)
+    peak = np.maximum.accumulate(equity)
+    dollars = peak - equity
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentage = np.where(peak > 0, dollars / peak * 100, 0.0)
+    return {'peak': peak, 'dollars': dollars, 'percentage': percentage}
+
+
+def time_under_water(times: np.ndarray, equity: np.ndarray) -> Dict[str, float]:
+    """
+    How long ``equity`` spends below its running peak (by more than UNDER_WATER_TOLERANCE).
+    A spell runs from the last bar at the peak to the bar that regains it, or to the
+    final bar if it never does.
+
+    Returns the longest spell in hours and the share of the whole range spent under water.
+    """
+    times = np.asarray(times)
+    if np.issubdtype(times.dtype, np.datetime64):
+        times = times.astype('datetime64[s]').astype(np.int64)
+    equity = np.asarray(equity, dtype=np.float64)
+    # Rounding noise (sums in a different order, e.g. a resumed run) is not a drop below the peak
+    below = equity < np.maximum.accumulate(equity) - UNDER_WATER_TOLERANCE
+    if len(equity) < 2 or not below.any():
+        return {'max_hours': 0.0, 'percentage': 0.0}
+
+    edges = np.diff(np.concatenate(([0], below.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)  # First bar of each spell; never bar 0, which is its own peak
+    ends = np.minimum(np.flatnonzero(edges == -1), len(equity) - 1)  # Recovery bar, or the last bar
+    durations = times[ends] - times[starts - 1]
+    span = times[-1] - times[0]
+    return {
+        'max_hours': float(durations.max() / 3600),
+        'percentage': float(durations.sum() / span * 100) if span > 0 else 0.0,
+    }
+
+
+def equity_summary(equity: np.ndarray, initial_balance: float) -> Dict[str, float]:
+    """Headline figures of a mark-to-market equity curve."""
+    if len(equity) == 0:
+        return {
+            'final_equity': initial_balance, 'peak_equity': initial_balance,
+            'max_drawdown_dollars': 0.0, 'max_drawdown_percentage': 0.0,
+            'net_profit_dollars': 0.0, 'net_profit_percentage': 0.0,
+        }
+    dd = drawdown(equity)
+    return {
+        'final_equity': float(equity[-1]),
+        'peak_equity': float(max(dd['peak'][-1], initial_balance)),
+        'max_drawdown_dollars': float(dd['dollars'].max()),
+        'max_drawdown_percentage': float(dd['percentage'].max()),
+        'net_profit_dollars': float(equity[-1] - initial_balance),
+        'net_profit_percentage': float((equity[-1] - initial_balance) / initial_balance * 100),
+    }
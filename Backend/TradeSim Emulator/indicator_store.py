@@ -0,0 +1,283 @@
+"""
+Persisted indicator series shared by backtests, plots and correlation screens.
+
+Series are stored per (kernel, parameters, symbols, timeframe, MT5 server) as
+columnar data: the bar times, the inputs they were computed from and the
+computed values. Stored rows are only reused while the request's inputs are
+identical to the stored ones: from the first bar whose input differs (a bar that
+was still forming when stored, revised history) the series is recomputed. A
+request over a range the store already covers is a slice; a request that runs
+past the stored end only computes the new bars (plus the window lookback they
+need) and appends them.
+
+On disk a series is a directory of ``.npz`` segments, each named after the rows
+it was written with, and an extension writes only its new rows as a segment
+rather than rewriting the history. A segment replaces every row from its first
+one on, so recomputing a forming bar leaves the older segment holding it in
+place and its overlapped rows unread. Trailing segments are merged while one is
+no larger than the rows after it, so a series has O(log rows) segments and each
+row is rewritten O(log rows) times over the series' life.
+
+Kernels are causal and windowed: the value at a bar depends on at most
+``lookback`` preceding bars. The first ``lookback`` values of every request are
+computed from the request's own inputs, so warm-up NaNs are those of a
+from-scratch computation over the same range. Later values match it to
+floating-point rounding, not bit for bit: pandas' rolling kernels carry running
+sums, so a value's last bits depend on the row the computation started from.
+Recursive kernels (EWMA) have no lookback and are always computed over the
+whole request.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from bar_data import data_source
+from cointegration import hedge_ratio
+from correlation_kernels import ewma_corr, log_returns_corr, spearman_corr
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_DIR = os.environ.get(
+    "INDICATOR_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".indicator_store"),
+)
+SEGMENT_NAME = re.compile(r"^(\d+)-(\d+)\.npz$")  # Rows [start, stop) of a series when written
+
+
+def _rolling_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Backtester correlation: pandas rolling Pearson over the last ``window`` closes."""
+    return pd.Series(inputs[0]).rolling(window=window).corr(pd.Series(inputs[1])).to_numpy()
+
+
+def _sma_rsi(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """Backtester RSI: simple moving averages of gains and losses."""
+    delta = pd.Series(inputs[0]).diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+    rs = gain / loss
+    return (100 - (100 / (1 + rs))).to_numpy()
+
+
+def _trailing_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """/mt5/plot-indicators correlation: Pearson over the ``window`` bars before each bar."""
+    prices1, prices2 = inputs
+    correlation = np.full(len(prices1), np.nan)
+    for i in range(window, len(prices1)):
+        correlation[i] = np.corrcoef(prices1[i - window:i], prices2[i - window:i])[0, 1]
+    return correlation
+
+
+def _returns_corr(inputs: Sequence[np.ndarray], window: int) -> np.ndarray:
+    """mt5_bridge correlation: rolling Pearson of bar-to-bar percentage returns."""
+    returns1 = pd.Series(inputs[0]).pct_change()
+    returns2 = pd.Series(inputs[1]).pct_change()
+    return returns1.rolling(window).corr(returns2).to_numpy()
+
+
+# name -> (kernel, lookback in bars for the given window; None when every value depends on all earlier bars)
+KERNELS: Dict[str, Tuple[Callable[..., np.ndarray], Callable[[int], Optional[int]]]] = {
+    "rolling_corr": (_rolling_corr, lambda window: window - 1),
+    "sma_rsi": (_sma_rsi, lambda window: window),
+    "trailing_corr": (_trailing_corr, lambda window: window),
+    "returns_corr": (_returns_corr, lambda window: window),
+    "log_returns_corr": (log_returns_corr, lambda window: window),
+    "ewma_corr": (ewma_corr, lambda window: None),
+    "spearman_corr": (spearman_corr, lambda window: window),
+    "hedge_ratio": (hedge_ratio, lambda window: window - 1),
+}
+
+
+class IndicatorStore:
+    def __init__(self, store_dir: str = DEFAULT_STORE_DIR, max_memory_series: int = 16):
+        """
+        Parameters:
+            store_dir: Directory holding one directory of .npz segments per stored series; None keeps series in memory only
+            max_memory_series: Recently used series kept in memory to skip file reads
+        """
+        self.store_dir = store_dir
+        self.max_memory_series = max_memory_series
+        self._memory: "OrderedDict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.computed_rows = 0
+        self.reused_rows = 0
+
+    @staticmethod
+    def series_key(kernel: str, window: int, symbols: Sequence[str], timeframe: int, source: str = '') -> str:
+        payload = json.dumps({"kernel": kernel, "window": int(window), "symbols": list(symbols),
+                              "timeframe": int(timeframe), "source": source}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+    def get(self, kernel: str, window: int, symbols: Sequence[str], timeframe: int,
+            times: np.ndarray, inputs: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        Indicator values for bars at ``times`` (int64 epoch seconds, ascending).
+
+        Parameters:
+            kernel: Name in KERNELS
+            window: Kernel window in bars
+            symbols: Symbols the inputs belong to, part of the series identity
+            timeframe: Bar timeframe in minutes, part of the series identity
+            times: Bar times of the inputs
+            inputs: Input arrays (e.g. closes) aligned to ``times``
+        """
+        if kernel not in KERNELS:
+            raise ValueError(f"Unknown indicator kernel: {kernel}")
+        compute, lookback_for = KERNELS[kernel]
+        lookback = lookback_for(int(window))
+        times = np.asarray(times, dtype=np.int64)
+        inputs = [np.asarray(values, dtype=np.float64) for values in inputs]
+        n = len(times)
+        if lookback is None:
+            # Recursive (EWMA): a stored series started elsewhere would not match, so compute the request
+            self.computed_rows += n
+            return compute(inputs, int(window))
+        if n <= lookback:
+            self.computed_rows += n
+            return compute(inputs, int(window))
+
+        key = self.series_key(kernel, window, symbols, timeframe, data_source())
+        columns = np.column_stack(inputs)
+        stored = self._load(key)
+        start = self._reusable_start(stored, times, columns)
+
+        if start is None or start <= lookback:
+            # Nothing usable stored: compute the whole request and store it in place of the old series
+            values = compute(inputs, int(window))
+            self.computed_rows += n
+            self._save(key, times, columns, values)
+            return values
+
+        stored_times, stored_inputs, stored_values = stored
+        offset = int(np.searchsorted(stored_times, times[0]))
+        # Rows [0, start) come from the store; the first changed or new bar and anything after are recomputed
+        values = np.empty(n, dtype=np.float64)
+        values[:start] = stored_values[offset:offset + start]
+        if start < n:
+            from_row = start - lookback
+            values[start:] = compute([v[from_row:] for v in inputs], int(window))[lookback:]
+            self._save(key, np.concatenate((stored_times[:offset + start], times[start:])),
+                       np.concatenate((stored_inputs[:offset + start], columns[start:])),
+                       np.concatenate((stored_values[:offset + start], values[start:])), keep=offset + start)
+        # Warm-up rows see only this request's history, exactly as a fresh computation would
+        values[:lookback] = compute([v[:lookback] for v in inputs], int(window))
+        self.computed_rows += (n - start) + lookback
+        self.reused_rows += start - lookback
+        return values
+
+    @staticmethod
+    def _reusable_start(stored, times: np.ndarray, columns: np.ndarray):
+        """
+        Number of leading request rows that can be read from the stored series: the
+        rows before the first bar whose inputs differ from the stored ones. None if
+        the stored series does not line up with the request.
+        """
+        if stored is None:
+            return None
+        stored_times, stored_inputs, _ = stored
+        if len(stored_times) == 0 or times[0] < stored_times[0] or times[0] > stored_times[-1] \
+                or stored_inputs.shape[1] != columns.shape[1]:
+            return None
+        offset = int(np.searchsorted(stored_times, times[0]))
+        overlap = min(len(stored_times) - offset, len(times))
+        if not np.array_equal(stored_times[offset:offset + overlap], times[:overlap]):
+            return None
+        # Values from a changed input on depend on it (a bar still forming when stored, revised history)
+        same = np.array_equal(stored_inputs[offset:offset + overlap], columns[:overlap], equal_nan=True)
+        if not same:
+            stored_rows, rows = stored_inputs[offset:offset + overlap], columns[:overlap]
+            changed = (stored_rows != rows) & ~(np.isnan(stored_rows) & np.isnan(rows))
+            overlap = int(np.argmax(changed.any(axis=1)))
+        return overlap
+
+    def _segments(self, key: str) -> List[Tuple[int, int, str]]:
+        """(first row, end row, path) of each segment file of a series, in row order."""
+        directory = os.path.join(self.store_dir, key)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+        segments = []
+        for name in names:
+            match = SEGMENT_NAME.match(name)
+            if match:
+                segments.append((int(match.group(1)), int(match.group(2)), os.path.join(directory, name)))
+        return sorted(segments)
+
+    def _load(self, key: str):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+        if not self.store_dir:
+            return None
+        try:
+            segments = self._segments(key)
+            if not segments:
+                return None
+            parts, end = [], 0
+            for k, (start, stop, path) in enumerate(segments):
+                if start > end:
+                    raise ValueError(f"no segment holds row {end}")
+                # Rows from the next segment's first one on are replaced by it
+                rows = (segments[k + 1][0] if k + 1 < len(segments) else stop) - start
+                with np.load(path) as segment:
+                    parts.append(tuple(segment[name][:rows] for name in ("time", "input", "value")))
+                end = stop
+            series = tuple(np.concatenate(column) for column in zip(*parts))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable indicator series {key}: {e}")
+            return None
+        self._remember(key, series)
+        return series
+
+    def _save(self, key: str, times: np.ndarray, inputs: np.ndarray, values: np.ndarray, keep: int = 0) -> None:
+        """Store a whole series; its first ``keep`` rows are already on disk, so only later rows are written."""
+        self._remember(key, (times, inputs, values))
+        if not self.store_dir:
+            return
+        try:
+            with self._disk_lock:
+                self._write_segment(key, times, inputs, values, keep)
+        except OSError as e:
+            logger.warning(f"Could not persist indicator series {key}: {e}")
+
+    def _write_segment(self, key: str, times: np.ndarray, inputs: np.ndarray, values: np.ndarray, keep: int) -> None:
+        segments, obsolete = [], []
+        for segment in self._segments(key):
+            # A segment holding kept rows stays; the new one replaces its rows from ``keep`` on
+            (segments if segment[0] < keep else obsolete).append(segment)
+        start = keep
+        while segments and start - segments[-1][0] <= len(times) - start:
+            start = segments[-1][0]
+            obsolete.append(segments.pop())
+
+        directory = os.path.join(self.store_dir, key)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{start}-{len(times)}.npz")
+        tmp_path = os.path.join(directory, f"{start}.{os.getpid()}.tmp.npz")
+        np.savez(tmp_path, time=times[start:], input=inputs[start:], value=values[start:])
+        os.replace(tmp_path, path)
+        for _, _, old_path in obsolete:
+            if old_path != path:
+                os.remove(old_path)
+
+    def _remember(self, key: str, series) -> None:
+        with self._lock:
+            self._memory[key] = series
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_series:
+                self._memory.popitem(last=False)
+
+
+indicator_store = IndicatorStore()
@@ -1,11 +1,22 @@
 import MetaTrader5 as mt5
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
+import threading
+from collections import OrderedDict
+from correlation_kernels import DEFAULT_KERNEL, CorrelationTracker, PairBarTracker
+from cointegration import CointegrationTracker
+from bar_data import TIMEFRAMES, data_source
 
 logger = logging.getLogger(__name__)
 
+# Live correlation state per (MT5 server, pair1, pair2, window, timeframe, kernel), and cointegration
+# state with 'cointegration' as kernel; least recently used evicted first
+MAX_CORRELATION_TRACKERS = 64
+correlation_trackers: "OrderedDict[tuple, PairBarTracker]" = OrderedDict()
+correlation_trackers_lock = threading.Lock()
+
 def calculate_rsi(symbol: str, period: int, timeframe: int) -> float:
     """
     Standardized RSI calculation for both live trading and websocket indicators.
@@ -15,17 +26,7 @@ def calculate_rsi(symbol: str, period: int, timeframe: int) -> float:
         timeframe: Trading timeframe in minutes (e.g., 1, 5, 15, 30, 60, 240, 1440)
     """
     try:
-        # Map timeframe to MT5 constant
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1
-        }
-        mt5_timeframe = timeframe_map.get(timeframe)
+        mt5_timeframe = TIMEFRAMES.get(timeframe)
         if mt5_timeframe is None:
             logger.error(f"Invalid timeframe: {timeframe}")
             return None
@@ -53,43 +54,71 @@ def calculate_rsi(symbol: str, period: int, timeframe: int) -> float:
         logger.error(f"Error calculating RSI: {e}")
         return None
 
-def calculate_correlation(pair1: str, pair2: str, window: int, timeframe: int) -> float:
+def _correlation_rates(tracker: PairBarTracker, symbol: str, mt5_timeframe: int):
+    if tracker.pending_time is None:
+        # Twice the history the kernel needs, so the bar times both symbols share still fill it
+        return mt5.copy_rates_from_pos(symbol, mt5_timeframe, 0, 2 * tracker.history_bars)
+    # From the pending bar, which is replaced, up to whatever is newest on the server
+    return mt5.copy_rates_range(symbol, mt5_timeframe, datetime.fromtimestamp(tracker.pending_time, tz=timezone.utc),
+                                datetime.now(timezone.utc) + timedelta(days=1))
+
+def _updated_tracker(key: tuple, make_tracker, pair1: str, pair2: str, mt5_timeframe: int):
+    """
+    The live tracker under ``key`` on the current MT5 server (created with ``make_tracker``
+    if missing), fed the bars since its previous update; None if the bars cannot be loaded.
+    """
+    # Another server's bars must not extend a window built from this one's
+    key = (data_source(),) + key
+    with correlation_trackers_lock:
+        tracker = correlation_trackers.get(key)
+        if tracker is None:
+            tracker = make_tracker()
+            correlation_trackers[key] = tracker
+        correlation_trackers.move_to_end(key)
+        while len(correlation_trackers) > MAX_CORRELATION_TRACKERS:
+            correlation_trackers.popitem(last=False)
+
+    rates1 = _correlation_rates(tracker, pair1, mt5_timeframe)
+    rates2 = _correlation_rates(tracker, pair2, mt5_timeframe)
+    if tracker.pending_time is not None and (rates1 is None or rates2 is None or len(rates1) == 0 or len(rates2) == 0):
+        # The pending bar is gone (e.g. a replay rewound the clock): start over from fresh history
+        tracker = make_tracker()
+        with correlation_trackers_lock:
+            correlation_trackers[key] = tracker
+        rates1 = _correlation_rates(tracker, pair1, mt5_timeframe)
+        rates2 = _correlation_rates(tracker, pair2, mt5_timeframe)
+    if rates1 is None or rates2 is None:
+        return None
+
+    times, index1, index2 = np.intersect1d(rates1['time'], rates2['time'], assume_unique=True, return_indices=True)
+    tracker.update(times, rates1['close'][index1], rates2['close'][index2])
+    return tracker
+
+def calculate_correlation(pair1: str, pair2: str, window: int, timeframe: int, kernel: str = DEFAULT_KERNEL) -> float:
     """
     Standardized correlation calculation for both live trading and websocket indicators.
+    Each (pairs, window, timeframe, kernel) keeps an incremental kernel (see correlation_kernels),
+    so a call only fetches and processes the bars since the previous call.
     Parameters:
         pair1: First trading pair symbol
         pair2: Second trading pair symbol
         window: Correlation window period
         timeframe: Trading timeframe in minutes (e.g., 1, 5, 15, 30, 60, 240, 1440)
+        kernel: Correlation kernel, a name in correlation_kernels.CORRELATION_KERNELS
     """
     try:
-        # Map timeframe to MT5 constant
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1
-        }
-        mt5_timeframe = timeframe_map.get(timeframe)
+        mt5_timeframe = TIMEFRAMES.get(timeframe)
         if mt5_timeframe is None:
             logger.error(f"Invalid timeframe: {timeframe}")
             return None
             
-        logger.info(f"Calculating correlation between {pair1} and {pair2} - Window: {window}, Timeframe: {timeframe} minutes")
-        rates1 = mt5.copy_rates_from_pos(pair1, mt5_timeframe, 0, window + 1)
-        rates2 = mt5.copy_rates_from_pos(pair2, mt5_timeframe, 0, window + 1)
-        
-        if rates1 is None or rates2 is None:
+        logger.info(f"Calculating {kernel} correlation between {pair1} and {pair2} - Window: {window}, Timeframe: {timeframe} minutes")
+        tracker = _updated_tracker((pair1, pair2, int(window), timeframe, kernel),
+                                   lambda: CorrelationTracker(kernel, window), pair1, pair2, mt5_timeframe)
+        if tracker is None:
             logger.error(f"Failed to get data for {pair1} or {pair2}")
             return None
-            
-        prices1 = pd.Series([rate['close'] for rate in rates1])
-        prices2 = pd.Series([rate['close'] for rate in rates2])
-        
-        correlation = prices1.rolling(window=window).corr(prices2).iloc[-1]
+        correlation = tracker.value()
         final_correlation = float(correlation) if not np.isnan(correlation) else None
         logger.info(f"Correlation result: {final_correlation}")
         return final_correlation
@@ -98,6 +127,37 @@ def calculate_correlation(pair1: str, pair2: str, window: int, timeframe: int) -
         logger.error(f"Error calculating correlation: {e}")
         return None
 
+def calculate_hedge_ratio(pair1: str, pair2: str, window: int, timeframe: int) -> dict:
+    """
+    Live hedge ratio and Engle-Granger cointegration of pair1 on pair2 over the last
+    ``window`` bars, updated recursively from the bars since the previous call
+    (see cointegration.RollingCointegration).
+    Parameters:
+        pair1: First trading pair symbol (the regression's dependent series)
+        pair2: Second trading pair symbol
+        window: Regression window in bars
+        timeframe: Trading timeframe in minutes (e.g., 1, 5, 15, 30, 60, 240, 1440)
+    Returns hedge_ratio, intercept, adf_stat and half_life (None until ready), or None on failure.
+    """
+    try:
+        mt5_timeframe = TIMEFRAMES.get(timeframe)
+        if mt5_timeframe is None:
+            logger.error(f"Invalid timeframe: {timeframe}")
+            return None
+
+        tracker = _updated_tracker((pair1, pair2, int(window), timeframe, 'cointegration'),
+                                   lambda: CointegrationTracker(window), pair1, pair2, mt5_timeframe)
+        if tracker is None:
+            logger.error(f"Failed to get data for {pair1} or {pair2}")
+            return None
+        stats = {name: (None if np.isnan(value) else value) for name, value in tracker.value().items()}
+        logger.info(f"Hedge ratio {pair1}/{pair2}: {stats['hedge_ratio']}, ADF: {stats['adf_stat']}")
+        return stats
+
+    except Exception as e:
+        logger.error(f"Error calculating hedge ratio: {e}")
+        return None
+
 def get_tick_data(symbol: str) -> dict:
     """
     Standardized tick data retrieval for both systems.
@@ -12,8 +12,9 @@ from dataclasses import dataclass
 from collections import deque
 import logging
 import sys
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from indicator_utils import calculate_rsi, calculate_correlation, get_tick_data
+from correlation_kernels import DEFAULT_KERNEL, validate_kernel
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +55,12 @@ class StrategyParameters(BaseModel):
     exitThreshold: float
     startingBalance: float
     status: str
+    correlationKernel: str = DEFAULT_KERNEL  # See correlation_kernels.CORRELATION_KERNELS
+
+    @field_validator('correlationKernel')
+    @classmethod
+    def validate_correlation_kernel(cls, v):
+        return validate_kernel(v)
 
     @property
     def strategy_id(self) -> str:
@@ -284,7 +291,8 @@ class ConnectionManager:
                     correlation = calculate_correlation(
                         pair1, pair2, 
                         params.correlationWindow, 
-                        params.timeFrame
+                        params.timeFrame,
+                        params.correlationKernel
                     )
 
                     rsi_values = {
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi import FastAPI, HTTPException, Depends, Request, Query
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware import Middleware
@@ -14,18 +14,41 @@ import numpy as np
 import time
 from datetime import datetime, timedelta
 import pytz
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-import io
 import base64
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, Response
 from typing import Dict, List, Tuple, Optional, Union
-from io import BytesIO
 from typing import Optional
+import copy
+import heapq
 import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from functools import lru_cache
-from collections import defaultdict
-from indicator_utils import calculate_rsi, calculate_correlation, get_tick_data
+from collections import OrderedDict, defaultdict
+from indicator_utils import calculate_rsi, calculate_correlation, calculate_hedge_ratio, get_tick_data
+from correlation_kernels import CORRELATION_KERNELS, DEFAULT_KERNEL, validate_kernel, warmup_bars
+from cointegration import (DEFAULT_MAX_LOT_MULTIPLE, MIN_LIVE_WINDOW, hedge_lot,
+                           validate_window as validate_hedge_ratio_window)
+from correlation_matrix import MAX_SYMBOLS, RollingCorrelationMatrix, align_closes
+from bar_data import TIMEFRAMES, resample_ohlc, align_to_execution, load_bars, epoch_seconds, data_source
+from downsample import downsample_series, clip_range
+from equity_analytics import (drawdown, equity_summary, exit_bar, leg_profit, mark_to_market,
+                              time_under_water)
+from indicator_store import indicator_store
+from optimizer import sample_candidates, successive_halving
+from pair_screener import THRESHOLDS as SCREENER_THRESHOLDS, load_closes, screen as screen_pairs
+from correlation_regimes import analyze_universe as analyze_correlation_regimes, episode_records
+from monte_carlo import METHODS as MONTE_CARLO_METHODS, simulate as simulate_monte_carlo
+from plot_renderer import (PLOTS, RenderPool, RenderQueueFull, RenderWorkersRestarted, render_correlation_vs_profit,
+                           render_equity_curve, render_correlation_timeline)
+from result_cache import BacktestResultCache, request_key
+from walk_forward import (OBJECTIVES as WALK_FORWARD_OBJECTIVES, PARAMETERS as WALK_FORWARD_PARAMETERS,
+                          parameter_sets, run_windows, stability_report, stitch, trade_metrics,
+                          window_bounds)
+from trade_log import ENTRY_FIELDS, EXPORT_FORMATS, TradeTable, as_trade_array, iter_export, records
+from tick_stream import iter_tick_chunks, merge_tick_streams, TickThroughput
 
 logger = logging.getLogger(__name__)
 
@@ -70,6 +93,10 @@ class BacktestRequest(BaseModel):
     endDate: datetime
     cooldownPeriod: float = 24.0
     startingBalance: float = Field(gt=0)  # Changed from initial_balance to startingBalance
+    tickMode: bool = False  # Evaluate exits on every tick with bid/ask fills
+    correlationKernel: str = DEFAULT_KERNEL  # See correlation_kernels.CORRELATION_KERNELS
+    hedgeRatioWindow: Optional[int] = None  # Size pair2's lot by the rolling hedge ratio over this many bars
+    hedgeLotMultiple: float = Field(DEFAULT_MAX_LOT_MULTIPLE, gt=0)  # Hedged pair2 lot cap, in multiples of lotSize[1]
 
     @field_validator('currencyPairs')
     @classmethod
@@ -116,6 +143,16 @@ class BacktestRequest(BaseModel):
             raise ValueError('RSI levels must be between 0 and 100')
         return v
 
+    @field_validator('correlationKernel')
+    @classmethod
+    def validate_correlation_kernel(cls, v):
+        return validate_kernel(v)
+
+    @field_validator('hedgeRatioWindow')
+    @classmethod
+    def validate_hedge_ratio_window(cls, v):
+        return v if v is None else validate_hedge_ratio_window(v)
+
     @field_validator('entryThreshold')
     @classmethod
     def validate_entry_threshold(cls, v):
@@ -222,6 +259,8 @@ class PerformanceMetrics(BaseModel):
     profit_factor: float
     peak_balance: float
     final_balance: float
+    max_time_under_water_hours: float = 0.0
+    time_under_water_percentage: float = 0.0
 
 class EquityCurveData(BaseModel):
     date: str  # Ensure the date is a string
@@ -229,13 +268,287 @@ class EquityCurveData(BaseModel):
     
     
 
+class BatchBacktestRequest(BaseModel):
+    strategies: List[BacktestRequest]
+
+    @field_validator('strategies')
+    @classmethod
+    def validate_strategies(cls, v):
+        if not 1 <= len(v) <= 50:
+            raise ValueError('Provide between 1 and 50 strategies')
+        return v
+
 class BacktestResponse(BaseModel):
-    trades: List[TradeLog]
+    result_id: str  # Plots are served from /mt5/backtest-results/{result_id}/plots/{plot_name}
+    trades: List[TradeLog]  # First page; the rest from /mt5/backtest-results/{result_id}/trades
+    trade_count: int = 0
     metrics: PerformanceMetrics
-    correlation_vs_profit_plot: Optional[str] = None
-    equity_curve_plot: Optional[str] = None
     equity_curve_data: Optional[List[EquityCurveData]] = None
-    correlation_timeline_plot: Optional[str] = None
+    tick_stats: Optional[Dict[str, float]] = None
+    resumed_from: Optional[datetime] = None  # Bar a checkpointed earlier run was continued from
+
+class TradePage(BaseModel):
+    result_id: str
+    total: int
+    offset: int
+    limit: int
+    trades: List[TradeLog]
+
+class BatchBacktestItem(BaseModel):
+    id: int
+    name: str
+    result: Optional[BacktestResponse] = None
+    error: Optional[str] = None
+
+class BatchBacktestResponse(BaseModel):
+    results: List[BatchBacktestItem]
+    stats: Dict[str, int]
+
+class PortfolioBacktestRequest(BaseModel):
+    strategies: List[BacktestRequest]  # startingBalance of each strategy is ignored; they share the account
+    startingBalance: float = Field(gt=0)
+    maxOpenTrades: Optional[int] = Field(default=None, gt=0)  # Across all strategies
+
+    @field_validator('strategies')
+    @classmethod
+    def validate_strategies(cls, v):
+        if not 1 <= len(v) <= 50:
+            raise ValueError('Provide between 1 and 50 strategies')
+        if any(strategy.tickMode for strategy in v):
+            raise ValueError('Tick mode is not supported in portfolio backtests')
+        return v
+
+class PortfolioStrategyResult(BaseModel):
+    id: int
+    name: str
+    trades: List[TradeLog]
+    metrics: PerformanceMetrics
+    pnl: Dict[str, Union[List[float], int]]  # Mark-to-market P&L, {"t", "v", "points"} as in downsample_series
+
+class PortfolioBacktestResponse(BaseModel):
+    metrics: Dict[str, Union[int, float]]
+    equity: Dict[str, Union[List[float], int]]
+    drawdown_percentage: Dict[str, Union[List[float], int]]
+    strategies: List[PortfolioStrategyResult]
+
+class WalkForwardRequest(BaseModel):
+    strategy: BacktestRequest  # Base strategy; its startDate-endDate range is split into windows
+    parameterGrid: Dict[str, List[float]]  # e.g. {"rsiPeriod": [10, 14, 21], "entryThreshold": [-0.5, -0.3]}
+    inSampleDays: float = Field(gt=0)
+    outOfSampleDays: float = Field(gt=0)
+    objective: str = 'net_profit_dollars'
+    minTrades: int = Field(default=5, ge=1)  # In-sample trades a parameter set needs to be chosen
+
+    @field_validator('strategy')
+    @classmethod
+    def validate_strategy(cls, v):
+        if v.tickMode:
+            raise ValueError('Tick mode is not supported in walk-forward optimization')
+        return v
+
+    @field_validator('parameterGrid')
+    @classmethod
+    def validate_parameter_grid(cls, v):
+        unknown = set(v) - set(WALK_FORWARD_PARAMETERS)
+        if unknown:
+            raise ValueError(f'Cannot optimize {sorted(unknown)}; choose from {list(WALK_FORWARD_PARAMETERS)}')
+        if not v or any(len(values) == 0 for values in v.values()):
+            raise ValueError('Every optimized parameter needs at least one value')
+        if int(np.prod([len(values) for values in v.values()])) > 1000:
+            raise ValueError('Parameter grid is limited to 1000 combinations')
+        return v
+
+    @field_validator('objective')
+    @classmethod
+    def validate_objective(cls, v):
+        if v not in WALK_FORWARD_OBJECTIVES:
+            raise ValueError(f'Objective must be one of {list(WALK_FORWARD_OBJECTIVES)}')
+        return v
+
+class WalkForwardWindow(BaseModel):
+    in_sample_start: datetime
+    out_of_sample_start: datetime
+    out_of_sample_end: datetime
+    params: Optional[Dict[str, float]] = None  # None if no parameter set reached minTrades in sample
+    in_sample: Optional[Dict[str, Union[int, float]]] = None
+    out_of_sample: Dict[str, Union[int, float]]
+
+class WalkForwardResponse(BaseModel):
+    metrics: Dict[str, Union[int, float]]  # Of the stitched out-of-sample trades and equity
+    equity: Dict[str, Union[List[float], int]]
+    drawdown_percentage: Dict[str, Union[List[float], int]]
+    windows: List[WalkForwardWindow]
+    stability: Dict
+    trades: List[TradeLog]
+
+class OptimizeRequest(BaseModel):
+    strategy: BacktestRequest  # Base strategy; parameters outside searchSpace keep its values
+    searchSpace: Dict[str, List[float]]  # Values to search per parameter, e.g. {"rsiPeriod": [7, 10, 14, 21]}
+    candidates: int = Field(default=81, ge=2, le=2000)  # Sampled from the search space
+    eta: int = Field(default=3, ge=2, le=8)
+    minFraction: float = Field(default=0.1, gt=0, le=1)  # Share of the range the first rung sees
+    objective: str = 'net_profit_dollars'
+    minTrades: int = Field(default=5, ge=1)
+    maxDrawdownPercentage: Optional[float] = Field(default=None, gt=0)
+    seed: Optional[int] = None
+
+    @field_validator('strategy')
+    @classmethod
+    def validate_strategy(cls, v):
+        if v.tickMode:
+            raise ValueError('Tick mode is not supported in optimization')
+        return v
+
+    @field_validator('searchSpace')
+    @classmethod
+    def validate_search_space(cls, v):
+        unknown = set(v) - set(WALK_FORWARD_PARAMETERS)
+        if unknown:
+            raise ValueError(f'Cannot optimize {sorted(unknown)}; choose from {list(WALK_FORWARD_PARAMETERS)}')
+        if not v or any(len(values) == 0 for values in v.values()):
+            raise ValueError('Every optimized parameter needs at least one value')
+        return v
+
+    @field_validator('objective')
+    @classmethod
+    def validate_objective(cls, v):
+        if v not in WALK_FORWARD_OBJECTIVES:
+            raise ValueError(f'Objective must be one of {list(WALK_FORWARD_OBJECTIVES)}')
+        return v
+
+class OptimizeResponse(BaseModel):
+    best: Dict[str, float]  # Parameters of the winning candidate
+    metrics: Dict[str, Union[int, float]]  # Its metrics over the whole range
+    leaderboard: List[Dict]  # Candidates of the last rung, best first
+    rungs: List[Dict]
+    compute: Dict[str, Union[int, float]]
+
+class MonteCarloResult(BaseModel):
+    result_id: str
+    paths: int
+    trades: int
+    method: str
+    initial_balance: float
+    final_balance: Dict[str, float]  # Percentile bands {"p1", "p5", ..., "p99", "mean"}
+    max_drawdown_dollars: Dict[str, float]
+    max_drawdown_percentage: Dict[str, float]
+    probability_of_loss: float
+    ruin_percentage: float
+    probability_of_ruin: float
+
+class CorrelationMatrixRequest(BaseModel):
+    symbols: List[str]
+    timeFrame: int
+    window: int = 50  # Returns per correlation
+    top: int = 10  # Least correlated pairs to return
+
+    @field_validator('symbols')
+    def validate_symbols(cls, v):
+        if not 2 <= len(v) <= MAX_SYMBOLS:
+            raise ValueError(f'Between 2 and {MAX_SYMBOLS} symbols must be provided')
+        if len(set(v)) != len(v):
+            raise ValueError('Symbols must be distinct')
+        return v
+
+    @field_validator('timeFrame')
+    def validate_timeframe(cls, v):
+        valid_timeframes = [1, 5, 15, 30, 60, 240, 1440]
+        if v not in valid_timeframes:
+            raise ValueError(f'Timeframe must be one of {valid_timeframes}')
+        return v
+
+    @field_validator('window')
+    def validate_window(cls, v):
+        if not 2 <= v <= 5000:
+            raise ValueError('Correlation window must be between 2 and 5000')
+        return v
+
+    @field_validator('top')
+    def validate_top(cls, v):
+        if v < 0:
+            raise ValueError('top must not be negative')
+        return v
+
+class SymbolUniverseRequest(BaseModel):
+    """Symbols whose combinations are analyzed, and how their correlation is computed."""
+    symbols: List[str]
+    timeFrame: int = 60
+    period: int = 20  # Rolling correlation window in bars
+    startDate: datetime = datetime(2020, 1, 1, tzinfo=pytz.utc)
+    bars: int = 50000  # Bars loaded per symbol, back from now
+    thresholds: List[float] = list(SCREENER_THRESHOLDS)
+
+    @field_validator('symbols')
+    def validate_symbols(cls, v):
+        if not 2 <= len(v) <= MAX_SYMBOLS:
+            raise ValueError(f'Between 2 and {MAX_SYMBOLS} symbols must be provided')
+        if len(set(v)) != len(v):
+            raise ValueError('Symbols must be distinct')
+        return v
+
+    @field_validator('timeFrame')
+    def validate_timeframe(cls, v):
+        valid_timeframes = [1, 5, 15, 30, 60, 240, 1440]
+        if v not in valid_timeframes:
+            raise ValueError(f'Timeframe must be one of {valid_timeframes}')
+        return v
+
+    @field_validator('period')
+    def validate_period(cls, v):
+        if v < 2:
+            raise ValueError('Correlation period must be at least 2')
+        return v
+
+    @field_validator('bars')
+    def validate_bars(cls, v):
+        if not 1 <= v <= 100000:
+            raise ValueError('bars must be between 1 and 100000')
+        return v
+
+    @field_validator('thresholds')
+    def validate_thresholds(cls, v):
+        if not v or any(not -1 <= threshold <= 1 for threshold in v):
+            raise ValueError('Thresholds must be between -1 and 1')
+        return v
+
+class PairScreenerRequest(SymbolUniverseRequest):
+    sortBy: str = 'avg_corr'
+    ascending: bool = False
+    top: Optional[int] = None  # Rows returned; all combinations when omitted
+    cointegrationWindow: Optional[int] = None  # Adds rolling hedge ratio / Engle-Granger columns over this many bars
+
+    @field_validator('cointegrationWindow')
+    @classmethod
+    def validate_cointegration_window(cls, v):
+        return v if v is None else validate_hedge_ratio_window(v)
+
+class CorrelationRegimeRequest(SymbolUniverseRequest):
+    revertThreshold: Optional[float] = None  # Level an episode must recover to; each threshold itself when omitted
+    includeEpisodes: bool = False  # Also return every episode
+
+class CorrelationRegimeResponse(BaseModel):
+    symbols: int
+    combinations: int
+    pairs: List[Dict]  # {"pair1", "pair2", "regimes": [one report per threshold]}, see correlation_regimes.regime_report
+
+class PairScreenerResponse(BaseModel):
+    symbols: int
+    combinations: int
+    rows: List[Dict[str, Union[str, int, float, None]]]  # Ranked; stats as in mt5_bridge.analyze_correlation_pairs, plus cointegration columns if asked
+
+class CorrelatedPair(BaseModel):
+    pair1: str
+    pair2: str
+    correlation: float
+
+class CorrelationMatrixResponse(BaseModel):
+    symbols: List[str]
+    timeframe: int
+    window: int
+    time: datetime  # Latest bar all symbols have; may still be forming
+    bars_updated: int  # Bars fed to the engine by this request
+    matrix: List[List[Optional[float]]]  # matrix[i][j]: correlation of symbols[i] and symbols[j]
+    lowest_pairs: List[CorrelatedPair]
 
 logged_in_user = None
 active_strategies = {}
@@ -371,14 +684,31 @@ def place_trade(symbol, lot, order_type, magic_number, comment=None):
 
 # Backtesting Engine (same as before)
 class PairedTradingBacktester:
-    def __init__(self, request: BacktestRequest):
+    # Close prices feed P&L as well as indicators, so keep full precision by default
+    price_dtype = np.float64
+
+    def __init__(self, request: BacktestRequest, data: Optional[Dict[str, pd.DataFrame]] = None,
+                 checkpoint: Optional[Dict] = None):
+        """
+        Parameters:
+            request: Strategy and backtest range
+            data: Bars for both pairs at data_timeframe, already loaded (e.g. shared across a batch);
+                  loaded from MT5 when omitted
+            checkpoint: State of an earlier run of the same strategy over a shorter range (see
+                        checkpoint()); only the bars after it are loaded and evaluated
+        """
         self.pair1 = request.currencyPairs[0]
         self.pair2 = request.currencyPairs[1]
         self.timeframe = int(request.timeFrame)
         self.analysis_timeframe = int(request.analysisTimeframe) if request.analysisTimeframe else self.timeframe
+        # Only the finest of the two timeframes is fetched; the other is resampled locally
+        self.data_timeframe = min(self.timeframe, self.analysis_timeframe)
+        if max(self.timeframe, self.analysis_timeframe) % self.data_timeframe != 0:
+            raise ValueError(f"Timeframes {self.timeframe} and {self.analysis_timeframe} are not multiples of each other")
         self.start_date = request.startDate
         self.end_date = request.endDate
         self.correlation_window = request.correlationWindow
+        self.correlation_kernel = request.correlationKernel
         self.rsi_window = request.rsiPeriod
         self.rsi_overbought = request.rsiOverbought
         self.rsi_oversold = request.rsiOversold
@@ -386,10 +716,14 @@ class PairedTradingBacktester:
         self.correlation_exit_threshold = request.exitThreshold
         self.lot_size_pair1 = float(request.lotSize[0])
         self.lot_size_pair2 = float(request.lotSize[1])
+        self.hedge_ratio_window = request.hedgeRatioWindow
+        self.hedge_lot_multiple = request.hedgeLotMultiple
         self.cooldown_period = request.cooldownPeriod
         self.magic_number = int(request.magicNumber)
         self.trade_comment = request.tradeComment
         self.initial_balance = request.startingBalance
+        self.tick_mode = request.tickMode
+        self.tick_stats = None
         print(f"Initial Balance: ${self.initial_balance:,.2f}")
 
         print(f"\nStrategy Parameters:")
@@ -397,63 +731,53 @@ class PairedTradingBacktester:
         print(f"Trading Timeframe: {self.timeframe} minutes")
         print(f"Analysis Timeframe: {self.analysis_timeframe} minutes")
         print(f"RSI Window: {self.rsi_window}")
-        print(f"Correlation Window: {self.correlation_window}")
+        print(f"Correlation Window: {self.correlation_window} ({self.correlation_kernel})")
         print(f"Entry Threshold: {self.correlation_entry_threshold}")
         print(f"Exit Threshold: {self.correlation_exit_threshold}")
         print(f"RSI Levels - Overbought: {self.rsi_overbought}, Oversold: {self.rsi_oversold}")
         print(f"Lot Sizes - {self.pair1}: {self.lot_size_pair1}, {self.pair2}: {self.lot_size_pair2}")
+        if self.hedge_ratio_window:
+            print(f"Hedge Ratio Window: {self.hedge_ratio_window} ({self.pair2} lot sized by hedge ratio)")
         print(f"Cooldown Period: {self.cooldown_period} hours")
+        print(f"Execution: {'tick-level bid/ask' if self.tick_mode else 'bar close'}")
 
         self.active_trades = []
         self.last_entry_time = None
-        self.trades = []
-        
-        self.data = self._load_data_from_mt5()
+        self.trades = TradeTable()
+        # Bars before the resume bar of a checkpoint: their times, equity and correlation
+        self.history = None
+        self.data_start = self.start_date
+        if checkpoint is not None:
+            self._restore(checkpoint)
+        
+        raw_data = data if data is not None else self._load_data_from_mt5()
+        self.data = self._resample_data(raw_data, self.timeframe)
+        self.analysis_data = self._resample_data(raw_data, self.analysis_timeframe)
+        del raw_data
         self._validate_data()
         self.indicators = self._calculate_indicators()
+
+    def _resample_data(self, raw_data: Dict[str, pd.DataFrame], timeframe: int) -> Dict[str, pd.DataFrame]:
+        """Bars at ``timeframe``, aggregated locally from the loaded data_timeframe bars."""
+        if timeframe == self.data_timeframe:
+            return raw_data
+        return {pair: resample_ohlc(df, timeframe) for pair, df in raw_data.items()}
     
     def _load_data_from_mt5(self) -> Dict[str, pd.DataFrame]:
         if not connection_manager.ensure_connection():
             raise ValueError("MT5 initialization failed!")
 
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1
-        }
-        
-        timeframe_mt5 = timeframe_map.get(int(self.timeframe))
+        timeframe_mt5 = TIMEFRAMES.get(int(self.data_timeframe))
         if timeframe_mt5 is None:
-            raise ValueError(f"Invalid timeframe: {self.timeframe}")
+            raise ValueError(f"Invalid timeframe: {self.data_timeframe}")
 
-        CHUNK_SIZE = 10000
         data = {}
 
         for pair in [self.pair1, self.pair2]:
-            chunks = []
-            current_date = self.start_date
-            
-            while current_date < self.end_date:
-                chunk_end = min(current_date + timedelta(minutes=self.timeframe * CHUNK_SIZE), 
-                              self.end_date)
-                
-                rates = mt5.copy_rates_range(pair, timeframe_mt5, current_date, chunk_end)
-                
-                if rates is None:
-                    raise ValueError(f"Failed to fetch data for {pair}")
-                    
-                chunk_df = pd.DataFrame(rates)
-                chunk_df['time'] = pd.to_datetime(chunk_df['time'], unit='s')
-                chunks.append(chunk_df)
-                
-                current_date = chunk_end
-                
-            data[pair] = pd.concat(chunks)
-            data[pair].set_index('time', inplace=True)
+            # Only close prices are used downstream
+            bars = load_bars(pair, timeframe_mt5, self.data_timeframe, self.data_start, self.end_date,
+                             columns=('close',), price_dtype=self.price_dtype)
+            data[pair] = bars.to_frame()
         
         return data
     
@@ -461,19 +785,52 @@ class PairedTradingBacktester:
         """
         Calculate indicators for the strategy.
         """
-        pair1_df = self.data[self.pair1]
-        pair2_df = self.data[self.pair2]
+        pair1_df = self.analysis_data[self.pair1]
+        pair2_df = self.analysis_data[self.pair2]
         
         # Convert windows to integers and create the rolling window
         correlation_window = str(self.correlation_window)
         rsi_window = str(self.rsi_window)
         
-        # Calculate rolling correlation using numeric window
-        rolling_corr = pair1_df['close'].rolling(window=int(correlation_window)).corr(pair2_df['close'])
+        # Rolling correlation over the union of both pairs' bars, as pandas' rolling corr aligns them;
+        # series are read from the indicator store and only extended where new bars were loaded
+        close1, close2 = pair1_df['close'].align(pair2_df['close'])
+        rolling_corr = pd.Series(
+            indicator_store.get(CORRELATION_KERNELS[self.correlation_kernel], int(correlation_window),
+                                [self.pair1, self.pair2], self.analysis_timeframe,
+                                epoch_seconds(close1.index), [close1, close2]),
+            index=close1.index)
         
         # Calculate RSI using numeric window
-        pair1_rsi = self._calculate_rsi(pair1_df['close'], int(rsi_window))
-        pair2_rsi = self._calculate_rsi(pair2_df['close'], int(rsi_window))
+        pair1_rsi = pd.Series(
+            indicator_store.get('sma_rsi', int(rsi_window), [self.pair1], self.analysis_timeframe,
+                                epoch_seconds(pair1_df.index), [pair1_df['close']]),
+            index=pair1_df.index)
+        pair2_rsi = pd.Series(
+            indicator_store.get('sma_rsi', int(rsi_window), [self.pair2], self.analysis_timeframe,
+                                epoch_seconds(pair2_df.index), [pair2_df['close']]),
+            index=pair2_df.index)
+
+        # Rolling OLS hedge ratio of pair1 on pair2, on the bars both pairs have
+        hedge = None
+        if self.hedge_ratio_window:
+            shared = close1.notna() & close2.notna()
+            hedge = pd.Series(
+                indicator_store.get('hedge_ratio', int(self.hedge_ratio_window), [self.pair1, self.pair2],
+                                    self.analysis_timeframe, epoch_seconds(close1.index[shared]),
+                                    [close1[shared], close2[shared]]),
+                index=close1.index[shared])
+
+        # Indicators computed on the analysis timeframe act on execution bars only once
+        # their analysis bar has closed
+        if self.analysis_timeframe != self.timeframe:
+            execution_index = self.data[self.pair1].index
+            rolling_corr = align_to_execution(rolling_corr, self.analysis_timeframe, execution_index, self.timeframe)
+            pair1_rsi = align_to_execution(pair1_rsi, self.analysis_timeframe, execution_index, self.timeframe)
+            pair2_rsi = align_to_execution(pair2_rsi, self.analysis_timeframe,
+                                           self.data[self.pair2].index, self.timeframe)
+            if hedge is not None:
+                hedge = align_to_execution(hedge, self.analysis_timeframe, execution_index, self.timeframe)
         
         # Align all series to have the same index
         common_index = rolling_corr.dropna().index.intersection(pair1_rsi.dropna().index).intersection(pair2_rsi.dropna().index)
@@ -485,11 +842,23 @@ class PairedTradingBacktester:
         pair1_rsi = pair1_rsi.loc[common_index]
         pair2_rsi = pair2_rsi.loc[common_index]
         
-        return {
+        indicators = {
             'rolling_correlation': rolling_corr,
             f'{self.pair1}_rsi': pair1_rsi,
             f'{self.pair2}_rsi': pair2_rsi
         }
+        if hedge is not None:
+            # NaN until the hedge window fills; those bars trade the fixed lots
+            indicators['hedge_ratio'] = hedge.reindex(common_index)
+        return indicators
+
+    def _lot_sizes(self, i: int) -> Tuple[float, float]:
+        """Lots of pair1 and pair2 for an entry on indicator bar ``i``."""
+        if 'hedge_ratio' not in self.indicators:
+            return self.lot_size_pair1, self.lot_size_pair2
+        beta = float(self.indicators['hedge_ratio'].iloc[i])
+        return self.lot_size_pair1, hedge_lot(self.lot_size_pair1, beta, self.pair1, self.pair2, self.lot_size_pair2,
+                                              self.hedge_lot_multiple)
 
     def calculate_performance_metrics(self) -> Dict[str, float]:
         """
@@ -509,64 +878,44 @@ class PairedTradingBacktester:
                 'avg_trade_duration': 0.0,
                 'profit_factor': 0.0,
                 'peak_balance': self.initial_balance,
-                'final_balance': self.initial_balance
+                'final_balance': self.initial_balance,
+                'max_time_under_water_hours': 0.0,
+                'time_under_water_percentage': 0.0
             }
         
-        # Initialize tracking variables
-        current_balance = self.initial_balance
-        peak_balance = self.initial_balance
-        max_drawdown_dollars = 0
-        max_drawdown_percentage = 0
-        winning_trades = 0
-        losing_trades = 0
-        total_profit = 0
-        total_loss = 0
-        
-        # Process each trade
-        trade_returns = []
-        for trade in self.trades:
-            # Get the actual profit in dollars
-            long_profit = trade.get('long_profit', 0)  # These will be actual dollar values now
-            short_profit = trade.get('short_profit', 0)
-            trade_profit = long_profit + short_profit
-            
-            # Track wins/losses
-            if trade_profit > 0:
-                winning_trades += 1
-                total_profit += trade_profit
-            else:
-                losing_trades += 1
-                total_loss += abs(trade_profit)
-            
-            # Update current balance
-            current_balance += trade_profit
-            
-            # Update peak balance and drawdown
-            peak_balance = max(peak_balance, current_balance)
-            if current_balance < peak_balance:
-                drawdown_dollars = peak_balance - current_balance
-                drawdown_percentage = (drawdown_dollars / peak_balance) * 100
-                max_drawdown_dollars = max(max_drawdown_dollars, drawdown_dollars)
-                max_drawdown_percentage = max(max_drawdown_percentage, drawdown_percentage)
-            
-            # Store return for Sharpe ratio calculation
-            trade_returns.append(trade_profit)
-        
+        # Whole columns of the trade log at once
+        trades = as_trade_array(self.trades)
+        trade_returns = np.nan_to_num(trades['long_profit']) + np.nan_to_num(trades['short_profit'])
+        balances = self.initial_balance + np.cumsum(trade_returns)
+        current_balance = float(balances[-1])
+        peak_balance = float(max(self.initial_balance, balances.max()))
+
+        # Track wins/losses
+        winning = trade_returns > 0
+        winning_trades = int(winning.sum())
+        losing_trades = len(trades) - winning_trades
+        total_profit = float(trade_returns[winning].sum())
+        total_loss = float(np.abs(trade_returns[~winning]).sum())
+
         # Calculate final metrics
-        total_trades = len(self.trades)
+        total_trades = len(trades)
         win_rate = (winning_trades / total_trades) if total_trades > 0 else 0
         net_profit_dollars = total_profit - total_loss
         net_profit_percentage = (net_profit_dollars / self.initial_balance) * 100
         
         # Calculate Sharpe Ratio using actual returns
         if len(trade_returns) > 1:
-            returns_series = pd.Series(trade_returns)
-            sharpe_ratio = np.sqrt(252) * (returns_series.mean() / returns_series.std())
+            sharpe_ratio = np.sqrt(252) * (trade_returns.mean() / trade_returns.std(ddof=1))
         else:
             sharpe_ratio = 0.0
         
         # Calculate profit factor
         profit_factor = total_profit / abs(total_loss) if total_loss != 0 else 999999.0  # Use a large number instead of infinity
+
+        # Drawdown from bar-by-bar equity, so losses of trades that are still open count too
+        equity = self.mark_to_market_equity()
+        equity_drawdown = drawdown(equity['equity'])
+        under_water = time_under_water(equity['time'], equity['equity'])
         
         return {
             'total_trades': total_trades,
@@ -575,27 +924,21 @@ class PairedTradingBacktester:
             'win_rate': win_rate,
             'net_profit_percentage': net_profit_percentage,
             'net_profit_dollars': net_profit_dollars,
-            'max_drawdown_percentage': max_drawdown_percentage,
-            'max_drawdown_dollars': max_drawdown_dollars,
+            'max_drawdown_percentage': float(equity_drawdown['percentage'].max()),
+            'max_drawdown_dollars': float(equity_drawdown['dollars'].max()),
             'sharpe_ratio': float(0.0) if np.isnan(sharpe_ratio) or np.isinf(sharpe_ratio) else float(sharpe_ratio),
-            'avg_trade_duration': float(np.mean([(trade['exit_time'] - trade['entry_time']).total_seconds() / 3600 for trade in self.trades])),
+            'avg_trade_duration': float(np.mean((trades['exit_time'] - trades['entry_time']) / np.timedelta64(1, 'h'))),
             'profit_factor': profit_factor,
             'peak_balance': peak_balance,
-            'final_balance': current_balance
+            'final_balance': current_balance,
+            'max_time_under_water_hours': under_water['max_hours'],
+            'time_under_water_percentage': under_water['percentage']
         }
     
-    def _calculate_rsi(self, prices: pd.Series, window: int) -> pd.Series:
-        """
-        Calculate RSI for a given price series.
-        """
-        delta = prices.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        rs = gain / loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-    
     def run_backtest(self) -> Dict[str, Union[List[Dict], Dict[str, float]]]:
+        if self.tick_mode:
+            return self._run_tick_backtest()
+
         # Get the correct length to iterate over
         indicators_length = min(
             len(self.indicators['rolling_correlation']),
@@ -605,11 +948,24 @@ class PairedTradingBacktester:
         
         # Use this length rather than just one indicator's length
         index = self.indicators['rolling_correlation'].index[:indicators_length]
-        print(f"Total periods to analyze: {len(index)}")
+        start = self._resume_position()
+        print(f"Total periods to analyze: {len(index) - start}")
 
-        for i in range(len(index)):
-            current_time = index[i]
+        self._run_bar_loop(len(index), start=start)
+        
+        print(f"\nBacktest completed. Total trades: {len(self.trades)}")
+        
+        return {
+            'trades': self.trades,
+            'metrics': self.calculate_performance_metrics(),
+        }
 
+    def _run_bar_loop(self, n_bars: int, close_open_trades: bool = True, start: int = 0) -> int:
+        """
+        Bar-close loop of run_backtest over indicator bars [start, n_bars).
+        Returns the position in the trade log where the end-of-range closes start.
+        """
+        for i in range(start, n_bars):
             # Check and exit existing trades
             trades_to_exit = self._check_exit_conditions(i)
             for trade_idx in sorted(trades_to_exit, reverse=True):
@@ -620,18 +976,267 @@ class PairedTradingBacktester:
             if entry_condition:
                 self._enter_trade(i, trade_direction)
 
-        # Close any remaining trades at the end
-        final_index = len(index) - 1
-        while self.active_trades:
-            self._exit_trade(final_index, 0)
-        
+        forced_from = len(self.trades)
+        if close_open_trades:
+            # Close any remaining trades at the end
+            final_index = n_bars - 1
+            while self.active_trades:
+                self._exit_trade(final_index, 0)
+        return forced_from
+
+    def _shard(self, start: int, stop: int) -> 'PairedTradingBacktester':
+        """
+        Copy of this backtester restricted to indicator bars [start, stop): the
+        indicators and bars of that range only, no open trades and no cooldown.
+        """
+        shard = copy.copy(self)
+        index = self.indicators['rolling_correlation'].index
+        shard.indicators = {name: series.iloc[start:stop] for name, series in self.indicators.items()}
+        shard.data = {pair: df.loc[index[start]:index[stop - 1]] for pair, df in self.data.items()}
+        shard.analysis_data = None
+        shard.trades = TradeTable()
+        shard.active_trades = []
+        shard.last_entry_time = self.last_entry_time if start == 0 else None
+        return shard
+
+    def run_sharded_backtest(self, shards: int, processes: int = 1) -> Dict[str, Union[List[Dict], Dict[str, float]]]:
+        """
+        run_backtest split into ``shards`` consecutive time ranges, run in up to
+        ``processes`` worker processes, with exactly the sequential run's trades.
+
+        Indicators are computed once over the whole range, so shards need no
+        warm-up bars. Each shard runs as if it started flat and out of cooldown;
+        the shards are then stitched in order:
+          - Trades still open at a shard's end are carried over and closed on the
+            first later bar that meets the exit rule (a trade's exit depends only
+            on its own prices), or at the end of the range
+          - If the carried cooldown forbids a shard's first entry, its entries are
+            replayed with the real cooldown until the replay enters on a bar the
+            shard also entered on; from there on both agree, so the shard's later
+            trades are kept and its earlier ones dropped
+
+        Parameters:
+            shards: Number of time ranges
+            processes: Worker processes; 1 runs the shards one after another in this process
+        """
+        if self.tick_mode:
+            raise ValueError("Tick mode backtests cannot be sharded")
+        index = self.indicators['rolling_correlation'].index
+        n_bars = len(index)
+        shards = max(1, min(shards, n_bars // 2))
+        bounds = np.linspace(0, n_bars, shards + 1).astype(int)
+        jobs = [(self._shard(start, stop), k == shards - 1) for k, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        print(f"Total periods to analyze: {n_bars} in {shards} shards")
+
+        workers = min(processes, shards)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                results = list(executor.map(_run_backtest_shard, *zip(*jobs)))
+        else:
+            results = [_run_backtest_shard(*job) for job in jobs]
+
+        # Exit rule on every bar as arrays, for carried-over trades
+        exit_scan = {
+            'close': {pair: df['close'].reindex(index).to_numpy(dtype=np.float64) for pair, df in self.data.items()},
+            'exit': self.indicators['rolling_correlation'].to_numpy(dtype=np.float64) > self.correlation_exit_threshold,
+        }
+        final_index = n_bars - 1
+        closed: List[Tuple[Dict, bool]] = []  # (trade, closed at the end of the range)
+        carried: List[Tuple[Dict, int]] = []  # (open trade, first bar its exit is unchecked)
+        last_entry = self.last_entry_time
+
+        for start, stop, result in zip(bounds[:-1], bounds[1:], results):
+            trades = [(trade, k >= result['forced_from']) for k, trade in enumerate(result['trades'])]
+            open_trades = result['open']
+            entry_times = sorted([trade['entry_time'] for trade, _ in trades] + [trade['entry_time'] for trade in open_trades])
+            sync_time = entry_times[0] if entry_times else None
+
+            if entry_times and last_entry is not None and \
+                    (entry_times[0] - last_entry).total_seconds() / 3600 < self.cooldown_period:
+                # Replay entries with the real cooldown until they meet the shard's entries
+                self.last_entry_time, self.active_trades = last_entry, []
+                shard_entries = set(entry_times)
+                sync_time = None
+                for i in range(start, stop):
+                    entry_condition, trade_direction = self._check_entry_conditions(i)
+                    if entry_condition:
+                        if index[i] in shard_entries:
+                            sync_time = index[i]
+                            break
+                        self._enter_trade(i, trade_direction)
+                for trade in self.active_trades:
+                    carried.append((trade, index.get_loc(trade['entry_time']) + 1))
+                last_entry = self.last_entry_time
+                self.active_trades = []
+                trades = [(trade, forced) for trade, forced in trades if sync_time is not None and trade['entry_time'] >= sync_time]
+                open_trades = [trade for trade in open_trades if sync_time is not None and trade['entry_time'] >= sync_time]
+
+            closed.extend(trades)
+            carried.extend((trade, stop) for trade in open_trades)
+            if sync_time is not None:
+                last_entry = max(entry_times)
+
+        self.trades = TradeTable()
+        for trade, first_unchecked in carried:
+            exit_index = exit_bar(exit_scan['exit'], exit_scan['close'][trade['long_pair']],
+                                  exit_scan['close'][trade['short_pair']], trade, first_unchecked - 1)
+            self.active_trades = [trade]
+            self._exit_trade(final_index if exit_index is None else exit_index, 0)
+            closed.append((trade, exit_index is None))
+        self.active_trades = []
+        self.last_entry_time = last_entry
+
+        # Trade log order of the sequential loop: by exit bar; within a bar rule exits
+        # newest first, then the end-of-range closes oldest first
+        def log_order(item):
+            trade, forced = item
+            entry_ns = pd.Timestamp(trade['entry_time']).value
+            return (pd.Timestamp(trade['exit_time']).value, forced, entry_ns if forced else -entry_ns)
+
+        self.trades = TradeTable.from_records(trade for trade, _ in sorted(closed, key=log_order))
         print(f"\nBacktest completed. Total trades: {len(self.trades)}")
-        
+
         return {
             'trades': self.trades,
             'metrics': self.calculate_performance_metrics(),
         }
 
+    def _run_tick_backtest(self) -> Dict[str, Union[List[Dict], Dict[str, float]]]:
+        """
+        Tick-level variant of run_backtest.
+
+        Signals are still taken on bar closes (indicators are bar based), but entries
+        fill at the first tick after the signal bar closes (long at ask, short at bid)
+        and exits are evaluated on every merged tick at bid/ask, so intra-bar exits
+        and spread costs show up. Ticks are streamed in fixed-size chunks.
+        """
+        index = self.indicators['rolling_correlation'].index
+        correlation = self.indicators['rolling_correlation'].to_numpy()
+        # Bars are stamped with their open time; a bar's signal is known once it closes
+        bar_close_msc = (index.values.astype('datetime64[ms]').astype(np.int64)
+                         + self.timeframe * 60_000)
+        n_bars = len(index)
+        print(f"Total periods to analyze: {n_bars} (tick mode)")
+
+        tick_start = index[0].to_pydatetime()
+        tick_end = self.end_date
+        throughput = TickThroughput()
+        merged_stream = merge_tick_streams(
+            iter_tick_chunks(self.pair1, tick_start, tick_end),
+            iter_tick_chunks(self.pair2, tick_start, tick_end),
+        )
+
+        next_bar = 0
+        pending_entry = None
+        last_tick = None
+
+        for chunk in merged_stream:
+            throughput.count(chunk)
+            times = chunk['time_msc']
+            pos = 0
+            while pos < len(chunk):
+                boundary = bar_close_msc[next_bar] if next_bar < n_bars else np.iinfo(np.int64).max
+                seg_end = int(np.searchsorted(times, boundary, side='left'))
+
+                if seg_end > pos:
+                    if pending_entry is not None:
+                        self._enter_trade_at_tick(pending_entry[0], pending_entry[1], chunk[pos])
+                        pending_entry = None
+                    if next_bar > 0 and correlation[next_bar - 1] > self.correlation_exit_threshold:
+                        self._check_tick_exits(chunk[pos:seg_end], next_bar - 1)
+                    pos = seg_end
+
+                if seg_end < len(chunk):
+                    # Bar next_bar has closed: evaluate the entry signal on it
+                    entry_condition, trade_direction = self._check_entry_conditions(next_bar)
+                    if entry_condition:
+                        pending_entry = (next_bar, trade_direction)
+                        self.last_entry_time = index[next_bar]
+                    next_bar += 1
+            last_tick = chunk[-1]
+
+        # Close any remaining trades at the last tick
+        if last_tick is not None:
+            while self.active_trades:
+                self._exit_trade_at_tick(0, last_tick, min(next_bar, n_bars) - 1)
+
+        self.tick_stats = throughput.summary()
+        print(f"\nTick backtest completed. Total trades: {len(self.trades)}, "
+              f"{self.tick_stats['ticks']:,} ticks at {self.tick_stats['ticks_per_second']:,.0f} ticks/s")
+
+        return {
+            'trades': self.trades,
+            'metrics': self.calculate_performance_metrics(),
+            'tick_stats': self.tick_stats,
+        }
+
+    def _tick_quotes(self, pair: str, ticks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(bid, ask) columns of a merged tick chunk for the given pair."""
+        if pair == self.pair1:
+            return ticks['bid1'], ticks['ask1']
+        return ticks['bid2'], ticks['ask2']
+
+    def _check_tick_exits(self, ticks: np.ndarray, bar_index: int) -> None:
+        """Exit each active trade at the first tick where the pair is net profitable."""
+        exits = []
+        for trade_idx, trade in enumerate(self.active_trades):
+            long_bid, _ = self._tick_quotes(trade['long_pair'], ticks)
+            _, short_ask = self._tick_quotes(trade['short_pair'], ticks)
+            long_pip = 0.01 if trade['long_pair'].endswith('JPY') else 0.0001
+            short_pip = 0.01 if trade['short_pair'].endswith('JPY') else 0.0001
+            profit = ((long_bid - trade['long_entry_price']) / long_pip * 10.0 * trade['long_lot']
+                      + (trade['short_entry_price'] - short_ask) / short_pip * 10.0 * trade['short_lot'])
+            hits = np.flatnonzero(profit > 0)
+            if len(hits):
+                exits.append((trade_idx, hits[0]))
+
+        for trade_idx, tick_idx in sorted(exits, reverse=True):
+            self._exit_trade_at_tick(trade_idx, ticks[tick_idx], bar_index)
+
+    def _enter_trade_at_tick(self, i: int, trade_direction: Dict[str, str], tick) -> None:
+        """Fill a new trade at the given merged tick: buy the long leg at ask, sell the short leg at bid."""
+        long_pair = trade_direction['long']
+        short_pair = trade_direction['short']
+        long_ask = tick['ask1'] if long_pair == self.pair1 else tick['ask2']
+        short_bid = tick['bid1'] if short_pair == self.pair1 else tick['bid2']
+        self.active_trades.append({
+            'entry_time': pd.Timestamp(int(tick['time_msc']), unit='ms'),
+            'long_pair': long_pair,
+            'short_pair': short_pair,
+            'long_entry_price': float(long_ask),
+            'short_entry_price': float(short_bid),
+            'long_lot': trade_direction['long_lot'],
+            'short_lot': trade_direction['short_lot'],
+            'entry_correlation': self.indicators['rolling_correlation'].iloc[i],
+            'entry_long_rsi': self.indicators[f"{long_pair}_rsi"].iloc[i],
+            'entry_short_rsi': self.indicators[f"{short_pair}_rsi"].iloc[i]
+        })
+
+    def _exit_trade_at_tick(self, trade_index: int, tick, bar_index: int) -> None:
+        """Close a trade at the given merged tick: sell the long leg at bid, buy back the short leg at ask."""
+        trade_data = self.active_trades.pop(trade_index)
+        long_bid = tick['bid1'] if trade_data['long_pair'] == self.pair1 else tick['bid2']
+        short_ask = tick['ask1'] if trade_data['short_pair'] == self.pair1 else tick['ask2']
+        long_pip = 0.01 if trade_data['long_pair'].endswith('JPY') else 0.0001
+        short_pip = 0.01 if trade_data['short_pair'].endswith('JPY') else 0.0001
+        long_profit = (long_bid - trade_data['long_entry_price']) / long_pip * 10.0 * trade_data['long_lot']
+        short_profit = (trade_data['short_entry_price'] - short_ask) / short_pip * 10.0 * trade_data['short_lot']
+        timestamp = pd.Timestamp(int(tick['time_msc']), unit='ms')
+
+        trade_data.update({
+            'exit_time': timestamp,
+            'long_exit_price': float(long_bid),
+            'short_exit_price': float(short_ask),
+            'exit_correlation': self.indicators['rolling_correlation'].iloc[bar_index],
+            'exit_long_rsi': self.indicators[f"{trade_data['long_pair']}_rsi"].iloc[bar_index],
+            'exit_short_rsi': self.indicators[f"{trade_data['short_pair']}_rsi"].iloc[bar_index],
+            'trade_duration': (timestamp - trade_data['entry_time']).total_seconds() / 3600,
+            'long_profit': float(long_profit),
+            'short_profit': float(short_profit),
+            'total_profit': float(long_profit + short_profit)
+        })
+        self.trades.append(trade_data)
+
     def _check_entry_conditions(self, i: int) -> Tuple[bool, Optional[Dict[str, str]]]:
         # Make sure i is valid for all indicators
         indicators_length = min(
@@ -663,19 +1268,21 @@ class PairedTradingBacktester:
             return False, None
         
         if pair1_rsi > self.rsi_overbought and pair2_rsi < self.rsi_oversold:
+            lot1, lot2 = self._lot_sizes(i)
             return True, {
                 'long': self.pair2,
                 'short': self.pair1,
-                'long_lot': self.lot_size_pair2,
-                'short_lot': self.lot_size_pair1
+                'long_lot': lot2,
+                'short_lot': lot1
             }
 
         if pair1_rsi < self.rsi_oversold and pair2_rsi > self.rsi_overbought:
+            lot1, lot2 = self._lot_sizes(i)
             return True, {
                 'long': self.pair1,
                 'short': self.pair2,
-                'long_lot': self.lot_size_pair1,
-                'short_lot': self.lot_size_pair2
+                'long_lot': lot1,
+                'short_lot': lot2
             }
         
         return False, None
@@ -752,6 +1359,104 @@ class PairedTradingBacktester:
             logger.error(f"Error calculating position profit: {e}")
             return 0.0
 
+    def checkpoint(self) -> Dict:
+        """
+        State to continue this bar-close backtest over a longer range: the trade
+        log and open trades as they were before the last evaluated bar, the last
+        entry time, and equity and correlation of every earlier bar.
+
+        The last bar is evaluated again on resume, since it may still have been
+        forming. Its state is read back from the finished trade log: trades
+        closed before it stay closed, trades open across it are reopened.
+        """
+        index = self.indicators['rolling_correlation'].index
+        resume_time = index[-1]
+        resume_ns = resume_time.value
+        trades = as_trade_array(self.trades)
+        entry_ns = trades['entry_time'].astype(np.int64)
+        exit_ns = trades['exit_time'].astype(np.int64)
+
+        reopened = trades[(entry_ns < resume_ns) & (exit_ns >= resume_ns)]
+        reopened = reopened[np.argsort(reopened['entry_time'], kind='stable')]
+        entries = trades['entry_time'][entry_ns < resume_ns]
+
+        equity = self.mark_to_market_equity()
+        correlation = self._correlation_series()
+        keep = int(np.searchsorted(equity['time'], resume_time.to_datetime64()))
+        # Enough analysis bars before the resume bar for every indicator window; a recursive
+        # correlation kernel (EWMA) depends on every bar, so it is resumed from the start
+        analysis_index = self.analysis_data[self.pair1].index
+        if warmup_bars(self.correlation_kernel, self.correlation_window) is None:
+            warmup_start = analysis_index[0]
+        else:
+            warmup = 2 * max(int(self.correlation_window), int(self.rsi_window), int(self.hedge_ratio_window or 0)) + 2
+            warmup_start = analysis_index[max(0, int(analysis_index.searchsorted(resume_time)) - warmup)]
+        return {
+            'version': 1,
+            'trades': trades[exit_ns < resume_ns].copy(),
+            'active_trades': [{field: trade[field] for field in ENTRY_FIELDS} for trade in records(reopened)],
+            'last_entry_time': pd.Timestamp(entries.max()) if len(entries) else self.last_entry_time,
+            'warmup_start': warmup_start,
+            'history': {
+                'resume_time': resume_time,
+                'time': equity['time'][:keep].copy(),
+                'equity': equity['equity'][:keep].copy(),
+                'correlation': correlation['value'][:keep].copy(),
+            },
+        }
+
+    def _restore(self, checkpoint: Dict) -> None:
+        if self.tick_mode:
+            raise ValueError("Tick mode backtests cannot resume from a checkpoint")
+        self.trades = TradeTable.from_array(checkpoint['trades'])
+        self.active_trades = [dict(trade) for trade in checkpoint['active_trades']]
+        self.last_entry_time = checkpoint['last_entry_time']
+        self.history = checkpoint['history']
+        # Bar times are naive UTC; the MT5 range must match the request's end date
+        warmup_start = checkpoint['warmup_start']
+        if self.end_date.tzinfo is not None:
+            warmup_start = warmup_start.tz_localize('UTC')
+        self.data_start = max(self.start_date, warmup_start.to_pydatetime())
+        print(f"Resuming from checkpoint at {self.history['resume_time']}")
+
+    def _resume_position(self) -> int:
+        """First indicator bar this run evaluates: 0, or the resume bar of its checkpoint."""
+        if self.history is None:
+            return 0
+        return int(self.indicators['rolling_correlation'].index.searchsorted(self.history['resume_time']))
+
+    def _correlation_series(self) -> Dict[str, np.ndarray]:
+        """Correlation on every evaluated bar, including bars before a checkpoint."""
+        correlation = self.indicators['rolling_correlation'].iloc[self._resume_position():]
+        times = correlation.index.values.astype('datetime64[ns]')
+        values = correlation.to_numpy(dtype=np.float32)
+        if self.history is not None:
+            times = np.concatenate((self.history['time'], times))
+            values = np.concatenate((self.history['correlation'], values))
+        return {'time': times, 'value': values}
+
+    def plot_data(self, metrics: Optional[Dict[str, float]] = None) -> Dict:
+        """
+        Everything the backtest plots need, detached from the loaded bar data so it
+        can be cached with the result and rendered later (see plot_renderer).
+        """
+        correlation = self._correlation_series()
+        return {
+            'pair1': self.pair1,
+            'pair2': self.pair2,
+            'entry_threshold': self.correlation_entry_threshold,
+            'exit_threshold': self.correlation_exit_threshold,
+            'initial_balance': self.initial_balance,
+            'net_profit_percentage': metrics['net_profit_percentage'] if metrics else None,
+            'net_profit_dollars': metrics['net_profit_dollars'] if metrics else None,
+            # The full trade log, also served by the trades and export endpoints
+            'trades': as_trade_array(self.trades).copy(),
+            'correlation_time': correlation['time'],
+            'correlation': correlation['value'],
+            # Bar-resolution equity on the same timeline as the correlation
+            'equity': self.mark_to_market_equity()['equity'] if self.trades else None,
+        }
+
     def plot_correlation_vs_profit(self) -> str:
         """
         Generate a correlation vs profit plot and return it as a base64-encoded image.
@@ -761,30 +1466,8 @@ class PairedTradingBacktester:
         str
             Base64-encoded image of the plot.
         """
-        
-        # Extract correlation and profit data
-        correlations = [trade['entry_correlation'] for trade in self.trades]
-        profits = [trade['total_profit'] * 100 for trade in self.trades]  # Convert to percentage
-        
-        # Create scatter plot
-        plt.figure(figsize=(12, 6))
-        plt.scatter(correlations, profits, alpha=0.6)
-        plt.title('Entry Correlation vs Trade Profit')
-        plt.xlabel('Entry Correlation')
-        plt.ylabel('Profit (%)')
-        plt.grid(True)
-        
-        # Add horizontal line at y=0
-        plt.axhline(y=0, color='r', linestyle='--', alpha=0.3)
-        
-        # Save the plot to a BytesIO object
-        buf = BytesIO()
-        plt.savefig(buf, format='png')
-        plt.close()
-        buf.seek(0)
-        
-        # Encode the image as base64
-        image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+        plot_data = {'trades': self.trades}
+        image_base64 = base64.b64encode(render_correlation_vs_profit(plot_data)).decode('utf-8')
         return image_base64
 
     def _enter_trade(self, i: int, trade_direction: Dict[str, str]) -> None:
@@ -880,7 +1563,7 @@ class PairedTradingBacktester:
                 'total_profit': total_profit  # Actual dollar profit
             })
             
-            self.trades.append(trade_data.copy())
+            self.trades.append(trade_data)
             self.active_trades.pop(trade_index)
         
         except Exception as e:
@@ -908,6 +1591,41 @@ class PairedTradingBacktester:
         pip_value = 0.01 if pair.endswith('JPY') else 0.0001
         return (exit_price - entry_price) / pip_value
 
+    def mark_to_market_equity(self) -> Dict[str, np.ndarray]:
+        """
+        Account equity (balance plus open-trade P&L at bar closes) on every bar the
+        strategy evaluated, computed in one vectorized pass over all trades.
+        """
+        index = self.indicators['rolling_correlation'].index[self._resume_position():]
+        timeline = index.values.astype('datetime64[ns]')
+        prices = {pair: self.data[pair]['close'].reindex(index, method='ffill').to_numpy(dtype=np.float64)
+                  for pair in (self.pair1, self.pair2)}
+        trades = as_trade_array(self.trades)
+        if self.history is None:
+            pnl = mark_to_market(timeline, prices, trades)
+            return {'time': timeline, 'equity': self.initial_balance + pnl['pnl']}
+
+        # Bars before the checkpoint keep their equity; trades closed before it are realized
+        closed_before = trades['exit_time'] < timeline[0]
+        pnl = trades['total_profit'][closed_before].sum() + mark_to_market(timeline, prices, trades[~closed_before])['pnl']
+        return {'time': np.concatenate((self.history['time'], timeline)),
+                'equity': np.concatenate((self.history['equity'], self.initial_balance + pnl))}
+
+    def equity_curve_data(self) -> Optional[List[Dict[str, Union[str, float]]]]:
+        """Account balance after each trade, as served in ``equity_curve_data``."""
+        if not self.trades:
+            return None
+        trades = as_trade_array(self.trades)
+        # total_profit is already in dollars
+        equity_dollars = self.initial_balance + np.cumsum(trades['total_profit'])
+        return [
+            {
+                'date': str(exit_time),
+                'equity': float(equity)  # Make sure equity is a float
+            }
+            for exit_time, equity in zip(pd.DatetimeIndex(trades['exit_time']), equity_dollars)
+        ]
+
     def plot_equity_curve(self, metrics: Dict[str, float]) -> Dict[str, Union[str, dict]]:
         if not self.trades:
             print("No trades to plot.")
@@ -917,59 +1635,10 @@ class PairedTradingBacktester:
             }
         
         try:
-            # Create figure with two subplots
-            fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10), height_ratios=[1, 1])
-            
-            # Extract trade data
-            dates = [trade['exit_time'] for trade in self.trades]
-            profits_percentage = [trade['total_profit'] * 100 for trade in self.trades]
-            profits_dollars = [self.initial_balance * trade['total_profit'] for trade in self.trades]
-            
-            # Calculate cumulative equity curves
-            equity_percentage = np.cumsum(profits_percentage)
-            equity_dollars = self.initial_balance + np.cumsum(profits_dollars)
-            
-            # Plot percentage returns
-            ax1.plot(dates, equity_percentage, label='Equity Curve (%)')
-            ax1.set_title(f'Equity Curve - Percentage (Net: {metrics["net_profit_percentage"]:.2f}%)')
-            ax1.set_xlabel('Date')
-            ax1.set_ylabel('Return (%)')
-            ax1.grid(True)
-            ax1.legend()
-            
-            # Plot dollar returns
-            ax2.plot(dates, equity_dollars, label='Equity Curve ($)', color='green')
-            ax2.set_title(f'Equity Curve - Dollars (Net: ${metrics["net_profit_dollars"]:,.2f})')
-            ax2.set_xlabel('Date')
-            ax2.set_ylabel('Account Balance ($)')
-            ax2.grid(True)
-            ax2.legend()
-            
-            # Format dates
-            fig.autofmt_xdate()
-            plt.tight_layout()
-            
-            # Save the plot
-            buf = BytesIO()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-            plt.close()
-            buf.seek(0)
-            
-            # Encode the image
-            plot_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-            
-            # Prepare CSV data with the correct structure
-            csv_data = [
-                {
-                    'date': str(date),
-                    'equity': float(equity)  # Make sure equity is a float
-                }
-                for date, equity in zip(dates, equity_dollars)
-            ]
-            
+            image = render_equity_curve(self.plot_data(metrics))
             return {
-                "plot_base64": plot_base64,
-                "csv_data": csv_data,
+                "plot_base64": base64.b64encode(image).decode('utf-8'),
+                "csv_data": self.equity_curve_data(),
             }
         
         except Exception as e:
@@ -997,60 +1666,217 @@ class PairedTradingBacktester:
         Generate a plot showing correlation values over time and return it as a base64-encoded image.
         """
         try:
-            # Get correlation data
-            correlation_series = self.indicators['rolling_correlation']
-            
-            # Create figure with appropriate size
-            plt.figure(figsize=(15, 7))
-            
-            # Plot correlation line
-            plt.plot(correlation_series.index, correlation_series.values, 
-                    label='Correlation', color='blue', linewidth=1)
-            
-            # Add entry and exit threshold lines
-            plt.axhline(y=self.correlation_entry_threshold, color='r', 
-                       linestyle='--', label=f'Entry Threshold ({self.correlation_entry_threshold})')
-            plt.axhline(y=self.correlation_exit_threshold, color='g', 
-                       linestyle='--', label=f'Exit Threshold ({self.correlation_exit_threshold})')
-            
-            # Add trade entry and exit points if there are trades
-            for trade in self.trades:
-                plt.scatter(trade['entry_time'], trade['entry_correlation'], 
-                          color='green', marker='^', s=100, label='Trade Entry' if trade == self.trades[0] else "")
-                plt.scatter(trade['exit_time'], trade['exit_correlation'], 
-                          color='red', marker='v', s=100, label='Trade Exit' if trade == self.trades[0] else "")
-            
-            # Customize the plot
-            plt.title(f'Correlation Timeline: {self.pair1} vs {self.pair2}')
-            plt.xlabel('Date')
-            plt.ylabel('Correlation')
-            plt.grid(True, alpha=0.3)
-            plt.legend()
-            
-            # Format x-axis dates
-            plt.gcf().autofmt_xdate()
-            
-            # Add correlation bands
-            plt.axhspan(-1, -0.7, alpha=0.1, color='red', label='Strong Negative')
-            plt.axhspan(-0.7, -0.3, alpha=0.1, color='yellow', label='Moderate Negative')
-            plt.axhspan(-0.3, 0.3, alpha=0.1, color='gray', label='Weak Correlation')
-            plt.axhspan(0.3, 0.7, alpha=0.1, color='yellow', label='Moderate Positive')
-            plt.axhspan(0.7, 1, alpha=0.1, color='green', label='Strong Positive')
-            
-            # Save the plot to a BytesIO object
-            buf = BytesIO()
-            plt.savefig(buf, format='png', dpi=300, bbox_inches='tight')
-            plt.close()
-            buf.seek(0)
-            
-            # Encode the image as base64
-            image_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
+            image_base64 = base64.b64encode(render_correlation_timeline(self.plot_data())).decode('utf-8')
             return image_base64
             
         except Exception as e:
             print(f"Error generating correlation timeline plot: {e}")
             return None
 
+class PortfolioBacktester:
+    """
+    Several pair strategies trading one account. Each strategy's signals are
+    evaluated on numpy arrays and merged into a single time-ordered event stream,
+    so entries can be gated on shared state (open-trade limit, account balance),
+    and equity is marked to market across all strategies on every bar.
+
+    With no limit hit, each strategy's trades are identical to a separate
+    PairedTradingBacktester run.
+    """
+
+    def __init__(self, strategies: List[PairedTradingBacktester], initial_balance: float,
+                 max_open_trades: Optional[int] = None):
+        """
+        Parameters:
+            strategies: Backtesters with data and indicators loaded (bar-close mode)
+            initial_balance: Starting balance of the shared account
+            max_open_trades: Open trades allowed across all strategies; None for no limit
+        """
+        if any(bt.tick_mode for bt in strategies):
+            raise ValueError("Tick mode is not supported in portfolio backtests")
+        self.strategies = strategies
+        self.initial_balance = initial_balance
+        self.max_open_trades = max_open_trades
+        for bt in strategies:
+            # Percentages in per-strategy metrics are of the shared account
+            bt.initial_balance = initial_balance
+
+    @staticmethod
+    def _signals(bt: PairedTradingBacktester) -> Dict[str, np.ndarray]:
+        """The backtester's entry and exit rules, evaluated for every bar at once."""
+        correlation = bt.indicators['rolling_correlation']
+        index = correlation.index
+        corr = correlation.to_numpy(dtype=np.float64)
+        rsi1 = bt.indicators[f'{bt.pair1}_rsi'].to_numpy(dtype=np.float64)
+        rsi2 = bt.indicators[f'{bt.pair2}_rsi'].to_numpy(dtype=np.float64)
+
+        both_extreme = ((rsi1 > bt.rsi_overbought) & (rsi2 > bt.rsi_overbought)) | \
+                       ((rsi1 < bt.rsi_oversold) & (rsi2 < bt.rsi_oversold))
+        allowed = ~(corr > bt.correlation_entry_threshold) & ~both_extreme
+        long_pair2 = allowed & (rsi1 > bt.rsi_overbought) & (rsi2 < bt.rsi_oversold)
+        long_pair1 = allowed & ~long_pair2 & (rsi1 < bt.rsi_oversold) & (rsi2 > bt.rsi_overbought)
+        return {
+            'index': index,
+            'time': index.values.astype('datetime64[ns]').astype(np.int64),
+            'corr': corr,
+            'rsi': {bt.pair1: rsi1, bt.pair2: rsi2},
+            'close': {pair: bt.data[pair]['close'].reindex(index).to_numpy(dtype=np.float64)
+                      for pair in (bt.pair1, bt.pair2)},
+            'entry': long_pair1 | long_pair2,
+            'long_pair1': long_pair1,
+            'exit': corr > bt.correlation_exit_threshold,
+        }
+
+    @staticmethod
+    def _exit_bar(sig: Dict, trade: Dict, i: int) -> Optional[int]:
+        """Bar where the strategy would close ``trade`` opened on bar ``i``; None if it stays open (see ``exit_bar``)."""
+        return exit_bar(sig['exit'], sig['close'][trade['long_pair']], sig['close'][trade['short_pair']], trade, i)
+
+    def _events(self, signals: List[Dict]) -> np.ndarray:
+        """
+        Entry candidates (phase 1) and each strategy's final bar (phase 2), as rows
+        of (time, phase, strategy, bar) sorted by time. Exits are scheduled as trades
+        open and run before anything else at their time, so freed capacity is
+        available to every strategy.
+        """
+        rows = []
+        for s, sig in enumerate(signals):
+            bars = np.flatnonzero(sig['entry'])
+            rows.append(np.column_stack((sig['time'][bars], np.full(len(bars), 1), np.full(len(bars), s), bars)))
+            last = len(sig['time']) - 1
+            rows.append(np.array([[sig['time'][last], 2, s, last]], dtype=np.int64))
+        events = np.concatenate(rows).astype(np.int64)
+        return events[np.lexsort((events[:, 2], events[:, 1], events[:, 0]))]
+
+    def run(self) -> Dict:
+        signals = [self._signals(bt) for bt in self.strategies]
+        # Per strategy, open trades by entry sequence number (insertion ordered)
+        open_trades: List[Dict[int, Dict]] = [{} for _ in self.strategies]
+        closed_trades: List[List[Dict]] = [[] for _ in self.strategies]
+        last_entry = [None] * len(self.strategies)
+        scheduled_exits = []  # heap of (time, strategy, -sequence, bar)
+        sequence = 0
+        balance = self.initial_balance
+        total_open = 0
+        max_concurrent = 0
+        skipped = {'max_open_trades': 0, 'insufficient_balance': 0}
+
+        def close(s: int, seq: int, i: int) -> float:
+            sig = signals[s]
+            trade = open_trades[s].pop(seq)
+            long_price = sig['close'][trade['long_pair']][i]
+            short_price = sig['close'][trade['short_pair']][i]
+            long_profit = leg_profit(trade['long_pair'], trade['long_entry_price'], long_price, trade['long_lot'], True)
+            short_profit = leg_profit(trade['short_pair'], trade['short_entry_price'], short_price, trade['short_lot'], False)
+            timestamp = sig['index'][i]
+            trade.update({
+                'exit_time': timestamp,
+                'long_exit_price': float(long_price),
+                'short_exit_price': float(short_price),
+                'exit_correlation': float(sig['corr'][i]),
+                'exit_long_rsi': float(sig['rsi'][trade['long_pair']][i]),
+                'exit_short_rsi': float(sig['rsi'][trade['short_pair']][i]),
+                'trade_duration': (timestamp - trade['entry_time']).total_seconds() / 3600,
+                'long_profit': float(long_profit),
+                'short_profit': float(short_profit),
+                'total_profit': float(long_profit + short_profit),
+            })
+            closed_trades[s].append(trade)
+            return trade['total_profit']
+
+        for time_ns, phase, s, i in self._events(signals).tolist():
+            # Exits at or before this time; same-bar exits close newest trade first, like run_backtest
+            while scheduled_exits and scheduled_exits[0][0] <= time_ns:
+                _, exit_s, negative_seq, exit_i = heapq.heappop(scheduled_exits)
+                balance += close(exit_s, -negative_seq, exit_i)
+                total_open -= 1
+
+            bt, sig = self.strategies[s], signals[s]
+            if phase == 2:
+                for seq in list(open_trades[s]):
+                    balance += close(s, seq, i)
+                    total_open -= 1
+                continue
+
+            if last_entry[s] is not None and (time_ns - last_entry[s]) / 1e9 / 3600 < bt.cooldown_period:
+                continue
+            if self.max_open_trades is not None and total_open >= self.max_open_trades:
+                skipped['max_open_trades'] += 1
+                continue
+            if balance <= 0:
+                skipped['insufficient_balance'] += 1
+                continue
+            lot1, lot2 = bt._lot_sizes(i)
+            if sig['long_pair1'][i]:
+                long_pair, short_pair = bt.pair1, bt.pair2
+                long_lot, short_lot = lot1, lot2
+            else:
+                long_pair, short_pair = bt.pair2, bt.pair1
+                long_lot, short_lot = lot2, lot1
+            trade = {
+                'strategy_id': s,
+                'entry_time': sig['index'][i],
+                'long_pair': long_pair,
+                'short_pair': short_pair,
+                'long_entry_price': float(sig['close'][long_pair][i]),
+                'short_entry_price': float(sig['close'][short_pair][i]),
+                'long_lot': long_lot,
+                'short_lot': short_lot,
+                'entry_correlation': float(sig['corr'][i]),
+                'entry_long_rsi': float(sig['rsi'][long_pair][i]),
+                'entry_short_rsi': float(sig['rsi'][short_pair][i]),
+            }
+            sequence += 1
+            open_trades[s][sequence] = trade
+            exit_i = self._exit_bar(sig, trade, i)
+            if exit_i is not None:
+                heapq.heappush(scheduled_exits, (int(sig['time'][exit_i]), s, -sequence, exit_i))
+            last_entry[s] = time_ns
+            total_open += 1
+            max_concurrent = max(max_concurrent, total_open)
+
+        # Mark to market on the union of all strategies' bars
+        timeline = np.unique(np.concatenate([sig['time'] for sig in signals])).astype('datetime64[ns]')
+        closes = defaultdict(list)
+        for bt in self.strategies:
+            for pair in (bt.pair1, bt.pair2):
+                closes[pair].append(bt.data[pair]['close'])
+        prices = {}
+        for pair, series in closes.items():
+            pair_close = pd.concat(series)
+            pair_close = pair_close[~pair_close.index.duplicated()].sort_index()
+            pair_close.index = pair_close.index.values.astype('datetime64[ns]')
+            prices[pair] = pair_close.reindex(pd.DatetimeIndex(timeline), method='ffill').to_numpy(dtype=np.float64)
+
+        strategy_pnl = [mark_to_market(timeline, prices, trades)['pnl'] for trades in closed_trades]
+        equity = self.initial_balance + np.sum(strategy_pnl, axis=0)
+
+        strategies = []
+        for bt, trades in zip(self.strategies, closed_trades):
+            bt.trades = TradeTable.from_records(trades)
+            strategies.append({'trades': trades, 'metrics': bt.calculate_performance_metrics()})
+
+        metrics = equity_summary(equity, self.initial_balance)
+        metrics.update({
+            'total_trades': sum(len(trades) for trades in closed_trades),
+            'max_concurrent_trades': max_concurrent,
+            'skipped_entries_max_open_trades': skipped['max_open_trades'],
+            'skipped_entries_insufficient_balance': skipped['insufficient_balance'],
+        })
+        under_water = time_under_water(timeline, equity)
+        metrics.update({
+            'max_time_under_water_hours': under_water['max_hours'],
+            'time_under_water_percentage': under_water['percentage'],
+        })
+        return {
+            'timeline': timeline,
+            'equity': equity,
+            'drawdown_percentage': drawdown(equity)['percentage'],
+            'strategy_pnl': strategy_pnl,
+            'strategies': strategies,
+            'metrics': metrics,
+        }
+
 class RateLimiter:
     def __init__(self):
         self._requests: Dict[str, list] = defaultdict(list)
@@ -1239,37 +2065,592 @@ async def stop_strategy_internal(strategy_id: str):
         return result
     return {"message": "No monitor found"}
 
+backtest_cache = BacktestResultCache()
+
+def get_bar_data_version(backtest_request: BacktestRequest) -> List:
+    """
+    The MT5 server, and the time, close and tick volume of the latest bar MT5 has for
+    each pair up to the request's end date. Changes when new bars extend a range that
+    reaches into the present and while its last bar is still forming; in tick mode
+    also with every new tick before the end date.
+    """
+    timeframe = int(backtest_request.timeFrame)
+    if backtest_request.analysisTimeframe:
+        timeframe = min(timeframe, int(backtest_request.analysisTimeframe))
+
+    version = [data_source()]
+    for pair in backtest_request.currencyPairs:
+        rates = mt5.copy_rates_from(pair, TIMEFRAMES[timeframe], backtest_request.endDate, 1)
+        if rates is not None and len(rates):
+            version.append([int(rates['time'][-1]), float(rates['close'][-1]), int(rates['tick_volume'][-1])])
+        else:
+            version.append(None)
+        if backtest_request.tickMode:
+            tick = mt5.symbol_info_tick(pair)
+            if tick is not None and pd.Timestamp(tick.time_msc, unit='ms') <= _naive_utc(backtest_request.endDate):
+                version.append(int(tick.time_msc))
+    return version
+
+# Trades returned inline with a backtest; further pages come from the trades endpoint
+TRADES_PAGE_SIZE = 500
+SHARD_MIN_BARS = 100_000  # Backtests with at least this many bars are split into time shards
+
+# Engine state at the end of each bar-close backtest, keyed by the request without its end date,
+# so a later request that only extends the range evaluates just the new bars
+checkpoint_cache = BacktestResultCache(max_entries=8, cache_dir=os.environ.get(
+    "BACKTEST_CHECKPOINT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".backtest_checkpoints")))
+
+def checkpoint_key(backtest_request: BacktestRequest) -> str:
+    """Checkpoints are shared by every request on the same MT5 server that differs only in its end date."""
+    return request_key(backtest_request.model_dump(mode="json", exclude={'endDate'}), data_source())
+
+def trade_page(trades, offset: int = 0, limit: int = TRADES_PAGE_SIZE) -> List[TradeLog]:
+    return [TradeLog(**trade) for trade in records(as_trade_array(trades), offset, limit)]
+
+def _run_backtest_request(backtest_request: BacktestRequest, cache_key: str) -> Tuple[BacktestResponse, Dict]:
+    """
+    Run one backtest (resumed from a checkpoint, sharded or sequential) and save its
+    checkpoint; returns the response and the plot data. Runs in a worker thread.
+    """
+    # A checkpoint of the same strategy over a shorter range: only the newer bars are evaluated
+    checkpoint = None
+    if not backtest_request.tickMode:
+        checkpoint = checkpoint_cache.get(checkpoint_key(backtest_request))
+        if checkpoint is not None and \
+                not checkpoint['history']['resume_time'] < _naive_utc(backtest_request.endDate):
+            checkpoint = None
+    backtester = PairedTradingBacktester(backtest_request, checkpoint=checkpoint)
+    workers = os.cpu_count() or 1
+    if checkpoint is None and not backtester.tick_mode and workers > 1 and \
+            len(backtester.indicators['rolling_correlation']) >= SHARD_MIN_BARS:
+        # Long backtests run as time shards on every core, with identical results
+        results = backtester.run_sharded_backtest(workers, workers)
+    else:
+        results = backtester.run_backtest()
+    if not backtester.tick_mode:
+        checkpoint_cache.put(checkpoint_key(backtest_request), backtester.checkpoint())
+
+    # Only the first page of trades goes through pydantic; the full log stays columnar
+    trades = trade_page(results['trades'])
+    metrics = PerformanceMetrics(**results['metrics'])
+
+    response = BacktestResponse(
+        result_id=cache_key,
+        trades=trades,
+        trade_count=len(results['trades']),
+        metrics=metrics,
+        equity_curve_data=backtester.equity_curve_data(),
+        tick_stats=results.get('tick_stats'),
+        resumed_from=checkpoint['history']['resume_time'] if checkpoint is not None else None
+    )
+    plot_data = backtester.plot_data(results['metrics'])
+    return response, plot_data
+
 @app.post("/mt5/backtest-strategy")
-@limiter.limit("3/minute")
 async def backtest_strategy_endpoint(request: Request, backtest_request: BacktestRequest):
-    # Rate limit: 3 requests per minute
-    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
-    
     if not connection_manager.ensure_connection():
         raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    # Identical requests over unchanged data are answered from cache and do not count
+    # against the rate limit
+    cache_key = request_key(backtest_request.model_dump(mode="json"), get_bar_data_version(backtest_request))
+    cached = backtest_cache.get(cache_key)
+    if cached is not None:
+        return BacktestResponse(**cached['response'])
+
+    # Rate limit: 3 requests per minute
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
         
     try:
-        backtester = PairedTradingBacktester(backtest_request)
-        results = backtester.run_backtest()
-    
-        plot_base64 = backtester.plot_correlation_vs_profit()
-        equity_curve_result = backtester.plot_equity_curve(results['metrics'])
-        correlation_timeline = backtester.plot_correlation_timeline()
-        
-        trades = [TradeLog(**trade) for trade in results['trades']]
-        metrics = PerformanceMetrics(**results['metrics'])
-    
-        return BacktestResponse(
-        trades=trades, 
-        metrics=metrics, 
-        correlation_vs_profit_plot=plot_base64,
-        equity_curve_plot=equity_curve_result["plot_base64"],
-        equity_curve_data=equity_curve_result["csv_data"],
-        correlation_timeline_plot=correlation_timeline
-        )
+        response, plot_data = await asyncio.to_thread(_run_backtest_request, backtest_request, cache_key)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    # Plots are rendered on request from plot_data, which is stored with the result
+    backtest_cache.put(cache_key, {'response': response.model_dump(), 'plot_data': plot_data})
+    return response
+
+def _naive_utc(value: datetime) -> pd.Timestamp:
+    """Bar times are naive UTC; compare request dates on the same footing."""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_convert('UTC').tz_localize(None) if timestamp.tzinfo else timestamp
+
+def load_batch_data(requests: List[BacktestRequest]) -> Tuple[List[Dict[str, pd.DataFrame]], Dict[str, int]]:
+    """
+    Load every (symbol, timeframe) a batch needs once, over the union of the
+    requested ranges, and slice each strategy's bars out of it.
+    """
+    data_timeframes = []
+    ranges = {}
+    for backtest_request in requests:
+        timeframe = int(backtest_request.timeFrame)
+        if backtest_request.analysisTimeframe:
+            timeframe = min(timeframe, int(backtest_request.analysisTimeframe))
+        data_timeframes.append(timeframe)
+        for pair in backtest_request.currencyPairs:
+            start, end = ranges.get((pair, timeframe), (backtest_request.startDate, backtest_request.endDate))
+            ranges[(pair, timeframe)] = (min(start, backtest_request.startDate), max(end, backtest_request.endDate))
+
+    loaded = {}
+    for (pair, timeframe), (start, end) in ranges.items():
+        loaded[(pair, timeframe)] = load_bars(
+            pair, TIMEFRAMES[timeframe], timeframe, start, end,
+            columns=('close',), price_dtype=PairedTradingBacktester.price_dtype).to_frame()
+
+    data = [
+        {pair: loaded[(pair, timeframe)].loc[_naive_utc(backtest_request.startDate):_naive_utc(backtest_request.endDate)]
+         for pair in backtest_request.currencyPairs}
+        for backtest_request, timeframe in zip(requests, data_timeframes)
+    ]
+    stats = {
+        'unique_loads': len(loaded),
+        'bars_loaded': int(sum(len(df) for df in loaded.values())),
+    }
+    return data, stats
+
+def _prepare_batch(requests: List[BacktestRequest]) -> Tuple[list, Dict[str, int]]:
+    """Shared loads, then per-strategy indicators (deduplicated through the indicator store)."""
+    data, stats = load_batch_data(requests)
+    prepared = []
+    for backtest_request, pair_data in zip(requests, data):
+        try:
+            prepared.append(PairedTradingBacktester(backtest_request, data=pair_data))
+        except Exception as e:
+            prepared.append(e)
+    return prepared, stats
+
+def _run_prepared_backtest(backtester: PairedTradingBacktester) -> Tuple[Dict, Dict, Optional[List[Dict]]]:
+    """Bar loop of a backtester whose data and indicators are in place; runs in a worker process."""
+    results = backtester.run_backtest()
+    return results, backtester.plot_data(results['metrics']), backtester.equity_curve_data()
+
+def _run_backtest_shard(shard: PairedTradingBacktester, is_last: bool) -> Dict:
+    """Bar loop over one shard of a sharded backtest; runs in a worker process."""
+    forced_from = shard._run_bar_loop(len(shard.indicators['rolling_correlation']), close_open_trades=is_last)
+    return {'trades': shard.trades, 'open': shard.active_trades, 'forced_from': forced_from}
+
+@app.post("/mt5/backtest-batch")
+async def backtest_batch_endpoint(request: Request, batch: BatchBacktestRequest):
+    """
+    Backtest several strategies in one request. Each (symbol, timeframe) is loaded
+    once for the whole batch, identical strategies run once, cached results are
+    reused, and the remaining bar loops run in parallel worker processes.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    strategies = batch.strategies
+    keys = [request_key(s.model_dump(mode="json"), get_bar_data_version(s)) for s in strategies]
+    outcomes: Dict[str, Union[BacktestResponse, Exception]] = {}
+    pending: Dict[str, BacktestRequest] = {}
+    for key, strategy in zip(keys, strategies):
+        if key in outcomes or key in pending:
+            continue
+        cached = backtest_cache.get(key)
+        if cached is not None:
+            outcomes[key] = BacktestResponse(**cached['response'])
+        else:
+            pending[key] = strategy
+    stats = {'strategies': len(strategies), 'cached': len(outcomes), 'computed': len(pending),
+             'unique_loads': 0, 'bars_loaded': 0}
+
+    if pending:
+        # One batch counts as one backtest request
+        await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+        # Earliest start first, so each indicator series is extended rather than recomputed
+        pending_keys = sorted(pending, key=lambda key: _naive_utc(pending[key].startDate))
+        prepared, load_stats = await asyncio.to_thread(_prepare_batch, [pending[key] for key in pending_keys])
+        stats.update(load_stats)
+
+        loop = asyncio.get_running_loop()
+        runnable = [(key, bt) for key, bt in zip(pending_keys, prepared) if not isinstance(bt, Exception)]
+        # Tick mode streams ticks from MT5, which only this process is connected to
+        in_process = [(key, bt) for key, bt in runnable if bt.tick_mode]
+        parallel = [(key, bt) for key, bt in runnable if not bt.tick_mode]
+        workers = min(len(parallel), os.cpu_count() or 1)
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+                parallel_runs = await asyncio.gather(
+                    *[loop.run_in_executor(executor, _run_prepared_backtest, bt) for _, bt in parallel],
+                    return_exceptions=True)
+        else:
+            in_process = parallel + in_process
+            parallel, parallel_runs = [], []
+
+        in_process_runs = []
+        for _, bt in in_process:
+            try:
+                in_process_runs.append(await asyncio.to_thread(_run_prepared_backtest, bt))
+            except Exception as e:
+                in_process_runs.append(e)
+
+        for key, bt in zip(pending_keys, prepared):
+            if isinstance(bt, Exception):
+                outcomes[key] = bt
+        for (key, _), run in zip(parallel + in_process, list(parallel_runs) + in_process_runs):
+            if isinstance(run, Exception):
+                outcomes[key] = run
+                continue
+            results, plot_data, equity_curve_data = run
+            try:
+                response = BacktestResponse(
+                    result_id=key,
+                    trades=trade_page(results['trades']),
+                    trade_count=len(results['trades']),
+                    metrics=PerformanceMetrics(**results['metrics']),
+                    equity_curve_data=equity_curve_data,
+                    tick_stats=results.get('tick_stats'),
+                )
+            except Exception as e:
+                outcomes[key] = e
+                continue
+            backtest_cache.put(key, {'response': response.model_dump(), 'plot_data': plot_data})
+            outcomes[key] = response
+
+    items = []
+    for key, strategy in zip(keys, strategies):
+        outcome = outcomes[key]
+        if isinstance(outcome, Exception):
+            items.append(BatchBacktestItem(id=strategy.id, name=strategy.name, error=str(outcome)))
+        else:
+            items.append(BatchBacktestItem(id=strategy.id, name=strategy.name, result=outcome))
+    return BatchBacktestResponse(results=items, stats=stats)
+
+def _run_portfolio(portfolio_request: PortfolioBacktestRequest, width: int) -> PortfolioBacktestResponse:
+    data, _ = load_batch_data(portfolio_request.strategies)
+    backtesters = [PairedTradingBacktester(strategy, data=pair_data)
+                   for strategy, pair_data in zip(portfolio_request.strategies, data)]
+    results = PortfolioBacktester(backtesters, portfolio_request.startingBalance,
+                                  portfolio_request.maxOpenTrades).run()
+
+    timeline = results['timeline']
+    return PortfolioBacktestResponse(
+        metrics=results['metrics'],
+        equity=downsample_series(timeline, results['equity'], width),
+        drawdown_percentage=downsample_series(timeline, results['drawdown_percentage'], width),
+        strategies=[
+            PortfolioStrategyResult(
+                id=strategy.id,
+                name=strategy.name,
+                trades=[TradeLog(**trade) for trade in result['trades']],
+                metrics=PerformanceMetrics(**result['metrics']),
+                pnl=downsample_series(timeline, pnl, width),
+            )
+            for strategy, result, pnl in zip(portfolio_request.strategies, results['strategies'],
+                                             results['strategy_pnl'])
+        ],
+    )
+
+@app.post("/mt5/backtest-portfolio", response_model=PortfolioBacktestResponse)
+async def backtest_portfolio_endpoint(request: Request, portfolio_request: PortfolioBacktestRequest,
+                                      width: int = Query(1000, ge=10, le=20000)):
+    """
+    Backtest several strategies on one shared account: combined, mark-to-market
+    equity and drawdown, plus each strategy's trades and P&L. Curves are reduced
+    to at most ``width`` points.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+    try:
+        return await asyncio.to_thread(_run_portfolio, portfolio_request, width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _walk_forward_data(base: BacktestRequest, candidates: List[Dict[str, float]]) -> Dict:
+    """
+    Bars and indicator arrays for every parameter set, prepared once over the
+    whole range on the bars where both pairs trade (see walk_forward.py).
+    """
+    if base.hedgeRatioWindow:
+        raise ValueError("Walk-forward and optimization runs trade fixed lots; hedgeRatioWindow is not supported")
+    data, _ = load_batch_data([base])
+    pair1, pair2 = base.currencyPairs
+    indicators = {}
+    timeline = None
+    for key in dict.fromkeys((int(p['correlationWindow']), int(p['rsiPeriod'])) for p in candidates):
+        request = base.model_copy(update={'correlationWindow': key[0], 'rsiPeriod': key[1]})
+        bt = PairedTradingBacktester(request, data=data[0])
+        if timeline is None:
+            timeline = bt.data[pair1].index.intersection(bt.data[pair2].index)
+            closes = [bt.data[pair]['close'].reindex(timeline).to_numpy(dtype=np.float64) for pair in (pair1, pair2)]
+        indicators[key] = tuple(
+            bt.indicators[name].reindex(timeline).to_numpy(dtype=np.float64)
+            for name in ('rolling_correlation', f'{pair1}_rsi', f'{pair2}_rsi'))
+    return {
+        'pair1': pair1,
+        'pair2': pair2,
+        'lots': (float(base.lotSize[0]), float(base.lotSize[1])),
+        'time': timeline.values.astype('datetime64[ns]'),
+        'close1': closes[0],
+        'close2': closes[1],
+        'indicators': indicators,
+    }
+
+def _run_walk_forward(walk_forward_request: WalkForwardRequest, width: int) -> WalkForwardResponse:
+    base = walk_forward_request.strategy
+    candidates = parameter_sets(base.model_dump(), walk_forward_request.parameterGrid)
+    for params in candidates:
+        # Same validation as a single backtest of each parameter set
+        BacktestRequest(**{**base.model_dump(exclude_none=True), **params})
+
+    data = _walk_forward_data(base, candidates)
+    windows = window_bounds(data['time'], walk_forward_request.inSampleDays, walk_forward_request.outOfSampleDays)
+    if not windows:
+        raise ValueError("Date range is too short for one in-sample and one out-of-sample window")
+    results = run_windows(data, candidates, windows, walk_forward_request.objective,
+                          walk_forward_request.minTrades, min(len(windows), os.cpu_count() or 1))
+
+    stitched = stitch(data, results, base.startingBalance)
+    timeline, equity, trades = stitched['timeline'], stitched['equity'], stitched['trades']
+    metrics = equity_summary(equity, base.startingBalance)
+    metrics.update(trade_metrics(trades['total_profit']))
+    under_water = time_under_water(timeline, equity)
+    metrics.update({
+        'max_time_under_water_hours': under_water['max_hours'],
+        'time_under_water_percentage': under_water['percentage'],
+    })
+
+    times = data['time']
+    return WalkForwardResponse(
+        metrics=metrics,
+        equity=downsample_series(timeline, equity, width),
+        drawdown_percentage=downsample_series(timeline, drawdown(equity)['percentage'], width),
+        windows=[
+            WalkForwardWindow(
+                in_sample_start=pd.Timestamp(times[is_lo]),
+                out_of_sample_start=pd.Timestamp(times[oos_lo]),
+                out_of_sample_end=pd.Timestamp(times[oos_hi - 1]),
+                params=result['params'],
+                in_sample=result['in_sample'],
+                out_of_sample=result['out_of_sample'],
+            )
+            for result, (is_lo, oos_lo, oos_hi) in zip(results, windows)
+        ],
+        stability=stability_report(results, list(walk_forward_request.parameterGrid)),
+        trades=[TradeLog(**trade) for trade in records(trades)],
+    )
+
+@app.post("/mt5/backtest-walk-forward", response_model=WalkForwardResponse)
+async def backtest_walk_forward_endpoint(request: Request, walk_forward_request: WalkForwardRequest,
+                                         width: int = Query(1000, ge=10, le=20000)):
+    """
+    Walk-forward optimization: parameters are chosen on each rolling in-sample
+    window and traded on the out-of-sample window after it. Returns the stitched
+    out-of-sample equity, every window's choice and a parameter-stability report.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+    try:
+        return await asyncio.to_thread(_run_walk_forward, walk_forward_request, width)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _run_optimizer(optimize_request: OptimizeRequest) -> OptimizeResponse:
+    base = optimize_request.strategy
+    candidates = sample_candidates(base.model_dump(), optimize_request.searchSpace, optimize_request.candidates,
+                                   optimize_request.seed)
+    for params in candidates:
+        BacktestRequest(**{**base.model_dump(exclude_none=True), **params})
+
+    data = _walk_forward_data(base, candidates)
+    search = successive_halving(data, candidates, optimize_request.objective, base.startingBalance,
+                                optimize_request.eta, optimize_request.minFraction, optimize_request.minTrades,
+                                optimize_request.maxDrawdownPercentage, os.cpu_count() or 1)
+    if not search['leaderboard']:
+        raise ValueError("No candidate met minTrades and the drawdown limit; widen the search space or relax the limits")
+
+    # Work a full grid over the same space would take: every combination over the whole range
+    grid_size = 1
+    for values in optimize_request.searchSpace.values():
+        grid_size *= len(values)
+    grid_bars = grid_size * len(data['time'])
+    compute = dict(search['compute'], grid_size=grid_size, grid_bars=grid_bars,
+                   compute_fraction=search['compute']['bars_evaluated'] / grid_bars)
+    return OptimizeResponse(
+        best=search['leaderboard'][0]['params'],
+        metrics=search['leaderboard'][0]['metrics'],
+        leaderboard=search['leaderboard'],
+        rungs=search['rungs'],
+        compute=compute,
+    )
+
+@app.post("/mt5/optimize", response_model=OptimizeResponse)
+async def optimize_endpoint(request: Request, optimize_request: OptimizeRequest):
+    """
+    Search strategy parameters with successive halving: many sampled candidates
+    on a short recent stretch, the best 1/eta promoted to longer stretches, the
+    survivors on the whole range. Candidates breaching maxDrawdownPercentage are
+    pruned on the rung where they do.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+    try:
+        return await asyncio.to_thread(_run_optimizer, optimize_request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+plot_image_cache = BacktestResultCache(max_entries=64, cache_dir=None)
+render_pool = RenderPool()
+
+@app.on_event("shutdown")
+def shutdown_render_pool():
+    # Spawned render workers would otherwise outlive a reload or stop
+    render_pool.shutdown()
+
+@app.get("/mt5/backtest-results/{result_id}/plots/{plot_name}")
+async def get_backtest_plot(result_id: str, plot_name: str,
+                            width: Optional[float] = Query(None, ge=2, le=40),
+                            height: Optional[float] = Query(None, ge=2, le=40),
+                            dpi: int = Query(100, ge=30, le=300)):
+    """
+    Render one plot of a backtest result as PNG.
+
+    Parameters:
+        plot_name: correlation-vs-profit, equity-curve or correlation-timeline
+        width, height: Figure size in inches (defaults depend on the plot)
+        dpi: Output resolution
+    """
+    if plot_name not in PLOTS:
+        raise HTTPException(status_code=404, detail=f"Unknown plot '{plot_name}'. Available: {list(PLOTS)}")
+    default_size = PLOTS[plot_name]
+    figsize = (width or default_size[0], height or default_size[1])
+
+    image_key = f"{result_id}:{plot_name}:{figsize[0]}x{figsize[1]}@{dpi}"
+    image = plot_image_cache.get(image_key)
+    if image is None:
+        result = backtest_cache.get(result_id)
+        if result is None:
+            raise HTTPException(status_code=404, detail="Backtest result not found; run the backtest again")
+        try:
+            image = await render_pool.render(plot_name, result['plot_data'], figsize, dpi)
+        except ValueError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except (RenderQueueFull, RenderWorkersRestarted) as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail=f"Rendering {plot_name} timed out")
+        plot_image_cache.put(image_key, image)
+
+    return Response(content=image, media_type="image/png",
+                    headers={"Cache-Control": "private, max-age=86400"})
+
+def _cached_trades(result_id: str) -> np.ndarray:
+    result = backtest_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Backtest result not found; run the backtest again")
+    return as_trade_array(result['plot_data']['trades'])
+
+@app.get("/mt5/backtest-results/{result_id}/trades", response_model=TradePage)
+async def get_backtest_trades(result_id: str, offset: int = Query(0, ge=0),
+                              limit: int = Query(TRADES_PAGE_SIZE, ge=1, le=10000)):
+    """One page of a backtest's trade log, in trade order."""
+    trades = _cached_trades(result_id)
+    return TradePage(result_id=result_id, total=len(trades), offset=offset, limit=limit,
+                     trades=trade_page(trades, offset, limit))
+
+@app.get("/mt5/backtest-results/{result_id}/trades/export")
+async def export_backtest_trades(result_id: str, format: str = Query('ndjson'),
+                                 chunk_rows: int = Query(10000, ge=100, le=100000)):
+    """
+    Stream the whole trade log as a download, ``chunk_rows`` trades at a time.
+
+    Parameters:
+        format: ndjson, arrow (Arrow IPC stream) or parquet (one row group per chunk)
+    """
+    trades = _cached_trades(result_id)
+    try:
+        chunks = iter_export(trades, format, chunk_rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return StreamingResponse(
+        chunks,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="trades_{result_id[:12]}.{format}"'},
+    )
+
+@app.get("/mt5/backtest-results/{result_id}/monte-carlo", response_model=MonteCarloResult)
+async def get_backtest_monte_carlo(result_id: str, paths: int = Query(10000, ge=100, le=100000),
+                                   method: str = Query('bootstrap'),
+                                   ruin_percentage: float = Query(50.0, gt=0, le=100),
+                                   seed: Optional[int] = None):
+    """
+    Monte Carlo robustness of a backtest: percentile bands of final balance and
+    max drawdown, and the probability of ruin, over ``paths`` resampled trade sequences.
+
+    Parameters:
+        method: bootstrap (draw trades with replacement) or shuffle (reorder the actual trades)
+        ruin_percentage: Share of the starting balance whose loss counts as ruin
+        seed: Optional random seed for reproducible results
+    """
+    if method not in MONTE_CARLO_METHODS:
+        raise HTTPException(status_code=400, detail=f"Unknown method '{method}'. Available: {list(MONTE_CARLO_METHODS)}")
+    result = backtest_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Backtest result not found; run the backtest again")
+    trades = as_trade_array(result['plot_data']['trades'])
+    if len(trades) == 0:
+        raise HTTPException(status_code=400, detail="Backtest has no trades to simulate")
+
+    summary = await asyncio.to_thread(simulate_monte_carlo, trades['total_profit'],
+                                      result['plot_data']['initial_balance'], paths, method,
+                                      ruin_percentage, seed)
+    return MonteCarloResult(result_id=result_id, **summary)
+
+@app.get("/mt5/backtest-results/{result_id}/series/{series_name}")
+async def get_backtest_series(result_id: str, series_name: str,
+                              width: int = Query(1000, ge=10, le=20000),
+                              start: Optional[int] = None, end: Optional[int] = None):
+    """
+    Backtest series as compact arrays for client-side charts, downsampled with LTTB.
+
+    Parameters:
+        series_name: correlation, equity (mark-to-market, per bar) or underwater (drawdown in %, as negative values)
+        width: Maximum number of points returned (roughly the chart width in pixels)
+        start, end: Optional range in epoch seconds
+    """
+    result = backtest_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Backtest result not found; run the backtest again")
+    plot_data = result['plot_data']
+    trades = as_trade_array(plot_data['trades'])
+
+    if series_name == 'correlation':
+        times, values = clip_range(plot_data['correlation_time'], plot_data['correlation'], start=start, end=end)
+        series = downsample_series(times, values, width)
+        # Trade markers, so clients do not need one draw call per trade from a separate request
+        series['entries'] = {'t': trades['entry_time'].astype('datetime64[s]').astype(np.int64).tolist(),
+                             'v': trades['entry_correlation'].tolist()}
+        series['exits'] = {'t': trades['exit_time'].astype('datetime64[s]').astype(np.int64).tolist(),
+                           'v': trades['exit_correlation'].tolist()}
+        series['thresholds'] = {'entry': plot_data['entry_threshold'], 'exit': plot_data['exit_threshold']}
+    elif series_name in ('equity', 'underwater'):
+        if plot_data.get('equity') is not None:
+            times, equity = plot_data['correlation_time'], np.asarray(plot_data['equity'], dtype=np.float64)
+        else:
+            # Results cached before bar-resolution equity: balance after each trade
+            times = trades['exit_time'].astype('datetime64[s]')
+            equity = plot_data['initial_balance'] + np.cumsum(trades['total_profit'])
+        if series_name == 'underwater':
+            # Drawdown over the whole run, then clipped, so peaks before `start` still count
+            equity = -drawdown(equity)['percentage']
+        times, equity = clip_range(times, np.asarray(equity, dtype=np.float64), start=start, end=end)
+        series = downsample_series(times, equity, width)
+    else:
+        raise HTTPException(status_code=404, detail=f"Unknown series '{series_name}'. Available: ['correlation', 'equity', 'underwater']")
+
+    series['series'] = series_name
+    return series
+
 def close_position(ticket):
     """Close a specific position by ticket number."""
     position = mt5.positions_get(ticket=ticket)
@@ -1302,8 +2683,20 @@ class StrategyMonitor:
         self.cooldown_period = timedelta(hours=float(params.get("cooldownPeriod", 24)))
         self.magic_number = int(params["magicNumber"])
         self.timeframe = int(params["timeFrame"])
+        self.correlation_kernel = validate_kernel(params.get("correlationKernel", DEFAULT_KERNEL))
+        # Live orders are sized by the hedge ratio only over a window long enough for a stable beta
+        hedge_ratio_window = params.get("hedgeRatioWindow")
+        self.hedge_ratio_window = validate_hedge_ratio_window(hedge_ratio_window, MIN_LIVE_WINDOW) \
+            if hedge_ratio_window else None
+        self.hedge_lot_multiple = float(params.get("hedgeLotMultiple", DEFAULT_MAX_LOT_MULTIPLE))
+        if self.hedge_lot_multiple <= 0:
+            raise ValueError("hedgeLotMultiple must be positive")
         self.trade_lock = asyncio.Lock()  # Lock for trade placement
         self.placing_trades = False  # Flag to track trade placement status
+
+    def _now(self) -> datetime:
+        """Current time for cooldown bookkeeping; replaced by the replay engine's virtual clock."""
+        return datetime.now()
         
     async def initialize(self):
         """Initialize strategy monitoring and load existing trades"""
@@ -1346,7 +2739,7 @@ class StrategyMonitor:
                 self.last_trade_time = latest_trade_time
                 
                 # Calculate and display remaining cooldown time if applicable
-                time_since_last = datetime.now() - self.last_trade_time
+                time_since_last = self._now() - self.last_trade_time
                 cooldown_remaining = self.cooldown_period - time_since_last
                 if cooldown_remaining.total_seconds() > 0:
                     hours_remaining = cooldown_remaining.total_seconds() / 3600
@@ -1362,7 +2755,8 @@ class StrategyMonitor:
             return
 
         pair1, pair2 = self.params["currencyPairs"]
-        correlation = calculate_correlation(pair1, pair2, int(self.params["correlationWindow"]), self.timeframe)
+        correlation = calculate_correlation(pair1, pair2, int(self.params["correlationWindow"]), self.timeframe,
+                                            self.correlation_kernel)
 
         if correlation is None or correlation <= float(self.params["exitThreshold"]):
             return
@@ -1383,44 +2777,7 @@ class StrategyMonitor:
         """Main trade monitoring loop"""
         while active_strategies.get(self.strategy_id) and not self.is_stopping:
             try:
-                # Update the list of monitored trades first
-                await self._update_monitored_trades()
-                
-                # Check if existing trades should be closed
-                await self._check_exit_conditions()
-                
-                # Only check for new entries if not already placing trades and cooldown has passed
-                if not self.placing_trades:
-                    # Check if lock is already held
-                    if self.trade_lock.locked():
-                        print(f"Trade lock is active, skipping entry check")
-                    else:
-                        # Check cooldown before trying to acquire lock
-                        cooldown_active = (self.last_trade_time is not None and 
-                                          datetime.now() - self.last_trade_time < self.cooldown_period)
-                        
-                        if not cooldown_active:
-                            # Try to acquire lock for trade placement
-                            try:
-                                await asyncio.wait_for(self.trade_lock.acquire(), timeout=0.5)
-                                try:
-                                    self.placing_trades = True
-                                    await self._check_entry_conditions()
-                                finally:
-                                    self.placing_trades = False
-                                    self.trade_lock.release()
-                            except asyncio.TimeoutError:
-                                print("Timeout while waiting for trade lock, will try again later")
-                        else:
-                            # Only log occasionally to avoid spam
-                            time_since_last = datetime.now() - self.last_trade_time
-                            cooldown_remaining = self.cooldown_period - time_since_last
-                            hours_remaining = cooldown_remaining.total_seconds() / 3600
-                            if int(hours_remaining) % 4 == 0:  # Log every 4 hours
-                                print(f"Skipping entry check: Cooldown in effect. {hours_remaining:.1f} hours remaining.")
-                
-                # Print current status
-                await self._print_status()
+                await self.run_iteration()
                 
             except Exception as e:
                 print(f"Error in monitoring loop: {e}")
@@ -1438,6 +2795,50 @@ class StrategyMonitor:
             # Sleep for a while before next iteration
             await asyncio.sleep(1)
 
+    async def run_iteration(self):
+        """
+        One pass of the monitoring loop: refresh positions, check exits, check entries.
+        Also driven directly by the replay engine on a virtual clock.
+        """
+        # Update the list of monitored trades first
+        await self._update_monitored_trades()
+        
+        # Check if existing trades should be closed
+        await self._check_exit_conditions()
+        
+        # Only check for new entries if not already placing trades and cooldown has passed
+        if not self.placing_trades:
+            # Check if lock is already held
+            if self.trade_lock.locked():
+                print(f"Trade lock is active, skipping entry check")
+            else:
+                # Check cooldown before trying to acquire lock
+                cooldown_active = (self.last_trade_time is not None and 
+                                  self._now() - self.last_trade_time < self.cooldown_period)
+                
+                if not cooldown_active:
+                    # Try to acquire lock for trade placement
+                    try:
+                        await asyncio.wait_for(self.trade_lock.acquire(), timeout=0.5)
+                        try:
+                            self.placing_trades = True
+                            await self._check_entry_conditions()
+                        finally:
+                            self.placing_trades = False
+                            self.trade_lock.release()
+                    except asyncio.TimeoutError:
+                        print("Timeout while waiting for trade lock, will try again later")
+                else:
+                    # Only log occasionally to avoid spam
+                    time_since_last = self._now() - self.last_trade_time
+                    cooldown_remaining = self.cooldown_period - time_since_last
+                    hours_remaining = cooldown_remaining.total_seconds() / 3600
+                    if int(hours_remaining) % 4 == 0:  # Log every 4 hours
+                        print(f"Skipping entry check: Cooldown in effect. {hours_remaining:.1f} hours remaining.")
+        
+        # Print current status
+        await self._print_status()
+
     async def _update_monitored_trades(self):
         """Update status of monitored trades"""
         # Get all positions
@@ -1481,7 +2882,7 @@ class StrategyMonitor:
         
         # Double-check cooldown period - defensive programming
         if (self.last_trade_time and 
-            datetime.now() - self.last_trade_time < self.cooldown_period):
+            self._now() - self.last_trade_time < self.cooldown_period):
             return
         
         # Calculate indicators to decide on trade entry
@@ -1490,7 +2891,8 @@ class StrategyMonitor:
             pair1, 
             pair2, 
             int(self.params["correlationWindow"]),
-            self.timeframe
+            self.timeframe,
+            self.correlation_kernel
         )
 
         if correlation is None or correlation >= float(self.params["entryThreshold"]):
@@ -1514,7 +2916,7 @@ class StrategyMonitor:
             # CRITICAL: Set last_trade_time BEFORE attempting to place trades
             # This prevents another check from running while trade placement is in progress
             original_last_trade_time = self.last_trade_time
-            self.last_trade_time = datetime.now()
+            self.last_trade_time = self._now()
             print(f"Setting last_trade_time to {self.last_trade_time} BEFORE trade placement")
             
             try:
@@ -1541,6 +2943,16 @@ class StrategyMonitor:
         try:
             lot1 = float(self.params["lotSize"][0])
             lot2 = float(self.params["lotSize"][1])
+            if self.hedge_ratio_window:
+                # pair2's lot offsets pair1's by the live hedge ratio; the fixed lot until it is known
+                stats = calculate_hedge_ratio(pair1, pair2, self.hedge_ratio_window, self.timeframe)
+                info = mt5.symbol_info(pair2)
+                if info is None:
+                    print(f"No symbol info for {pair2}, keeping the fixed lot")
+                else:
+                    lot2 = hedge_lot(lot1, stats['hedge_ratio'] if stats else None, pair1, pair2, lot2,
+                                     self.hedge_lot_multiple, info.volume_min, info.volume_max, info.volume_step)
+                print(f"Hedge ratio lots: {pair1} {lot1}, {pair2} {lot2}")
 
             type1 = mt5.ORDER_TYPE_BUY if is_first_pair_long else mt5.ORDER_TYPE_SELL
             type2 = mt5.ORDER_TYPE_SELL if is_first_pair_long else mt5.ORDER_TYPE_BUY
@@ -1689,7 +3101,7 @@ class StrategyMonitor:
     async def _print_status(self):
         """Print current monitoring status"""
         try:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            current_time = self._now().strftime("%Y-%m-%d %H:%M:%S")
             print(f"\n=== Strategy {self.strategy_id} Status at {current_time} ===")
 
             if self.monitored_trades:
@@ -1714,7 +3126,8 @@ class StrategyMonitor:
                 pair1, 
                 pair2, 
                 int(self.params["correlationWindow"]),
-                self.timeframe  # Pass the numeric timeframe
+                self.timeframe,  # Pass the numeric timeframe
+                self.correlation_kernel
             )
             
             print(f"\nMarket Conditions:")
@@ -1744,7 +3157,7 @@ class StrategyMonitor:
                 print(f"Oversold Level: {self.params['rsiOversold']}")
 
             if self.last_trade_time:
-                time_since_last = datetime.now() - self.last_trade_time
+                time_since_last = self._now() - self.last_trade_time
                 cooldown_remaining = self.cooldown_period - time_since_last
                 if cooldown_remaining.total_seconds() > 0:
                     hours_remaining = cooldown_remaining.total_seconds() / 3600
@@ -1774,139 +3187,119 @@ class StrategyMonitor:
             logger.error(f"Error closing trade {position.ticket}: {e}")
             return False
 
+def compute_indicator_series(request: IndicatorRequest) -> Dict[str, np.ndarray]:
+    """
+    Last 30 days of correlation and RSI for a strategy's pairs, on the bar times
+    both pairs share. Expects MT5 to be initialized.
+    """
+    # Set date range
+    end_date = datetime.now(pytz.UTC)
+    start_date = end_date - timedelta(days=30)
+
+    print(f"Date range: {start_date.strftime('%Y-%m-%d %H:%M')} to {end_date.strftime('%Y-%m-%d %H:%M')}")
+
+    mt5_timeframe = TIMEFRAMES.get(request.timeFrame)
+    if not mt5_timeframe:
+        raise HTTPException(status_code=400, detail="Invalid timeframe")
+
+    # Fetch historical data with error handling
+    def get_rates(symbol):
+        print(f"Fetching data for {symbol} in {mt5_timeframe} minute timeframe for {start_date} to {end_date}")
+        rates = mt5.copy_rates_range(symbol, mt5_timeframe, start_date, end_date)
+        if rates is None or len(rates) == 0:
+            raise HTTPException(status_code=400, 
+                detail=f"Failed to get data for {symbol}. Error: {mt5.last_error()[1]}")
+        return rates
+
+    # Get data for both pairs
+    rates1 = get_rates(request.currencyPairs[0])
+    rates2 = get_rates(request.currencyPairs[1])
+
+    # Convert to structured arrays and ensure same timestamps
+    times1 = rates1['time']
+    times2 = rates2['time']
+
+    # Find common timestamps
+    common_times = np.intersect1d(times1, times2)
+
+    # Filter data to include only common timestamps
+    mask1 = np.isin(times1, common_times)
+    mask2 = np.isin(times2, common_times)
+
+    rates1 = rates1[mask1]
+    rates2 = rates2[mask2]
+
+    print(f"Aligned data points: {len(rates1)} for both pairs")
+
+    # Calculate indicators
+    def calculate_rsi(prices, period):
+        deltas = np.diff(prices)
+        seed = deltas[:period+1]
+        up = seed[seed >= 0].sum()/period
+        down = -seed[seed < 0].sum()/period
+        rs = up/down
+        rsi = np.zeros_like(prices)
+        rsi[:period] = 100. - 100./(1. + rs)
+
+        for i in range(period, len(prices)):
+            delta = deltas[i - 1]
+            if delta > 0:
+                upval = delta
+                downval = 0.
+            else:
+                upval = 0.
+                downval = -delta
+
+            up = (up * (period - 1) + upval) / period
+            down = (down * (period - 1) + downval) / period
+            rs = up/down
+            rsi[i] = 100. - 100./(1. + rs)
+
+        return rsi
+
+    rsi1 = calculate_rsi(rates1['close'], request.rsiPeriod)
+    rsi2 = calculate_rsi(rates2['close'], request.rsiPeriod)
+    # Correlation comes from the indicator store; only bars since the last call are computed
+    correlation = indicator_store.get('trailing_corr', request.correlationWindow, request.currencyPairs,
+                                      request.timeFrame, rates1['time'], [rates1['close'], rates2['close']])
+
+    return {
+        "time": rates1['time'],
+        "correlation": correlation,
+        "rsi1": rsi1,
+        "rsi2": rsi2,
+    }
+
 @app.post("/mt5/plot-indicators")
 async def plot_indicators(request: IndicatorRequest):
-    try:
-        # Set date range
-        end_date = datetime.now(pytz.UTC)
-        start_date = end_date - timedelta(days=30)
-        
-        print(f"Date range: {start_date.strftime('%Y-%m-%d %H:%M')} to {end_date.strftime('%Y-%m-%d %H:%M')}")
-
-        # Convert timeframe to MT5 timeframe
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1
-        }
-        
-        mt5_timeframe = timeframe_map.get(request.timeFrame)
-        if not mt5_timeframe:
-            raise HTTPException(status_code=400, detail="Invalid timeframe")
-
-        if not mt5.initialize():
-            raise HTTPException(status_code=500, detail="Failed to initialize MT5")
-
-        # Fetch historical data with error handling
-        def get_rates(symbol):
-            print(f"Fetching data for {symbol} in {mt5_timeframe} minute timeframe for {start_date} to {end_date}")
-            rates = mt5.copy_rates_range(symbol, mt5_timeframe, start_date, end_date)
-            if rates is None or len(rates) == 0:
-                raise HTTPException(status_code=400, 
-                    detail=f"Failed to get data for {symbol}. Error: {mt5.last_error()[1]}")
-            return rates
-
-        # Get data for both pairs
-        rates1 = get_rates(request.currencyPairs[0])
-        rates2 = get_rates(request.currencyPairs[1])
-
-        # Convert to structured arrays and ensure same timestamps
-        times1 = rates1['time']
-        times2 = rates2['time']
-        
-        # Find common timestamps
-        common_times = np.intersect1d(times1, times2)
-        
-        # Filter data to include only common timestamps
-        mask1 = np.isin(times1, common_times)
-        mask2 = np.isin(times2, common_times)
-        
-        rates1 = rates1[mask1]
-        rates2 = rates2[mask2]
+    # The shared connection: other requests may be using MT5 while this one waits on its threads
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
 
-        print(f"Aligned data points: {len(rates1)} for both pairs")
+    try:
+        series = await asyncio.to_thread(compute_indicator_series, request)
+        rates_time = series["time"]
+        correlation, rsi1, rsi2 = series["correlation"], series["rsi1"], series["rsi2"]
 
-        # Calculate indicators
-        def calculate_rsi(prices, period):
-            deltas = np.diff(prices)
-            seed = deltas[:period+1]
-            up = seed[seed >= 0].sum()/period
-            down = -seed[seed < 0].sum()/period
-            rs = up/down
-            rsi = np.zeros_like(prices)
-            rsi[:period] = 100. - 100./(1. + rs)
-
-            for i in range(period, len(prices)):
-                delta = deltas[i - 1]
-                if delta > 0:
-                    upval = delta
-                    downval = 0.
-                else:
-                    upval = 0.
-                    downval = -delta
-
-                up = (up * (period - 1) + upval) / period
-                down = (down * (period - 1) + downval) / period
-                rs = up/down
-                rsi[i] = 100. - 100./(1. + rs)
-
-            return rsi
-
-        def calculate_correlation(prices1, prices2, window):
-            correlation = np.full_like(prices1, np.nan, dtype=float)
-            for i in range(window, len(prices1)):
-                if i >= window:
-                    correlation[i] = np.corrcoef(prices1[i-window:i], prices2[i-window:i])[0,1]
-            return correlation
-
-        # Calculate indicators
-        rsi1 = calculate_rsi(rates1['close'], request.rsiPeriod)
-        rsi2 = calculate_rsi(rates2['close'], request.rsiPeriod)
-        correlation = calculate_correlation(rates1['close'], rates2['close'], request.correlationWindow)
-
-        # Create the plot
-        plt.style.use('dark_background')
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(15, 10), dpi=100)
-        
         # Convert timestamps to datetime
-        dates = [datetime.fromtimestamp(x) for x in rates1['time']]
-
-        # Plot correlation
-        ax1.plot(dates, correlation, 'w-', label='Correlation', alpha=0.8)
-        ax1.axhline(y=request.entryThreshold, color='r', linestyle='--', label='Entry Threshold')
-        ax1.axhline(y=request.exitThreshold, color='g', linestyle='--', label='Exit Threshold')
-        ax1.set_title('Correlation Analysis')
-        ax1.set_ylabel('Correlation')
-        ax1.grid(True, alpha=0.2)
-        ax1.legend()
-
-        # Plot RSI
-        ax2.plot(dates, rsi1, 'b-', label=f'RSI {request.currencyPairs[0]}', alpha=0.8)
-        ax2.plot(dates, rsi2, 'y-', label=f'RSI {request.currencyPairs[1]}', alpha=0.8)
-        ax2.axhline(y=request.rsiOverbought, color='r', linestyle='--', label='Overbought')
-        ax2.axhline(y=request.rsiOversold, color='g', linestyle='--', label='Oversold')
-        ax2.set_title('RSI Analysis')
-        ax2.set_ylabel('RSI')
-        ax2.grid(True, alpha=0.2)
-        ax2.legend()
-
-        # Format x-axis dates
-        fig.autofmt_xdate()
-
-        # Save plot to bytes
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', bbox_inches='tight')
-        buf.seek(0)
-        plt.close()
+        dates = [datetime.fromtimestamp(x) for x in rates_time]
+
+        image = await render_pool.render('indicators', {
+            'pairs': request.currencyPairs,
+            'dates': dates,
+            'correlation': correlation,
+            'rsi1': rsi1,
+            'rsi2': rsi2,
+            'entry_threshold': request.entryThreshold,
+            'exit_threshold': request.exitThreshold,
+            'rsi_overbought': request.rsiOverbought,
+            'rsi_oversold': request.rsiOversold,
+        }, (15, 10), 100)
 
         return {
-            "image": base64.b64encode(buf.getvalue()).decode('utf-8'),
+            "image": base64.b64encode(image).decode('utf-8'),
             "statistics": {
-                "dataPoints": len(rates1),
+                "dataPoints": len(rates_time),
                 "startDate": dates[0].strftime("%Y-%m-%d %H:%M"),
                 "endDate": dates[-1].strftime("%Y-%m-%d %H:%M"),
                 "pair1": request.currencyPairs[0],
@@ -1914,10 +3307,162 @@ async def plot_indicators(request: IndicatorRequest):
             }
         }
 
+    except HTTPException:
+        raise
+    except (RenderQueueFull, RenderWorkersRestarted) as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating indicator plot: {str(e)}")
-    finally:
-        mt5.shutdown()
+
+@app.post("/mt5/indicator-series")
+async def indicator_series(request: IndicatorRequest, width: int = Query(1000, ge=10, le=20000)):
+    """
+    The /mt5/plot-indicators data as LTTB-downsampled arrays instead of a PNG:
+    correlation and both RSIs, each as {"t": [epoch seconds], "v": [values]}.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    series = await asyncio.to_thread(compute_indicator_series, request)
+    pair1, pair2 = request.currencyPairs
+    return {
+        "correlation": downsample_series(series["time"], series["correlation"], width),
+        "rsi": {
+            pair1: downsample_series(series["time"], series["rsi1"], width),
+            pair2: downsample_series(series["time"], series["rsi2"], width),
+        },
+        "thresholds": {
+            "entry": request.entryThreshold,
+            "exit": request.exitThreshold,
+            "rsi_overbought": request.rsiOverbought,
+            "rsi_oversold": request.rsiOversold,
+        },
+    }
+
+def run_pair_screener(request: PairScreenerRequest) -> List[Dict]:
+    """Load every symbol once, then screen all combinations on every core."""
+    closes = load_closes(request.symbols, request.timeFrame, request.startDate, request.bars)
+    return screen_pairs(closes, request.period, request.thresholds, request.sortBy, request.ascending,
+                        processes=os.cpu_count() or 1, cointegration_window=request.cointegrationWindow)
+
+@app.post("/mt5/pair-screener", response_model=PairScreenerResponse)
+async def pair_screener(request: Request, screener_request: PairScreenerRequest):
+    """Rolling correlation stats of every combination of ``symbols``, ranked by ``sortBy``."""
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    # Rate limit: 3 requests per minute, as for backtests
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+    try:
+        rows = await asyncio.to_thread(run_pair_screener, screener_request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return PairScreenerResponse(
+        symbols=len(screener_request.symbols),
+        combinations=len(rows),
+        # NaN (too few common bars) is not valid JSON
+        rows=[{name: None if isinstance(value, float) and np.isnan(value) else value for name, value in row.items()}
+              for row in rows[:screener_request.top]],
+    )
+
+def run_correlation_regimes(request: CorrelationRegimeRequest) -> List[Dict]:
+    """Load every symbol once, then find the decorrelation episodes of all combinations on every core."""
+    closes = load_closes(request.symbols, request.timeFrame, request.startDate, request.bars)
+    results = analyze_correlation_regimes(closes, request.period, request.thresholds, request.revertThreshold,
+                                          request.includeEpisodes, processes=os.cpu_count() or 1)
+    for result in results:
+        for regime in result['regimes']:
+            if 'table' in regime:
+                regime['table'] = episode_records(regime['table'])
+    return results
+
+@app.post("/mt5/correlation-regimes", response_model=CorrelationRegimeResponse)
+async def correlation_regimes(request: Request, regime_request: CorrelationRegimeRequest):
+    """How long each combination's correlation stays below each threshold, and how long it takes to revert."""
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    # Rate limit: 3 requests per minute, as for backtests
+    await rate_limiter.check_rate_limit(request, max_requests=3, window=60)
+
+    try:
+        results = await asyncio.to_thread(run_correlation_regimes, regime_request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return CorrelationRegimeResponse(symbols=len(regime_request.symbols), combinations=len(results), pairs=results)
+
+# Live correlation matrices by (symbols, timeframe, window); each request only feeds the bars since the last
+correlation_matrices: "OrderedDict[Tuple, RollingCorrelationMatrix]" = OrderedDict()
+correlation_matrices_lock = threading.Lock()
+MAX_CORRELATION_MATRICES = 8
+
+def update_correlation_matrix(request: CorrelationMatrixRequest) -> Tuple[RollingCorrelationMatrix, int]:
+    """The request's correlation matrix engine, fed with every bar since its last update."""
+    mt5_timeframe = TIMEFRAMES[request.timeFrame]
+
+    key = (tuple(request.symbols), request.timeFrame, request.window)
+    with correlation_matrices_lock:
+        engine = correlation_matrices.get(key)
+        if engine is None:
+            engine = RollingCorrelationMatrix(request.symbols, request.window)
+            correlation_matrices[key] = engine
+        correlation_matrices.move_to_end(key)
+        while len(correlation_matrices) > MAX_CORRELATION_MATRICES:
+            correlation_matrices.popitem(last=False)
+
+    first_load = engine.pending_time is None
+    rates = {}
+    for symbol in request.symbols:
+        if first_load:
+            # Twice the window, so the bar times every symbol shares still fill it
+            symbol_rates = mt5.copy_rates_from_pos(symbol, mt5_timeframe, 0, 2 * request.window + 10)
+        else:
+            # From the pending bar, which is replaced, up to whatever is newest on the server
+            symbol_rates = mt5.copy_rates_range(symbol, mt5_timeframe,
+                                                datetime.fromtimestamp(engine.pending_time, tz=pytz.utc),
+                                                datetime.now(pytz.utc) + timedelta(days=1))
+        if symbol_rates is None:
+            raise ValueError(f"Failed to get data for {symbol}. Error: {mt5.last_error()[1]}")
+        rates[symbol] = symbol_rates
+
+    times, closes = align_closes(rates, request.symbols)
+    bars_updated = engine.update(times, closes)
+    if first_load and not engine.ready:
+        # Too few shared bars to ever fill the window from here: the next request starts over
+        with correlation_matrices_lock:
+            if correlation_matrices.get(key) is engine:
+                del correlation_matrices[key]
+    return engine, bars_updated
+
+@app.post("/mt5/correlation-matrix", response_model=CorrelationMatrixResponse)
+async def correlation_matrix(request: CorrelationMatrixRequest):
+    """
+    Rolling correlation of bar-to-bar returns for every pair of ``symbols`` over the
+    last ``window`` bars they share, and the ``top`` least correlated pairs.
+    """
+    if not connection_manager.ensure_connection():
+        raise HTTPException(status_code=500, detail="Failed to initialize MT5")
+
+    try:
+        engine, bars_updated = await asyncio.to_thread(update_correlation_matrix, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not engine.ready:
+        raise HTTPException(status_code=400, detail=f"Not enough common bars for a {request.window}-bar correlation window")
+
+    matrix = engine.matrix()
+    return CorrelationMatrixResponse(
+        symbols=engine.symbols,
+        timeframe=request.timeFrame,
+        window=engine.window,
+        time=datetime.fromtimestamp(engine.pending_time, tz=pytz.utc),
+        bars_updated=bars_updated,
+        matrix=[[None if np.isnan(value) else float(value) for value in row] for row in matrix],
+        lowest_pairs=engine.lowest_pairs(request.top, matrix),
+    )
 
 @app.get("/mt5/available-data-range")
 async def get_available_data_range(symbol: str, timeframe: int) -> Dict:
@@ -1937,23 +3482,12 @@ async def get_available_data_range(symbol: str, timeframe: int) -> Dict:
                 "available_symbols": symbol_names[:10]  # First 10 symbols for reference
             }
 
-        # Map timeframe
-        timeframe_map = {
-            1: mt5.TIMEFRAME_M1,
-            5: mt5.TIMEFRAME_M5,
-            15: mt5.TIMEFRAME_M15,
-            30: mt5.TIMEFRAME_M30,
-            60: mt5.TIMEFRAME_H1,
-            240: mt5.TIMEFRAME_H4,
-            1440: mt5.TIMEFRAME_D1,
-        }
-
-        mt5_timeframe = timeframe_map.get(timeframe)
+        mt5_timeframe = TIMEFRAMES.get(timeframe)
         if mt5_timeframe is None:
             return {
                 "error": f"Invalid timeframe: {timeframe}",
                 "status": "error",
-                "valid_timeframes": list(timeframe_map.keys())
+                "valid_timeframes": list(TIMEFRAMES.keys())
             }
 
         # Get the newest data
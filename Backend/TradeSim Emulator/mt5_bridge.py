@@ -1,3 +1,6 @@
+import argparse
+import itertools
+import time
 import MetaTrader5 as mt5
 import pandas as pd
 import numpy as np
@@ -5,6 +8,10 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime
 import pytz
+from indicator_store import indicator_store
+from correlation_regimes import analyze_universe
+from correlation_report import write_report
+from pair_screener import correlation_stats, load_closes
 
 # MT5 Connection Parameters
 LOGIN = 183320687
@@ -68,26 +75,15 @@ def analyze_correlation_pairs(pair1, pair2, period=20, start_date=datetime(2020,
     df1['returns'] = df1['close'].pct_change()
     df2['returns'] = df2['close'].pct_change()
     
-    # Calculate rolling correlation
-    correlation = df1['returns'].rolling(period).corr(df2['returns'])
-    
-    # Count occurrences below thresholds
-    below_025 = len(correlation[correlation < 0.25])
-    below_0 = len(correlation[correlation < 0.0])
-    below_neg025 = len(correlation[correlation < -0.25])
-    
-    stats = {
-        'avg_corr': correlation.mean(),
-        'below_025': below_025,
-        'below_0': below_0,
-        'below_neg025': below_neg025,
-        'total_periods': len(correlation.dropna()),
-        'pct_below_025': below_025 / len(correlation.dropna()) * 100 if len(correlation.dropna()) > 0 else 0,
-        'pct_below_0': below_0 / len(correlation.dropna()) * 100 if len(correlation.dropna()) > 0 else 0,
-        'pct_below_neg025': below_neg025 / len(correlation.dropna()) * 100 if len(correlation.dropna()) > 0 else 0,
-        'min_date': correlation.index.min().strftime('%Y-%m-%d'),
-        'max_date': correlation.index.max().strftime('%Y-%m-%d')
-    }
+    # Rolling correlation of returns, read from the indicator store and extended with new bars only
+    # get_historical_data loads H1 bars
+    times = df1.index.values.astype('datetime64[s]').astype(np.int64)
+    correlation = pd.Series(
+        indicator_store.get('returns_corr', period, [pair1, pair2], 60, times, [df1['close'], df2['close']]),
+        index=df1.index, name='returns')
+    
+    # Average and below-threshold counts in one pass over the series
+    stats = correlation_stats(times, correlation.to_numpy())
     
     # Reset index for plotting
     correlation = correlation.reset_index()
@@ -105,20 +101,20 @@ def format_stats_text(pair1, pair2, stats):
         f"Total periods: {stats['total_periods']}"
     )
 
+# Currency pair combinations to analyze
+PAIR_COMBINATIONS = [
+    ('GBPUSD', 'EURUSD', 'GBP/USD vs EUR/USD Correlation'),
+    ('EURAUD', 'EURNZD', 'EUR/AUD vs EUR/NZD Correlation'),
+    ('AUDJPY', 'NZDJPY', 'AUD/JPY vs NZD/JPY Correlation')
+]
+
 def plot_correlation_analysis():
     """Plot correlation for multiple currency pair combinations"""
-    # Currency pair combinations to analyze
-    pair_combinations = [
-        ('GBPUSD', 'EURUSD', 'GBP/USD vs EUR/USD Correlation'),
-        ('EURAUD', 'EURNZD', 'EUR/AUD vs EUR/NZD Correlation'),
-        ('AUDJPY', 'NZDJPY', 'AUD/JPY vs NZD/JPY Correlation')
-    ]
-    
     # Create a figure with three subplots with more vertical space
     fig = make_subplots(
         rows=3,
         cols=1,
-        subplot_titles=[title for _, _, title in pair_combinations],
+        subplot_titles=[title for _, _, title in PAIR_COMBINATIONS],
         vertical_spacing=0.2,  # Increased for more space
         row_heights=[0.33, 0.33, 0.33]
     )
@@ -128,7 +124,7 @@ def plot_correlation_analysis():
     min_date = datetime(2025, 1, 1)  # Initialize with a future date
     max_date = datetime(2020, 1, 1)  # Initialize with a past date
     
-    for i, (pair1, pair2, title) in enumerate(pair_combinations):
+    for i, (pair1, pair2, title) in enumerate(PAIR_COMBINATIONS):
         print(f"\nAnalyzing {pair1} vs {pair2} correlation:")
         
         # Analyze correlation
@@ -244,7 +240,54 @@ def plot_correlation_analysis():
     
     fig.show()
 
+def print_correlation_regimes(symbols, period=20, revert_threshold=None, processes=1):
+    """Print how long decorrelation episodes last for every combination of the given symbols"""
+    closes = load_closes(symbols)
+    for result in analyze_universe(closes, period, revert_threshold=revert_threshold, processes=processes):
+        print(f"\n{result['pair1']} vs {result['pair2']} ({period}-period returns correlation):")
+        for regime in result['regimes']:
+            duration = regime['duration_hours']
+            revert = regime['revert_hours']
+            print(f"Below {regime['threshold']:.2f}: {regime['episodes']} episodes ({regime['ongoing']} ongoing)")
+            if duration['count']:
+                print(f"  Duration (h): median {duration['p50']:.1f}, p90 {duration['p90']:.1f}, max {duration['max']:.1f}")
+            if revert['count']:
+                print(f"  Back above {regime['revert_threshold']:.2f} after (h): median {revert['p50']:.1f}, "
+                      f"p90 {revert['p90']:.1f}, max {revert['max']:.1f} ({regime['not_reverted']} not reverted)")
+            histogram = regime['duration_histogram']
+            buckets = [f"{lo}-{hi}h" for lo, hi in zip(histogram['edges'], histogram['edges'][1:])] + [f"{histogram['edges'][-1]}h+"]
+            print("  Durations: " + ", ".join(f"{bucket}: {count}" for bucket, count in zip(buckets, histogram['counts']) if count))
+
+def write_correlation_report(path, symbols=None, period=20, processes=1):
+    """Write the HTML correlation report of every combination of the given symbols (default: PAIR_COMBINATIONS)"""
+    if symbols:
+        pairs = list(itertools.combinations(dict.fromkeys(symbols), 2))
+    else:
+        pairs = [(pair1, pair2) for pair1, pair2, _ in PAIR_COMBINATIONS]
+    closes = load_closes([symbol for pair in pairs for symbol in pair])
+    start = time.perf_counter()
+    write_report(path, closes, pairs, period, processes=processes)
+    print(f"Wrote {len(pairs)} pairs to {path} in {time.perf_counter() - start:.1f}s")
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Correlation analysis of currency pair combinations")
+    parser.add_argument("--regimes", nargs="+", metavar="SYMBOL",
+                        help="Print decorrelation episode statistics for every combination of these symbols instead of plotting")
+    parser.add_argument("--report", metavar="PATH",
+                        help="Write a self-contained HTML report to PATH instead of opening the plot")
+    parser.add_argument("--symbols", nargs="+", metavar="SYMBOL",
+                        help="Report every combination of these symbols (default: the plotted pairs)")
+    parser.add_argument("--period", type=int, default=20, help="Rolling correlation window in bars")
+    parser.add_argument("--revert-threshold", type=float,
+                        help="Correlation an episode must recover to for its time to revert (default: its threshold)")
+    parser.add_argument("--processes", type=int, default=1)
+    args = parser.parse_args()
+
     if connect_mt5():
-        plot_correlation_analysis()
+        if args.regimes:
+            print_correlation_regimes(args.regimes, args.period, args.revert_threshold, args.processes)
+        elif args.report:
+            write_correlation_report(args.report, args.symbols, args.period, args.processes)
+        else:
+            plot_correlation_analysis()
         mt5.shutdown()
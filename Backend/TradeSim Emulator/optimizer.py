@@ -0,0 +1,143 @@
+"""
+Parameter search with successive halving.
+
+A grid over several strategy parameters grows combinatorially, and most of it is
+not worth a full backtest. Successive halving samples candidates from the search
+space and evaluates all of them on a short stretch of the range, keeps the best
+``1 / eta`` of them and evaluates those on a longer stretch, and so on until the
+few survivors are evaluated on the whole range. Stretches are the most recent
+part of the range and grow geometrically from ``min_fraction`` of it to all of
+it. A candidate whose drawdown breaches the limit on any stretch is pruned
+there, whatever its score, and the next best candidate of the previous rung
+takes its place.
+
+Candidates are evaluated with ``walk_forward.simulate`` on slices of arrays
+prepared once (bars plus indicators per (correlationWindow, rsiPeriod)), so an
+evaluation costs a vectorized pass over its stretch rather than a bar loop.
+"""
+import math
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from equity_analytics import drawdown
+from walk_forward import PARAMETERS, simulate, trade_metrics
+from worker_pool import spawn_pool, worker_data
+
+
+def sample_candidates(base: Dict[str, float], space: Dict[str, Sequence[float]], count: int,
+                      seed: Optional[int] = None) -> List[Dict[str, float]]:
+    """
+    ``count`` distinct combinations drawn uniformly from the grid ``space`` (all of
+    them if the grid is smaller), without building the grid itself.
+    """
+    names = list(space)
+    shape = tuple(len(space[name]) for name in names)
+    size = math.prod(shape)
+    if size <= count:
+        picks = np.arange(size)
+    else:
+        picks = np.sort(np.random.default_rng(seed).choice(size, size=count, replace=False))
+    positions = np.unravel_index(picks, shape)
+    return [{**{name: base[name] for name in PARAMETERS},
+             **{name: space[name][int(position[k])] for name, position in zip(names, positions)}}
+            for k in range(len(picks))]
+
+
+def evaluate(data: Dict, params: Dict[str, float], lo: int, hi: int, initial_balance: float) -> Dict[str, float]:
+    """Trade metrics of ``params`` over bars [lo, hi), plus the drawdown of the balance after each trade."""
+    profits = simulate(data, params, lo, hi)['profit']
+    metrics = trade_metrics(profits)
+    balance = initial_balance + np.concatenate(([0.0], np.cumsum(profits)))
+    metrics['max_drawdown_percentage'] = float(drawdown(balance)['percentage'].max())
+    return metrics
+
+
+def _evaluate_job(params, lo, hi, initial_balance) -> Dict[str, float]:
+    return evaluate(worker_data(), params, lo, hi, initial_balance)
+
+
+def successive_halving(data: Dict, candidates: List[Dict[str, float]], objective: str, initial_balance: float,
+                       eta: int = 3, min_fraction: float = 0.1, min_trades: int = 1,
+                       max_drawdown_percentage: Optional[float] = None, processes: int = 1) -> Dict:
+    """
+    Run successive halving over ``candidates`` and return the survivors of the
+    last rung (best first), a summary of every rung and how much work it took.
+
+    Parameters:
+        data: Prepared arrays (see mt5_api._walk_forward_data)
+        candidates: Full parameter sets, as from sample_candidates
+        objective: Metric of trade_metrics to maximize
+        initial_balance: Balance the drawdown is measured from
+        eta: Promote the best 1/eta of the candidates at each rung
+        min_fraction: Share of the range the first rung is evaluated on
+        min_trades: Trades a candidate needs over the whole range; scaled down on shorter rungs
+        max_drawdown_percentage: Prune candidates whose closed-trade drawdown exceeds this
+        processes: Worker processes to spread each rung's evaluations over
+    """
+    n = len(data['time'])
+    # One rung per factor of eta in the candidate count, so about eta candidates reach the last rung
+    rungs = 1
+    while eta ** (rungs + 1) <= len(candidates):
+        rungs += 1
+    fractions = [min_fraction ** ((rungs - 1 - k) / (rungs - 1)) if rungs > 1 else 1.0 for k in range(rungs)]
+
+    executor = None
+    workers = min(processes, len(candidates))
+    if workers > 1:
+        executor = spawn_pool(workers, data)
+    def run(indices: List[int], lo: int) -> List[Dict[str, float]]:
+        if executor is not None:
+            return list(executor.map(_evaluate_job, [candidates[c] for c in indices], [lo] * len(indices),
+                                     [n] * len(indices), [initial_balance] * len(indices)))
+        return [evaluate(data, candidates[c], lo, n, initial_balance) for c in indices]
+
+    queue = list(range(len(candidates)))  # Candidates for the current rung, best first
+    summary, ranked = [], []
+    bars_evaluated = 0
+    try:
+        for k, fraction in enumerate(fractions):
+            lo = n - max(2, int(round(n * fraction)))
+            required = max(1, int(math.ceil(min_trades * (n - lo) / n)))
+            # Rung 0 evaluates everything; later rungs fill a quota of eligible candidates
+            # in rank order, so candidates pruned here are replaced by the next best
+            quota = len(queue) if k == 0 else max(1, int(math.ceil(len(candidates) / eta ** k)))
+            ranked, evaluated, pruned, too_few = [], 0, 0, 0
+            while queue and len(ranked) < quota:
+                batch, queue = queue[:quota - len(ranked)], queue[quota - len(ranked):]
+                for c, metrics in zip(batch, run(batch, lo)):
+                    if max_drawdown_percentage is not None and metrics['max_drawdown_percentage'] > max_drawdown_percentage:
+                        pruned += 1
+                    elif metrics['total_trades'] < required:
+                        too_few += 1
+                    else:
+                        ranked.append((c, metrics))
+                evaluated += len(batch)
+            bars_evaluated += (n - lo) * evaluated
+            # Stable sort: ties keep sampling order
+            ranked.sort(key=lambda item: item[1][objective], reverse=True)
+            summary.append({
+                'rung': k,
+                'fraction': fraction,
+                'bars': n - lo,
+                'evaluated': evaluated,
+                'pruned_drawdown': pruned,
+                'too_few_trades': too_few,
+                'best_score': ranked[0][1][objective] if ranked else None,
+            })
+            queue = [c for c, _ in ranked]
+            if not queue:
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return {
+        'leaderboard': [{'params': candidates[c], 'metrics': metrics} for c, metrics in ranked],
+        'rungs': summary,
+        'compute': {
+            'candidates': len(candidates),
+            'evaluations': int(sum(rung['evaluated'] for rung in summary)),
+            'bars_evaluated': int(bars_evaluated),
+        },
+    }
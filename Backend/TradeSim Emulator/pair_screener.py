@@ -0,0 +1,204 @@
+"""
+Correlation screen over every combination of a symbol list.
+
+``mt5_bridge.analyze_correlation_pairs`` loads both symbols and computes the
+rolling correlation of returns and its below-threshold counts for one pair.
+The screener loads each symbol once, evaluates every combination in worker
+processes (each receives the loaded closes once) and returns one row per pair,
+ranked. Threshold counts come from a single comparison of the correlation
+series against all thresholds at once. With a cointegration window, rows also
+carry each pair's rolling Engle-Granger statistics (see ``cointegration``), so
+pairs can be ranked by cointegration instead of correlation.
+
+    python pair_screener.py EURUSD GBPUSD AUDUSD NZDUSD --timeframe 60 --period 20 --csv screen.csv
+    python pair_screener.py EURUSD GBPUSD AUDUSD NZDUSD --cointegration-window 500 --sort adf_stat --ascending
+"""
+import argparse
+import itertools
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import MetaTrader5 as mt5
+import numpy as np
+import pandas as pd
+import pytz
+
+from bar_data import TIMEFRAMES
+from cointegration import SUMMARY_COLUMNS as COINTEGRATION_COLUMNS, cointegration_summary, rolling_cointegration
+from indicator_store import KERNELS
+from worker_pool import spawn_pool, worker_data
+
+THRESHOLDS = (0.25, 0.0, -0.25)
+DEFAULT_START = datetime(2020, 1, 1, tzinfo=pytz.utc)
+
+
+def threshold_label(threshold: float) -> str:
+    """Stat-name suffix of a threshold: 0.25 -> '025', 0 -> '0', -0.25 -> 'neg025'."""
+    return ('neg' if threshold < 0 else '') + f"{abs(threshold):g}".replace('.', '')
+
+
+def correlation_stats(times: np.ndarray, correlation: np.ndarray,
+                      thresholds: Sequence[float] = THRESHOLDS) -> Dict:
+    """
+    Average correlation and how often it is below each threshold, as in
+    ``analyze_correlation_pairs``.
+
+    Parameters:
+        times: Bar times (int64 epoch seconds) of ``correlation``
+        correlation: Rolling correlation, NaN during warm-up
+        thresholds: Levels to count bars below
+    """
+    values = correlation[~np.isnan(correlation)]
+    below = (values[:, None] < np.asarray(thresholds, dtype=np.float64)).sum(axis=0)
+    total = len(values)
+    stats = {'avg_corr': float(values.mean()) if total else float('nan')}
+    for threshold, count in zip(thresholds, below):
+        stats[f'below_{threshold_label(threshold)}'] = int(count)
+    stats['total_periods'] = total
+    for threshold, count in zip(thresholds, below):
+        stats[f'pct_below_{threshold_label(threshold)}'] = float(count / total * 100) if total > 0 else 0
+    stats['min_date'] = pd.Timestamp(times[0], unit='s').strftime('%Y-%m-%d') if len(times) else None
+    stats['max_date'] = pd.Timestamp(times[-1], unit='s').strftime('%Y-%m-%d') if len(times) else None
+    return stats
+
+
+def load_closes(symbols: Sequence[str], timeframe: int = 60, start_date: datetime = DEFAULT_START,
+                bars: int = 50000) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Bar times (epoch seconds) and closes of each symbol from ``start_date``, at most
+    ``bars`` bars back from now; one MT5 request per symbol.
+    """
+    mt5_timeframe = TIMEFRAMES.get(int(timeframe))
+    if mt5_timeframe is None:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+
+    start = int(pd.Timestamp(start_date).timestamp())
+    closes = {}
+    for symbol in dict.fromkeys(symbols):
+        rates = mt5.copy_rates_from(symbol, mt5_timeframe, datetime.now(pytz.utc), bars)
+        if rates is None:
+            raise ValueError(f"Failed to get data for {symbol}: {mt5.last_error()}")
+        rates = rates[rates['time'] >= start]
+        closes[symbol] = (rates['time'].astype(np.int64), rates['close'].astype(np.float64))
+    return closes
+
+
+def pair_closes(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pair1: str,
+                pair2: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Bar times both symbols have, and each symbol's closes on them."""
+    times, closes1 = closes[pair1]
+    times2, closes2 = closes[pair2]
+    if not np.array_equal(times, times2):
+        times, index1, index2 = np.intersect1d(times, times2, assume_unique=True, return_indices=True)
+        closes1, closes2 = closes1[index1], closes2[index2]
+    return times, closes1, closes2
+
+
+def pair_correlation(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pair1: str, pair2: str,
+                     period: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Bar times both symbols have, and the rolling correlation of their returns on them."""
+    times, closes1, closes2 = pair_closes(closes, pair1, pair2)
+    returns_corr, _ = KERNELS['returns_corr']
+    return times, returns_corr([closes1, closes2], int(period))
+
+
+def screen_pair(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], pair1: str, pair2: str, period: int,
+                thresholds: Sequence[float] = THRESHOLDS, cointegration_window: Optional[int] = None) -> Dict:
+    """Correlation stats of one combination, and its cointegration summary if asked, on the bar times both symbols have."""
+    times, correlation = pair_correlation(closes, pair1, pair2, period)
+    row = {'pair1': pair1, 'pair2': pair2, **correlation_stats(times, correlation, thresholds)}
+    if cointegration_window:
+        _, closes1, closes2 = pair_closes(closes, pair1, pair2)
+        row.update(cointegration_summary(rolling_cointegration(closes1, closes2, cointegration_window)))
+    return row
+
+
+def _screen_pair_job(pair1: str, pair2: str, period: int, thresholds: Sequence[float],
+                     cointegration_window: Optional[int]) -> Dict:
+    return screen_pair(worker_data(), pair1, pair2, period, thresholds, cointegration_window)
+
+
+def screen(closes: Dict[str, Tuple[np.ndarray, np.ndarray]], period: int = 20,
+           thresholds: Sequence[float] = THRESHOLDS, sort_by: str = 'avg_corr', ascending: bool = False,
+           processes: int = 1, cointegration_window: Optional[int] = None) -> List[Dict]:
+    """
+    Stats of every combination of the loaded symbols, ranked by ``sort_by``
+    (NaN last).
+
+    Parameters:
+        closes: Output of load_closes
+        period: Rolling correlation window in bars
+        thresholds: Levels to count bars below
+        sort_by: Stat to rank by, e.g. 'avg_corr' or 'pct_below_0'
+        ascending: Rank lowest first
+        processes: Worker processes; 1 screens in the calling process
+        cointegration_window: Also compute rolling hedge ratio and Engle-Granger
+            statistics over this many bars (columns hedge_ratio, adf_stat,
+            pct_cointegrated, half_life); rank by 'adf_stat' ascending for the most
+            cointegrated pairs first
+    """
+    combinations = list(itertools.combinations(closes, 2))
+    columns = ['pair1', 'pair2', *correlation_stats(np.zeros(0, dtype=np.int64), np.zeros(0), thresholds)]
+    if cointegration_window:
+        columns += COINTEGRATION_COLUMNS
+    if sort_by not in columns:
+        raise ValueError(f"Unknown sort column '{sort_by}'. Available: {columns}")
+
+    workers = min(processes, len(combinations))
+    if workers > 1:
+        with spawn_pool(workers, closes) as executor:
+            n = len(combinations)
+            rows = list(executor.map(_screen_pair_job, [p1 for p1, _ in combinations], [p2 for _, p2 in combinations],
+                                     [period] * n, [thresholds] * n, [cointegration_window] * n,
+                                     chunksize=max(1, n // (4 * workers))))
+    else:
+        rows = [screen_pair(closes, pair1, pair2, period, thresholds, cointegration_window)
+                for pair1, pair2 in combinations]
+
+    table = pd.DataFrame(rows, columns=columns)
+    order = table.sort_values(sort_by, ascending=ascending, kind='stable', na_position='last').index
+    return [rows[i] for i in order]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank every combination of the given symbols by rolling correlation")
+    parser.add_argument("symbols", nargs="+")
+    parser.add_argument("--timeframe", type=int, default=60, help="Bar timeframe in minutes")
+    parser.add_argument("--period", type=int, default=20, help="Rolling correlation window in bars")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=DEFAULT_START)
+    parser.add_argument("--bars", type=int, default=50000, help="Bars loaded per symbol, back from now")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(THRESHOLDS))
+    parser.add_argument("--sort", default="avg_corr", help="Stat to rank by")
+    parser.add_argument("--ascending", action="store_true", help="Rank lowest first")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--cointegration-window", type=int,
+                        help="Also compute rolling hedge ratio and Engle-Granger stats over this many bars")
+    parser.add_argument("--top", type=int, help="Print only this many rows")
+    parser.add_argument("--csv", help="Also write the full table to this CSV file")
+    args = parser.parse_args()
+
+    if not mt5.initialize():
+        raise SystemExit(f"MT5 initialization failed. Error code: {mt5.last_error()}")
+    try:
+        start = time.perf_counter()
+        closes = load_closes(args.symbols, args.timeframe, args.start, args.bars)
+        loaded = time.perf_counter()
+        rows = screen(closes, args.period, args.thresholds, args.sort, args.ascending, args.processes,
+                      args.cointegration_window)
+        screened = time.perf_counter()
+    finally:
+        mt5.shutdown()
+
+    table = pd.DataFrame(rows)
+    if args.csv:
+        table.to_csv(args.csv, index=False)
+    with pd.option_context('display.max_rows', None, 'display.width', 200):
+        print(table.head(args.top) if args.top else table)
+    print(f"{len(rows)} combinations of {len(closes)} symbols: loaded in {loaded - start:.1f}s, "
+          f"screened in {screened - loaded:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
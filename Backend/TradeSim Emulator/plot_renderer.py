@@ -0,0 +1,297 @@
+"""
+Backtest and indicator plot rendering.
+
+Plots are drawn from a small, picklable ``plot_data`` dict (see
+``PairedTradingBacktester.plot_data``) with matplotlib's object-oriented Agg
+API: every render owns its Figure, so nothing touches pyplot's global state.
+
+The API server renders through ``RenderPool``, a few worker processes fed by
+a bounded request queue with a timeout per job, so rendering never blocks the
+event loop and a stuck render cannot pin a worker forever. matplotlib is only
+imported inside the render functions, i.e. in the workers; the API process
+never loads it.
+"""
+import asyncio
+import logging
+import multiprocessing
+import threading
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from trade_log import as_trade_array
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """More render requests are waiting than the pool accepts."""
+
+
+class RenderWorkersRestarted(Exception):
+    """The render's worker pool was restarted after another render timed out."""
+
+
+def _new_figure(figsize: Tuple[float, float], dpi: Optional[int] = None):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def _png(fig, dpi: Optional[int], **kwargs) -> bytes:
+    buf = BytesIO()
+    fig.savefig(buf, format='png', dpi=dpi if dpi is not None else 'figure', **kwargs)
+    return buf.getvalue()
+
+
+def render_correlation_vs_profit(plot_data: Dict[str, Any], figsize: Tuple[float, float] = (12, 6),
+                                 dpi: Optional[int] = None) -> bytes:
+    """Scatter of entry correlation against trade profit (%) as PNG bytes."""
+    trades = as_trade_array(plot_data['trades'])
+    correlations = trades['entry_correlation']
+    profits = trades['total_profit'] * 100  # Convert to percentage
+
+    fig = _new_figure(figsize)
+    ax = fig.add_subplot()
+    ax.scatter(correlations, profits, alpha=0.6)
+    ax.set_title('Entry Correlation vs Trade Profit')
+    ax.set_xlabel('Entry Correlation')
+    ax.set_ylabel('Profit (%)')
+    ax.grid(True)
+
+    # Add horizontal line at y=0
+    ax.axhline(y=0, color='r', linestyle='--', alpha=0.3)
+    return _png(fig, dpi)
+
+
+def render_equity_curve(plot_data: Dict[str, Any], figsize: Tuple[float, float] = (12, 10),
+                        dpi: Optional[int] = 300) -> bytes:
+    """Mark-to-market equity and its underwater (drawdown) curve as PNG bytes."""
+    from equity_analytics import drawdown
+
+    trades = as_trade_array(plot_data['trades'])
+    if len(trades) == 0:
+        raise ValueError("No trades to plot")
+
+    if plot_data.get('equity') is not None:
+        dates = plot_data['correlation_time']
+        equity = np.asarray(plot_data['equity'], dtype=np.float64)
+    else:
+        # Results cached before bar-resolution equity: balance after each trade
+        dates = trades['exit_time']
+        equity = plot_data['initial_balance'] + np.cumsum(trades['total_profit'])
+    underwater = -drawdown(equity)['percentage']
+
+    fig = _new_figure(figsize)
+    ax1, ax2 = fig.subplots(2, 1, height_ratios=[2, 1], sharex=True)
+
+    # Equity including open-trade P&L
+    ax1.plot(dates, equity, label='Equity ($)', color='green', linewidth=1)
+    ax1.axhline(y=plot_data['initial_balance'], color='grey', linestyle='--', alpha=0.5)
+    ax1.set_title(f'Equity Curve (Net: {plot_data["net_profit_percentage"]:.2f}%, '
+                  f'${plot_data["net_profit_dollars"]:,.2f})')
+    ax1.set_ylabel('Account Equity ($)')
+    ax1.grid(True)
+    ax1.legend()
+
+    # Underwater curve: distance below the running equity peak
+    ax2.fill_between(dates, underwater, 0, color='red', alpha=0.3)
+    ax2.plot(dates, underwater, color='red', linewidth=0.8)
+    ax2.set_title(f'Underwater (Max Drawdown: {underwater.min():.2f}%)')
+    ax2.set_xlabel('Date')
+    ax2.set_ylabel('Drawdown (%)')
+    ax2.grid(True)
+
+    fig.autofmt_xdate()
+    fig.tight_layout()
+    return _png(fig, dpi, bbox_inches='tight')
+
+
+def render_correlation_timeline(plot_data: Dict[str, Any], figsize: Tuple[float, float] = (15, 7),
+                                dpi: Optional[int] = 300) -> bytes:
+    """Rolling correlation over time with thresholds and trade markers as PNG bytes."""
+    entry_threshold = plot_data['entry_threshold']
+    exit_threshold = plot_data['exit_threshold']
+    trades = as_trade_array(plot_data['trades'])
+
+    fig = _new_figure(figsize)
+    ax = fig.add_subplot()
+    ax.plot(plot_data['correlation_time'], plot_data['correlation'],
+            label='Correlation', color='blue', linewidth=1)
+
+    # Add entry and exit threshold lines
+    ax.axhline(y=entry_threshold, color='r',
+               linestyle='--', label=f'Entry Threshold ({entry_threshold})')
+    ax.axhline(y=exit_threshold, color='g',
+               linestyle='--', label=f'Exit Threshold ({exit_threshold})')
+
+    # Trade entry and exit markers, one scatter call each
+    if len(trades):
+        ax.scatter(trades['entry_time'], trades['entry_correlation'],
+                   color='green', marker='^', s=100, label='Trade Entry')
+        ax.scatter(trades['exit_time'], trades['exit_correlation'],
+                   color='red', marker='v', s=100, label='Trade Exit')
+
+    ax.set_title(f'Correlation Timeline: {plot_data["pair1"]} vs {plot_data["pair2"]}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Correlation')
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+    fig.autofmt_xdate()
+
+    # Add correlation bands
+    ax.axhspan(-1, -0.7, alpha=0.1, color='red', label='Strong Negative')
+    ax.axhspan(-0.7, -0.3, alpha=0.1, color='yellow', label='Moderate Negative')
+    ax.axhspan(-0.3, 0.3, alpha=0.1, color='gray', label='Weak Correlation')
+    ax.axhspan(0.3, 0.7, alpha=0.1, color='yellow', label='Moderate Positive')
+    ax.axhspan(0.7, 1, alpha=0.1, color='green', label='Strong Positive')
+    return _png(fig, dpi, bbox_inches='tight')
+
+
+def render_indicators(plot_data: Dict[str, Any], figsize: Tuple[float, float] = (15, 10),
+                      dpi: Optional[int] = 100) -> bytes:
+    """/mt5/plot-indicators chart: correlation and both RSIs on a dark background."""
+    from matplotlib import style
+
+    pair1, pair2 = plot_data['pairs']
+    with style.context('dark_background'):
+        fig = _new_figure(figsize, dpi)
+        ax1, ax2 = fig.subplots(2, 1)
+        dates = plot_data['dates']
+
+        # Plot correlation
+        ax1.plot(dates, plot_data['correlation'], 'w-', label='Correlation', alpha=0.8)
+        ax1.axhline(y=plot_data['entry_threshold'], color='r', linestyle='--', label='Entry Threshold')
+        ax1.axhline(y=plot_data['exit_threshold'], color='g', linestyle='--', label='Exit Threshold')
+        ax1.set_title('Correlation Analysis')
+        ax1.set_ylabel('Correlation')
+        ax1.grid(True, alpha=0.2)
+        ax1.legend()
+
+        # Plot RSI
+        ax2.plot(dates, plot_data['rsi1'], 'b-', label=f'RSI {pair1}', alpha=0.8)
+        ax2.plot(dates, plot_data['rsi2'], 'y-', label=f'RSI {pair2}', alpha=0.8)
+        ax2.axhline(y=plot_data['rsi_overbought'], color='r', linestyle='--', label='Overbought')
+        ax2.axhline(y=plot_data['rsi_oversold'], color='g', linestyle='--', label='Oversold')
+        ax2.set_title('RSI Analysis')
+        ax2.set_ylabel('RSI')
+        ax2.grid(True, alpha=0.2)
+        ax2.legend()
+
+        fig.autofmt_xdate()
+        return _png(fig, dpi, bbox_inches='tight')
+
+
+# Backtest plots served by URL name, with their default figure size in inches
+PLOTS = {
+    'correlation-vs-profit': (12, 6),
+    'equity-curve': (12, 10),
+    'correlation-timeline': (15, 7),
+}
+
+RENDERERS = {
+    'correlation-vs-profit': render_correlation_vs_profit,
+    'equity-curve': render_equity_curve,
+    'correlation-timeline': render_correlation_timeline,
+    'indicators': render_indicators,
+}
+
+
+def _render_job(plot_name: str, plot_data: Dict[str, Any], figsize: Tuple[float, float],
+                dpi: Optional[int]) -> bytes:
+    return RENDERERS[plot_name](plot_data, figsize, dpi)
+
+
+def _init_worker():
+    # Loaded once per worker rather than on the first job
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+class RenderPool:
+    def __init__(self, processes: int = 2, timeout: float = 30.0, max_pending: int = 32):
+        """
+        Parameters:
+            processes: Worker processes, started on first use
+            timeout: Seconds a single render may take before its worker pool is restarted
+            max_pending: Render requests allowed in flight (queued or running) at once
+        """
+        self.processes = processes
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self._pool = None
+        self._pending = 0
+        self._jobs: Dict[Any, set] = {}  # pool -> resolvers of its unfinished jobs
+        self._lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                # spawn: workers start clean (no copied event loop or MT5 state) on every platform
+                context = multiprocessing.get_context('spawn')
+                self._pool = context.Pool(self.processes, initializer=_init_worker)
+            return self._pool
+
+    def _restart(self, pool) -> None:
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+            orphaned = self._jobs.pop(pool, set())
+        # The pool's other jobs die with it; fail them now rather than at their own timeouts
+        for fail in orphaned:
+            fail(RenderWorkersRestarted("Render workers were restarted after a timeout"))
+        threading.Thread(target=pool.terminate, daemon=True).start()
+
+    async def render(self, plot_name: str, plot_data: Dict[str, Any], figsize: Tuple[float, float],
+                     dpi: Optional[int]) -> bytes:
+        """Render ``plot_name`` in a worker process and return PNG bytes."""
+        if plot_name not in RENDERERS:
+            raise ValueError(f"Unknown plot '{plot_name}'")
+        if self._pending >= self.max_pending:
+            raise RenderQueueFull(f"{self._pending} plots are already being rendered")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def resolve(result=None, error=None):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        def fail(error):
+            loop.call_soon_threadsafe(resolve, None, error)
+
+        pool = self._get_pool()
+        with self._lock:
+            self._jobs.setdefault(pool, set()).add(fail)
+        self._pending += 1
+        try:
+            pool.apply_async(
+                _render_job, (plot_name, plot_data, figsize, dpi),
+                callback=lambda result: loop.call_soon_threadsafe(resolve, result),
+                error_callback=lambda error: loop.call_soon_threadsafe(resolve, None, error),
+            )
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Rendering {plot_name} took longer than {self.timeout}s; restarting render workers")
+                self._restart(pool)
+                raise
+        finally:
+            self._pending -= 1
+            with self._lock:
+                self._jobs.get(pool, set()).discard(fail)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
@@ -0,0 +1,525 @@
+"""
+Accelerated historical replay (paper trading) for StrategyMonitor.
+
+Recorded bars and ticks are served through ``SimulatedMT5``, an object exposing
+the subset of the MetaTrader5 API the live code uses, with a virtual clock and a
+simulated broker behind ``order_send``/``positions_get``. ``ReplayEngine`` swaps it
+in for the ``mt5`` module used by ``mt5_api`` and ``indicator_utils`` and then
+drives ``StrategyMonitor.run_iteration`` step by step without sleeping, so the
+live entry/exit logic runs unchanged against history.
+
+Because the swap patches module globals, a replay must not run inside the live
+API process while real strategies are being monitored. Use the CLI:
+
+    python replay_engine.py strategy.json --start 2024-01-01 --end 2024-02-01 --compare
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from itertools import count
+from typing import Dict, List, Optional
+
+import MetaTrader5 as mt5
+import numpy as np
+
+from bar_data import TIMEFRAMES
+import indicator_utils
+import mt5_api
+
+TICK_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8')])
+
+AccountInfo = namedtuple('AccountInfo', [
+    'login', 'balance', 'equity', 'margin', 'margin_free', 'currency', 'leverage', 'name',
+])
+TerminalInfo = namedtuple('TerminalInfo', ['connected', 'trade_allowed'])
+SymbolInfo = namedtuple('SymbolInfo', ['name', 'visible', 'select', 'trade_mode', 'point', 'bid', 'ask',
+                                       'volume_min', 'volume_max', 'volume_step'])
+Tick = namedtuple('Tick', ['time', 'bid', 'ask', 'last', 'volume', 'time_msc', 'flags', 'volume_real'])
+TradePosition = namedtuple('TradePosition', [
+    'ticket', 'time', 'type', 'magic', 'volume', 'price_open', 'price_current',
+    'profit', 'symbol', 'comment',
+])
+OrderSendResult = namedtuple('OrderSendResult', ['retcode', 'order', 'deal', 'volume', 'price', 'comment'])
+
+
+def _to_ts(value) -> float:
+    """Epoch seconds for MT5 date arguments; naive datetimes are treated as UTC."""
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    return float(value)
+
+
+def _pip_size(symbol: str) -> float:
+    return 0.01 if symbol.endswith('JPY') else 0.0001
+
+
+def _position_profit(symbol: str, is_buy: bool, volume: float, price_open: float, price: float) -> float:
+    """Same pip-value model as PairedTradingBacktester: $10 per pip per standard lot."""
+    diff = price - price_open if is_buy else price_open - price
+    return diff / _pip_size(symbol) * 10.0 * volume
+
+
+class SimulatedBroker:
+    """Instant-fill market broker marking positions to the simulator's quotes."""
+
+    def __init__(self, balance: float):
+        self.balance = balance
+        self.positions: Dict[int, dict] = {}
+        self.closed_positions: List[dict] = []
+        self._tickets = count(1)
+
+    def open(self, symbol, order_type, volume, price, magic, comment, now) -> int:
+        ticket = next(self._tickets)
+        self.positions[ticket] = {
+            'ticket': ticket, 'symbol': symbol, 'type': order_type, 'volume': float(volume),
+            'price_open': price, 'time': int(now), 'magic': int(magic), 'comment': comment or '',
+        }
+        return ticket
+
+    def close(self, ticket, price, now) -> Optional[dict]:
+        position = self.positions.pop(ticket, None)
+        if position is None:
+            return None
+        profit = _position_profit(position['symbol'], position['type'] == mt5.ORDER_TYPE_BUY,
+                                  position['volume'], position['price_open'], price)
+        self.balance += profit
+        closed = dict(position, price_close=price, time_close=int(now), profit=profit)
+        self.closed_positions.append(closed)
+        return closed
+
+
+class SimulatedMT5:
+    """
+    MetaTrader5 look-alike backed by recorded history and a virtual clock.
+
+    Parameters:
+        bars: {(symbol, timeframe_minutes): MT5 rates structured array}
+        ticks: {symbol: array with time_msc/bid/ask fields}; optional. Without
+            ticks, quotes come from the forming bar's open plus its recorded spread.
+        balance: Starting balance of the simulated account
+    """
+
+    # Constants resolve to the real package's values so indicator_utils' maps keep working
+    TIMEFRAME_M1 = mt5.TIMEFRAME_M1
+    TIMEFRAME_M5 = mt5.TIMEFRAME_M5
+    TIMEFRAME_M15 = mt5.TIMEFRAME_M15
+    TIMEFRAME_M30 = mt5.TIMEFRAME_M30
+    TIMEFRAME_H1 = mt5.TIMEFRAME_H1
+    TIMEFRAME_H4 = mt5.TIMEFRAME_H4
+    TIMEFRAME_D1 = mt5.TIMEFRAME_D1
+    COPY_TICKS_ALL = mt5.COPY_TICKS_ALL
+    ORDER_TYPE_BUY = mt5.ORDER_TYPE_BUY
+    ORDER_TYPE_SELL = mt5.ORDER_TYPE_SELL
+    TRADE_ACTION_DEAL = mt5.TRADE_ACTION_DEAL
+    ORDER_FILLING_FOK = mt5.ORDER_FILLING_FOK
+    ORDER_FILLING_IOC = mt5.ORDER_FILLING_IOC
+    ORDER_FILLING_RETURN = mt5.ORDER_FILLING_RETURN
+    ORDER_TIME_GTC = mt5.ORDER_TIME_GTC
+    TRADE_RETCODE_DONE = mt5.TRADE_RETCODE_DONE
+    TRADE_RETCODE_INVALID = 10013
+
+    def __init__(self, bars: Dict[tuple, np.ndarray], ticks: Dict[str, np.ndarray] = None, balance: float = 10000.0):
+        self._minutes = {const: minutes for minutes, const in TIMEFRAMES.items()}
+        self.bars = {key: np.ascontiguousarray(rates) for key, rates in bars.items()}
+        self._bar_times = {key: rates['time'] for key, rates in self.bars.items()}
+        self.ticks = ticks or {}
+        self.symbols = sorted({symbol for symbol, _ in self.bars} | set(self.ticks))
+        self.broker = SimulatedBroker(balance)
+        self.now = 0.0
+
+    # --- clock -----------------------------------------------------------
+    def set_time(self, now) -> None:
+        self.now = _to_ts(now)
+
+    def now_datetime(self) -> datetime:
+        return datetime.fromtimestamp(self.now, tz=timezone.utc).replace(tzinfo=None)
+
+    # --- terminal --------------------------------------------------------
+    def initialize(self, *args, **kwargs) -> bool:
+        return True
+
+    def shutdown(self) -> None:
+        pass
+
+    def last_error(self):
+        return (1, 'Success')
+
+    def terminal_info(self):
+        return TerminalInfo(connected=True, trade_allowed=True)
+
+    def account_info(self):
+        equity = self.broker.balance + sum(p.profit for p in self.positions_get())
+        return AccountInfo(login=0, balance=self.broker.balance, equity=equity, margin=0.0,
+                           margin_free=equity, currency='USD', leverage=100, name='Replay')
+
+    def symbol_info(self, symbol):
+        if symbol not in self.symbols:
+            return None
+        tick = self.symbol_info_tick(symbol)
+        return SymbolInfo(name=symbol, visible=True, select=True, trade_mode=4,
+                          point=_pip_size(symbol) / 10, bid=tick.bid, ask=tick.ask,
+                          volume_min=0.01, volume_max=100.0, volume_step=0.01)
+
+    # --- market data -----------------------------------------------------
+    def _quote(self, symbol: str):
+        """(bid, ask, time_msc) at the virtual clock, never looking ahead."""
+        now_msc = int(self.now * 1000)
+        ticks = self.ticks.get(symbol)
+        if ticks is not None and len(ticks):
+            j = np.searchsorted(ticks['time_msc'], now_msc, side='right') - 1
+            if j >= 0:
+                return float(ticks['bid'][j]), float(ticks['ask'][j]), int(ticks['time_msc'][j])
+
+        # No ticks recorded: the forming bar's open is the last price known at its start
+        key = min((k for k in self.bars if k[0] == symbol), key=lambda k: k[1], default=None)
+        if key is None:
+            return None
+        i = np.searchsorted(self._bar_times[key], self.now, side='right') - 1
+        if i < 0:
+            return None
+        bar = self.bars[key][i]
+        half_spread = float(bar['spread']) * _pip_size(symbol) / 20
+        return float(bar['open']) - half_spread, float(bar['open']) + half_spread, int(bar['time']) * 1000
+
+    def symbol_info_tick(self, symbol):
+        quote = self._quote(symbol)
+        if quote is None:
+            return None
+        bid, ask, time_msc = quote
+        return Tick(time_msc // 1000, bid, ask, 0.0, 0, time_msc, 6, 0.0)
+
+    def _rates(self, symbol, timeframe):
+        key = (symbol, self._minutes.get(timeframe))
+        return self.bars.get(key), self._bar_times.get(key)
+
+    def _forming(self, rates: np.ndarray, symbol: str) -> np.ndarray:
+        """Replace the last (forming) bar's final values with what is known at the clock."""
+        rates = rates.copy()
+        quote = self._quote(symbol)
+        if quote is not None and len(rates):
+            bar = rates[-1:]
+            bid = quote[0]
+            bar['close'] = bid
+            bar['high'] = np.minimum(bar['high'], np.maximum(bar['open'], bid))
+            bar['low'] = np.maximum(bar['low'], np.minimum(bar['open'], bid))
+        return rates
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        rates, times = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        last = np.searchsorted(times, self.now, side='right') - int(start_pos)
+        result = rates[max(last - int(count), 0):max(last, 0)]
+        return self._forming(result, symbol) if start_pos == 0 else result.copy()
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        rates, times = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        last = np.searchsorted(times, min(_to_ts(date_from), self.now), side='right')
+        return self._forming(rates[max(last - int(count), 0):last], symbol)
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        rates, times = self._rates(symbol, timeframe)
+        if rates is None:
+            return None
+        lo = np.searchsorted(times, _to_ts(date_from), side='left')
+        hi = np.searchsorted(times, min(_to_ts(date_to), self.now), side='right')
+        return self._forming(rates[lo:hi], symbol)
+
+    def copy_ticks_from(self, symbol, date_from, count, flags=None):
+        ticks = self.ticks.get(symbol)
+        if ticks is None:
+            return None
+        lo = np.searchsorted(ticks['time_msc'], int(_to_ts(date_from) * 1000), side='left')
+        hi = np.searchsorted(ticks['time_msc'], int(self.now * 1000), side='right')
+        selected = ticks[lo:min(hi, lo + int(count))]
+        # Index layout used by indicator_utils.get_tick_data: [1]=bid, [2]=ask, [5]=time_msc
+        out = np.zeros(len(selected), dtype=[
+            ('time', '<i8'), ('bid', '<f8'), ('ask', '<f8'), ('last', '<f8'),
+            ('volume', '<u8'), ('time_msc', '<i8'), ('flags', '<u4'), ('volume_real', '<f8'),
+        ])
+        out['time_msc'] = selected['time_msc']
+        out['time'] = selected['time_msc'] // 1000
+        out['bid'] = selected['bid']
+        out['ask'] = selected['ask']
+        return out
+
+    # --- trading ---------------------------------------------------------
+    def _mark(self, position: dict) -> TradePosition:
+        tick = self.symbol_info_tick(position['symbol'])
+        is_buy = position['type'] == mt5.ORDER_TYPE_BUY
+        price = tick.bid if is_buy else tick.ask
+        return TradePosition(
+            ticket=position['ticket'], time=position['time'], type=position['type'],
+            magic=position['magic'], volume=position['volume'], price_open=position['price_open'],
+            price_current=price, symbol=position['symbol'], comment=position['comment'],
+            profit=_position_profit(position['symbol'], is_buy, position['volume'], position['price_open'], price),
+        )
+
+    def positions_get(self, symbol=None, group=None, ticket=None, magic=None):
+        positions = [
+            p for p in self.broker.positions.values()
+            if (symbol is None or p['symbol'] == symbol)
+            and (ticket is None or p['ticket'] == ticket)
+            and (magic is None or p['magic'] == magic)
+        ]
+        return tuple(self._mark(p) for p in positions)
+
+    def orders_get(self, *args, **kwargs):
+        return ()
+
+    def order_send(self, request: dict):
+        symbol = request.get('symbol')
+        tick = self.symbol_info_tick(symbol) if symbol in self.symbols else None
+        if request.get('action') != mt5.TRADE_ACTION_DEAL or tick is None:
+            return OrderSendResult(self.TRADE_RETCODE_INVALID, 0, 0, 0.0, 0.0, 'Invalid request')
+
+        price = tick.ask if request.get('type') == mt5.ORDER_TYPE_BUY else tick.bid
+        if request.get('position'):
+            closed = self.broker.close(request['position'], price, self.now)
+            if closed is None:
+                return OrderSendResult(self.TRADE_RETCODE_INVALID, 0, 0, 0.0, 0.0, 'Position not found')
+            ticket = closed['ticket']
+        else:
+            ticket = self.broker.open(symbol, request.get('type'), request.get('volume'), price,
+                                      request.get('magic', 0), request.get('comment'), self.now)
+        return OrderSendResult(mt5.TRADE_RETCODE_DONE, ticket, ticket, float(request.get('volume', 0.0)),
+                               price, 'Request executed')
+
+
+def record_history(symbols: List[str], timeframe: int, start: datetime, end: datetime,
+                   warmup_bars: int = 500, include_ticks: bool = False, balance: float = 10000.0) -> SimulatedMT5:
+    """
+    Fetch bars (and optionally ticks) from the live terminal into a SimulatedMT5.
+    ``warmup_bars`` extra bars before ``start`` let indicators be valid from the first step.
+    """
+    if not mt5_api.connection_manager.ensure_connection():
+        raise ValueError("MT5 initialization failed!")
+
+    timeframe_mt5 = TIMEFRAMES.get(int(timeframe))
+    if timeframe_mt5 is None:
+        raise ValueError(f"Invalid timeframe: {timeframe}")
+
+    bars, ticks = {}, {}
+    history_start = start - timedelta(minutes=int(timeframe) * warmup_bars)
+    for symbol in symbols:
+        rates = mt5.copy_rates_range(symbol, timeframe_mt5, history_start, end)
+        if rates is None or len(rates) == 0:
+            raise ValueError(f"Failed to fetch data for {symbol}")
+        bars[(symbol, int(timeframe))] = rates
+
+        if include_ticks:
+            raw = mt5.copy_ticks_range(symbol, start, end, mt5.COPY_TICKS_ALL)
+            if raw is None:
+                raise ValueError(f"Failed to fetch ticks for {symbol}")
+            recorded = np.empty(len(raw), dtype=TICK_DTYPE)
+            for field in TICK_DTYPE.names:
+                recorded[field] = raw[field]
+            ticks[symbol] = recorded
+
+    return SimulatedMT5(bars, ticks, balance=balance)
+
+
+def save_history(sim: SimulatedMT5, path: str) -> None:
+    arrays = {f"bars|{symbol}|{minutes}": rates for (symbol, minutes), rates in sim.bars.items()}
+    arrays.update({f"ticks|{symbol}": ticks for symbol, ticks in sim.ticks.items()})
+    np.savez(path, **arrays)
+
+
+def load_history(path: str, balance: float = 10000.0) -> SimulatedMT5:
+    bars, ticks = {}, {}
+    with np.load(path) as archive:
+        for name in archive.files:
+            parts = name.split('|')
+            if parts[0] == 'bars':
+                bars[(parts[1], int(parts[2]))] = archive[name]
+            else:
+                ticks[parts[1]] = archive[name]
+    return SimulatedMT5(bars, ticks, balance=balance)
+
+
+@contextlib.contextmanager
+def patched_mt5(sim: SimulatedMT5):
+    """Point the backend modules' ``mt5`` global at the simulator for the duration."""
+    originals = (mt5_api.mt5, indicator_utils.mt5)
+    mt5_api.mt5 = sim
+    indicator_utils.mt5 = sim
+    # Live correlation state belongs to the market it was fed from
+    indicator_utils.correlation_trackers.clear()
+    try:
+        yield sim
+    finally:
+        mt5_api.mt5, indicator_utils.mt5 = originals
+        indicator_utils.correlation_trackers.clear()
+
+
+class ReplayEngine:
+    """
+    Replay one or more strategies through StrategyMonitor on a virtual clock.
+
+    Parameters:
+        sim: Recorded market (see ``record_history``/``load_history``)
+        strategies: Strategy parameter dicts as sent to /mt5/start-strategy
+        step_seconds: Virtual seconds between monitor iterations (the live loop sleeps 1s)
+        quiet: Discard the monitors' console output
+    """
+
+    def __init__(self, sim: SimulatedMT5, strategies: List[dict], step_seconds: float = 60.0, quiet: bool = True):
+        self.sim = sim
+        self.strategies = strategies
+        self.step_seconds = step_seconds
+        self.quiet = quiet
+
+    async def run(self, start: datetime, end: datetime) -> Dict:
+        started = time.perf_counter()
+        start_ts, end_ts = _to_ts(start), _to_ts(end)
+        steps = int((end_ts - start_ts) // self.step_seconds) + 1
+        equity = np.empty(steps)
+        errors = 0
+
+        output = io.StringIO() if self.quiet else None
+        with patched_mt5(self.sim), (contextlib.redirect_stdout(output) if self.quiet else contextlib.nullcontext()):
+            self.sim.set_time(start_ts)
+            monitors = []
+            for params in self.strategies:
+                monitor = mt5_api.StrategyMonitor(params["id"], params)
+                monitor._now = self.sim.now_datetime
+                await monitor.initialize()
+                monitors.append(monitor)
+
+            for step in range(steps):
+                self.sim.set_time(start_ts + step * self.step_seconds)
+                for monitor in monitors:
+                    try:
+                        await monitor.run_iteration()
+                    except Exception as e:
+                        # The live loop logs and carries on; mirror that but keep a count
+                        errors += 1
+                        monitor.placing_trades = False
+                        print(f"Error in replay iteration: {e}")
+                equity[step] = self.sim.account_info().equity
+
+            for monitor in monitors:
+                await monitor.stop(close_trades=True)
+
+        elapsed = time.perf_counter() - started
+        return {
+            'trades': paired_trades(self.sim.broker.closed_positions),
+            'positions': self.sim.broker.closed_positions,
+            'equity_curve': [
+                {'date': str(datetime.fromtimestamp(start_ts + i * self.step_seconds, tz=timezone.utc)
+                             .replace(tzinfo=None)), 'equity': float(value)}
+                for i, value in enumerate(equity)
+            ],
+            'final_balance': self.sim.broker.balance,
+            'iterations': steps * len(monitors),
+            'errors': errors,
+            'elapsed_seconds': elapsed,
+            'speedup': (end_ts - start_ts) / elapsed if elapsed > 0 else None,
+        }
+
+    def run_sync(self, start: datetime, end: datetime) -> Dict:
+        return asyncio.run(self.run(start, end))
+
+
+def paired_trades(closed_positions: List[dict]) -> List[Dict]:
+    """
+    Group closed legs into the backtester's trade shape (one long + one short leg
+    opened by the same magic number at the same time).
+    """
+    legs: Dict[tuple, List[dict]] = {}
+    for position in closed_positions:
+        legs.setdefault((position['magic'], position['time']), []).append(position)
+
+    trades = []
+    for (magic, opened), group in sorted(legs.items(), key=lambda item: item[0][1]):
+        longs = [p for p in group if p['type'] == mt5.ORDER_TYPE_BUY]
+        shorts = [p for p in group if p['type'] == mt5.ORDER_TYPE_SELL]
+        if len(longs) != 1 or len(shorts) != 1:
+            continue
+        long_leg, short_leg = longs[0], shorts[0]
+        trades.append({
+            'entry_time': datetime.fromtimestamp(opened, tz=timezone.utc).replace(tzinfo=None),
+            'exit_time': datetime.fromtimestamp(max(long_leg['time_close'], short_leg['time_close']),
+                                                tz=timezone.utc).replace(tzinfo=None),
+            'long_pair': long_leg['symbol'],
+            'short_pair': short_leg['symbol'],
+            'long_entry_price': long_leg['price_open'],
+            'long_exit_price': long_leg['price_close'],
+            'short_entry_price': short_leg['price_open'],
+            'short_exit_price': short_leg['price_close'],
+            'long_profit': long_leg['profit'],
+            'short_profit': short_leg['profit'],
+            'total_profit': long_leg['profit'] + short_leg['profit'],
+            'magic': magic,
+        })
+    return trades
+
+
+def compare_with_backtest(replay_trades: List[Dict], backtest_trades: List[Dict],
+                          tolerance: timedelta = timedelta(hours=1)) -> Dict:
+    """Summarise where the live code path and the close-only backtester diverge."""
+    unmatched = list(backtest_trades)
+    matched = 0
+    for trade in replay_trades:
+        for candidate in unmatched:
+            if (candidate['long_pair'] == trade['long_pair']
+                    and abs(candidate['entry_time'] - trade['entry_time']) <= tolerance):
+                unmatched.remove(candidate)
+                matched += 1
+                break
+    return {
+        'replay_trades': len(replay_trades),
+        'backtest_trades': len(backtest_trades),
+        'matched_entries': matched,
+        'replay_net_profit': float(sum(t['total_profit'] for t in replay_trades)),
+        'backtest_net_profit': float(sum(t['total_profit'] for t in backtest_trades)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a strategy through StrategyMonitor on recorded history")
+    parser.add_argument("strategy", help="JSON file with the strategy parameters (as sent to /mt5/start-strategy)")
+    parser.add_argument("--start", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--end", required=True, type=datetime.fromisoformat)
+    parser.add_argument("--step", type=float, default=60.0, help="Virtual seconds per monitor iteration")
+    parser.add_argument("--ticks", action="store_true", help="Record and replay ticks, not just bars")
+    parser.add_argument("--history", help="Load history from this .npz instead of MT5 (saved with --save-history)")
+    parser.add_argument("--save-history", help="Save the recorded history to this .npz")
+    parser.add_argument("--compare", action="store_true", help="Also run PairedTradingBacktester on the range")
+    args = parser.parse_args()
+
+    with open(args.strategy) as f:
+        params = json.load(f)
+
+    warmup = max(int(params["correlationWindow"]), int(params["rsiPeriod"])) + 1
+    if args.history:
+        sim = load_history(args.history, balance=float(params.get("startingBalance", 10000)))
+    else:
+        sim = record_history(params["currencyPairs"], int(params["timeFrame"]), args.start, args.end,
+                             warmup_bars=warmup, include_ticks=args.ticks,
+                             balance=float(params.get("startingBalance", 10000)))
+    if args.save_history:
+        save_history(sim, args.save_history)
+
+    result = ReplayEngine(sim, [params], step_seconds=args.step).run_sync(args.start, args.end)
+    print(f"Replayed {args.start} -> {args.end} in {result['elapsed_seconds']:.1f}s "
+          f"({result['speedup']:.0f}x real time), {len(result['trades'])} trades, "
+          f"final balance ${result['final_balance']:,.2f}, {result['errors']} iteration errors")
+
+    if args.compare:
+        request = mt5_api.BacktestRequest(**dict(params, startDate=args.start, endDate=args.end))
+        backtest = mt5_api.PairedTradingBacktester(request).run_backtest()
+        print(json.dumps(compare_with_backtest(result['trades'], backtest['trades']), indent=2))
+
+
+if __name__ == "__main__":
+    main()
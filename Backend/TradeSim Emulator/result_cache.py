@@ -0,0 +1,145 @@
+"""
+Content-addressed cache for backtest results.
+
+Results are keyed by a hash of the normalized request plus a bar-data version
+(the latest bar MT5 has for the requested range), so rerunning an identical
+request is served from cache while a range that has since gained new bars is
+recomputed. A small in-memory LRU sits in front of a pickle-per-entry disk tier
+that survives server restarts.
+"""
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BACKTEST_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".backtest_cache"),
+)
+
+# Request fields that only label a run and never change its results
+NON_RESULT_FIELDS = ("id", "name", "magicNumber", "tradeComment")
+
+
+def request_key(request: Dict[str, Any], data_version: Any) -> str:
+    """SHA-256 over the result-affecting request fields and the data version."""
+    normalized = {k: v for k, v in request.items() if k not in NON_RESULT_FIELDS}
+    payload = json.dumps({"request": normalized, "data_version": data_version},
+                         sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class BacktestResultCache:
+    def __init__(self, max_entries: int = 32, cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+                 max_disk_entries: int = 512):
+        """
+        Parameters:
+            max_entries: Results kept in memory (least recently used evicted first)
+            cache_dir: Directory for the disk tier; None keeps the cache memory-only
+            max_disk_entries: Files kept on disk (oldest evicted first)
+        """
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._memory: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        value = self._read_disk(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        self._remember(key, value)
+        self._write_disk(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+        }
+
+    def _remember(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+            # Touch so disk eviction is least-recently-used too
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable backtest cache entry {key}: {e}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+            self._evict_disk()
+        except OSError as e:
+            logger.warning(f"Could not persist backtest cache entry {key}: {e}")
+
+    def _evict_disk(self) -> None:
+        entries = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir)
+                   if name.endswith(".pkl")]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,160 @@
+"""
+Bounded-memory tick ingestion for tick-level backtests.
+
+Ticks are pulled from MT5 with ``copy_ticks_range`` over short time windows,
+trimmed to the three fields the backtester needs (time_msc, bid, ask: 24 bytes
+per tick) and re-chunked into fixed-size arrays. Two symbol streams are merged
+by time into one stream carrying both symbols' latest quotes on every row, so a
+month of two-pair data never needs to be resident at once.
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+import MetaTrader5 as mt5
+import numpy as np
+
+TICK_DTYPE = np.dtype([('time_msc', '<i8'), ('bid', '<f8'), ('ask', '<f8')])
+MERGED_TICK_DTYPE = np.dtype([
+    ('time_msc', '<i8'),
+    ('bid1', '<f8'), ('ask1', '<f8'),
+    ('bid2', '<f8'), ('ask2', '<f8'),
+])
+
+TICK_CHUNK_ROWS = 250_000
+TICK_FETCH_WINDOW = timedelta(hours=1)
+
+
+def iter_tick_chunks(symbol: str, start: datetime, end: datetime,
+                     chunk_rows: int = TICK_CHUNK_ROWS,
+                     fetch_window: timedelta = TICK_FETCH_WINDOW) -> Iterator[np.ndarray]:
+    """
+    Yield ticks for ``symbol`` in [start, end) as TICK_DTYPE arrays of ``chunk_rows``
+    rows (the last chunk may be shorter). Peak memory is one chunk plus one fetch window.
+    """
+    buffer = np.empty(chunk_rows, dtype=TICK_DTYPE)
+    filled = 0
+    current = start
+
+    while current < end:
+        window_end = min(current + fetch_window, end)
+        raw = mt5.copy_ticks_range(symbol, current, window_end, mt5.COPY_TICKS_ALL)
+        if raw is None:
+            raise ValueError(f"Failed to fetch ticks for {symbol}")
+
+        if len(raw):
+            # copy_ticks_range is inclusive of both ends; drop the window_end boundary,
+            # it is the first tick of the next window
+            end_msc = int(_epoch_ms(window_end))
+            raw = raw[raw['time_msc'] < end_msc] if window_end < end else raw
+
+        offset = 0
+        while offset < len(raw):
+            take = min(chunk_rows - filled, len(raw) - offset)
+            part = raw[offset:offset + take]
+            for field in TICK_DTYPE.names:
+                buffer[field][filled:filled + take] = part[field]
+            filled += take
+            offset += take
+            if filled == chunk_rows:
+                yield buffer.copy()
+                filled = 0
+
+        current = window_end
+
+    if filled:
+        yield buffer[:filled].copy()
+
+
+def _epoch_ms(value: datetime) -> float:
+    """Milliseconds since epoch; naive datetimes are UTC, matching MT5 bar times."""
+    if value.tzinfo is None:
+        return (value - datetime(1970, 1, 1)).total_seconds() * 1000
+    return value.timestamp() * 1000
+
+
+def merge_tick_streams(stream1: Iterator[np.ndarray], stream2: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+    """
+    Merge two time-sorted tick streams into MERGED_TICK_DTYPE chunks.
+
+    Every output row is a tick of either symbol, carrying the latest bid/ask of
+    both symbols as of that time. Rows before both symbols have quoted are dropped.
+    Only rows up to the earliest buffered time of the two streams are emitted per
+    step, so ordering holds across chunk boundaries.
+    """
+    streams = [stream1, stream2]
+    buffers = [np.empty(0, dtype=TICK_DTYPE), np.empty(0, dtype=TICK_DTYPE)]
+    done = [False, False]
+    last_quote = [(np.nan, np.nan), (np.nan, np.nan)]
+
+    while True:
+        for k in (0, 1):
+            if not done[k] and len(buffers[k]) == 0:
+                chunk = next(streams[k], None)
+                if chunk is None:
+                    done[k] = True
+                else:
+                    buffers[k] = chunk
+
+        if all(len(b) == 0 for b in buffers) and all(done):
+            return
+
+        horizon = min(
+            buffers[k]['time_msc'][-1] if not done[k] else np.iinfo(np.int64).max
+            for k in (0, 1)
+        )
+        taken = []
+        for k in (0, 1):
+            cut = np.searchsorted(buffers[k]['time_msc'], horizon, side='right')
+            taken.append(buffers[k][:cut])
+            buffers[k] = buffers[k][cut:]
+
+        n1, n2 = len(taken[0]), len(taken[1])
+        if n1 + n2 == 0:
+            continue
+
+        times = np.concatenate((taken[0]['time_msc'], taken[1]['time_msc']))
+        order = np.argsort(times, kind='stable')
+        from_first = order < n1
+
+        merged = np.empty(n1 + n2, dtype=MERGED_TICK_DTYPE)
+        merged['time_msc'] = times[order]
+        for k, (bid_field, ask_field) in enumerate((('bid1', 'ask1'), ('bid2', 'ask2'))):
+            mine = from_first if k == 0 else ~from_first
+            # Position of the latest tick of this symbol at or before each merged row
+            latest = np.cumsum(mine) - 1
+            bids = np.concatenate(([last_quote[k][0]], taken[k]['bid']))
+            asks = np.concatenate(([last_quote[k][1]], taken[k]['ask']))
+            merged[bid_field] = bids[latest + 1]
+            merged[ask_field] = asks[latest + 1]
+            if len(taken[k]):
+                last_quote[k] = (taken[k]['bid'][-1], taken[k]['ask'][-1])
+
+        valid = ~(np.isnan(merged['bid1']) | np.isnan(merged['bid2']))
+        if not valid.all():
+            merged = merged[valid]
+        if len(merged):
+            yield merged
+
+
+class TickThroughput:
+    """Counts ticks consumed and wall time spent so runs can report ticks/second."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.chunks = 0
+        self._started = time.perf_counter()
+
+    def count(self, chunk: np.ndarray) -> np.ndarray:
+        self.ticks += len(chunk)
+        self.chunks += 1
+        return chunk
+
+    def summary(self) -> Dict[str, float]:
+        seconds = time.perf_counter() - self._started
+        return {
+            'ticks': self.ticks,
+            'chunks': self.chunks,
+            'seconds': seconds,
+            'ticks_per_second': self.ticks / seconds if seconds > 0 else 0.0,
+        }
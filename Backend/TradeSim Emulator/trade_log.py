@@ -0,0 +1,200 @@
+"""
+Columnar trade log for backtests.
+
+Closed trades are appended as rows of a structured NumPy array that grows by
+doubling, instead of one dict per trade. Metrics, equity and plots read whole
+columns; only the rows a client actually asks for are turned into dicts (see
+``records``), and exports stream the table in fixed-size chunks as
+NDJSON, Arrow IPC or Parquet. pyarrow is only needed for the last two.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+TRADE_DTYPE = np.dtype([
+    ('entry_time', 'datetime64[ns]'),
+    ('exit_time', 'datetime64[ns]'),
+    ('long_pair', 'U16'),
+    ('short_pair', 'U16'),
+    ('long_entry_price', 'f8'),
+    ('long_exit_price', 'f8'),
+    ('short_entry_price', 'f8'),
+    ('short_exit_price', 'f8'),
+    ('long_lot', 'f8'),
+    ('short_lot', 'f8'),
+    ('entry_correlation', 'f8'),
+    ('exit_correlation', 'f8'),
+    ('entry_long_rsi', 'f8'),
+    ('entry_short_rsi', 'f8'),
+    ('exit_long_rsi', 'f8'),
+    ('exit_short_rsi', 'f8'),
+    ('trade_duration', 'f8'),
+    ('long_profit', 'f8'),
+    ('short_profit', 'f8'),
+    ('total_profit', 'f8'),
+])
+TRADE_FIELDS = TRADE_DTYPE.names
+TIME_FIELDS = ('entry_time', 'exit_time')
+# Fields of a trade that is still open
+ENTRY_FIELDS = ('entry_time', 'long_pair', 'short_pair', 'long_entry_price', 'short_entry_price',
+                'long_lot', 'short_lot', 'entry_correlation', 'entry_long_rsi', 'entry_short_rsi')
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+def _row(trade: Dict) -> tuple:
+    return tuple(
+        pd.Timestamp(trade[name]).to_datetime64() if name in TIME_FIELDS else trade.get(name, np.nan)
+        for name in TRADE_FIELDS
+    )
+
+
+class TradeTable:
+    def __init__(self, capacity: int = 64):
+        """
+        Parameters:
+            capacity: Rows allocated up front; doubled whenever it runs out
+        """
+        self._rows = np.zeros(capacity, dtype=TRADE_DTYPE)
+        self._size = 0
+
+    @classmethod
+    def from_records(cls, trades: Iterable[Dict]) -> 'TradeTable':
+        trades = list(trades)
+        table = cls(max(len(trades), 1))
+        for trade in trades:
+            table.append(trade)
+        return table
+
+    @classmethod
+    def from_array(cls, rows: np.ndarray) -> 'TradeTable':
+        """Table holding a copy of TRADE_DTYPE ``rows``."""
+        table = cls(max(len(rows), 1))
+        table._rows[:len(rows)] = rows
+        table._size = len(rows)
+        return table
+
+    def append(self, trade: Dict) -> None:
+        """Store a closed trade; keys outside TRADE_FIELDS are ignored."""
+        if self._size == len(self._rows):
+            # An unpickled table holds only its filled rows and may have no capacity left
+            grown = np.zeros(max(2 * len(self._rows), 64), dtype=TRADE_DTYPE)
+            grown[:self._size] = self._rows
+            self._rows = grown
+        self._rows[self._size] = _row(trade)
+        self._size += 1
+
+    @property
+    def array(self) -> np.ndarray:
+        """The filled rows (a view, not a copy)."""
+        return self._rows[:self._size]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(records(self.array))
+
+    def __getitem__(self, i: int) -> Dict:
+        return records(self.array[[i]])[0]
+
+    def __getstate__(self):
+        # Pickle (process pools, result cache) only the filled rows
+        return {'_rows': self.array.copy(), '_size': self._size}
+
+
+def as_trade_array(trades: Union[TradeTable, np.ndarray, Sequence[Dict]]) -> np.ndarray:
+    """Trades as a TRADE_DTYPE array, whether given as a table, an array or a list of dicts."""
+    if isinstance(trades, TradeTable):
+        return trades.array
+    if isinstance(trades, np.ndarray):
+        return trades
+    return TradeTable.from_records(trades).array
+
+
+def records(trades: np.ndarray, offset: int = 0, limit: Optional[int] = None) -> List[Dict]:
+    """Rows ``offset`` to ``offset + limit`` as dicts with Timestamps and Python scalars."""
+    trades = trades[offset:] if limit is None else trades[offset:offset + limit]
+    columns = {
+        name: (pd.DatetimeIndex(trades[name]) if name in TIME_FIELDS else trades[name].tolist())
+        for name in TRADE_FIELDS
+    }
+    return [{name: columns[name][i] for name in TRADE_FIELDS} for i in range(len(trades))]
+
+
+def iter_export(trades: np.ndarray, export_format: str, chunk_rows: int = 10000) -> Iterator[bytes]:
+    """Stream ``trades`` as ``export_format`` (see EXPORT_FORMATS), ``chunk_rows`` trades per chunk."""
+    if export_format == 'ndjson':
+        return _iter_ndjson(trades, chunk_rows)
+    if export_format in ('arrow', 'parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError(f"pyarrow is required for {export_format} export")
+        return _iter_arrow(trades, chunk_rows) if export_format == 'arrow' else _iter_parquet(trades, chunk_rows)
+    raise ValueError(f"Unknown export format '{export_format}'. Available: {list(EXPORT_FORMATS)}")
+
+
+def _iter_ndjson(trades: np.ndarray, chunk_rows: int) -> Iterator[bytes]:
+    for start in range(0, len(trades), chunk_rows):
+        # One JSON object per line, newline-terminated
+        chunk = pd.DataFrame(trades[start:start + chunk_rows])
+        yield chunk.to_json(orient='records', lines=True, date_format='iso', date_unit='s').encode()
+
+
+def _record_batch(trades: np.ndarray):
+    import pyarrow as pa
+    return pa.RecordBatch.from_arrays([pa.array(trades[name]) for name in TRADE_FIELDS], names=list(TRADE_FIELDS))
+
+
+class _Sink:
+    """Write target that hands back what was written since the last ``take``."""
+
+    def __init__(self):
+        self._chunks = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self._chunks = b''.join(self._chunks), []
+        return data
+
+
+def _iter_arrow(trades: np.ndarray, chunk_rows: int) -> Iterator[bytes]:
+    import pyarrow as pa
+
+    sink = _Sink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), _record_batch(trades[:0]).schema)
+    for start in range(0, len(trades), chunk_rows):
+        writer.write_batch(_record_batch(trades[start:start + chunk_rows]))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def _iter_parquet(trades: np.ndarray, chunk_rows: int) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _Sink()
+    # One row group per chunk; the footer is written on close
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), _record_batch(trades[:0]).schema)
+    for start in range(0, len(trades), chunk_rows):
+        writer.write_batch(_record_batch(trades[start:start + chunk_rows]))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
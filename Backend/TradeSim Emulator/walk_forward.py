@@ -0,0 +1,273 @@
+"""
+Walk-forward optimization of the paired correlation/RSI strategy.
+
+The backtest range is split into rolling windows: parameters are optimized on
+an in-sample window and traded, unchanged, on the out-of-sample window that
+follows it; the next pair of windows starts one out-of-sample length later. The
+out-of-sample windows tile the range after the first in-sample window, so their
+trades stitch into one equity curve that no parameter choice has seen.
+
+Bars and indicators are prepared once for the whole range (see
+``mt5_api._walk_forward_data``): one timeline of bars where both pairs trade,
+both closes, and the correlation and RSI arrays of every (correlationWindow,
+rsiPeriod) in the grid. A window is a pair of bar indices, and everything a
+window reads is a slice (a view) of those arrays. In a process pool each worker
+receives the arrays once, at start-up, and each task only its window bounds.
+
+Trades follow ``PairedTradingBacktester.run_backtest``: entry on an RSI
+divergence while the correlation is at or below the entry threshold, at most one
+entry per cooldown period, exit on the first later bar where the correlation is
+above the exit threshold and the trade is in profit, and trades still open at
+the end of a window are closed on its last bar.
+"""
+import itertools
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from equity_analytics import STANDARD_PIP_VALUE, exit_bar, mark_to_market, pip_size
+from trade_log import TRADE_DTYPE
+from worker_pool import spawn_pool, worker_data
+
+# Request fields that may be optimized; the first two change the indicator arrays
+INDICATOR_PARAMETERS = ('correlationWindow', 'rsiPeriod')
+SIGNAL_PARAMETERS = ('rsiOverbought', 'rsiOversold', 'entryThreshold', 'exitThreshold', 'cooldownPeriod')
+PARAMETERS = INDICATOR_PARAMETERS + SIGNAL_PARAMETERS
+OBJECTIVES = ('net_profit_dollars', 'sharpe_ratio', 'profit_factor', 'win_rate')
+
+
+def parameter_sets(base: Dict[str, float], grid: Dict[str, Sequence[float]]) -> List[Dict[str, float]]:
+    """Every combination of ``grid`` values, with the remaining parameters taken from ``base``."""
+    names = list(grid)
+    return [{**{name: base[name] for name in PARAMETERS}, **dict(zip(names, values))}
+            for values in itertools.product(*(grid[name] for name in names))]
+
+
+def window_bounds(times: np.ndarray, in_sample_days: float, out_of_sample_days: float) -> List[Tuple[int, int, int]]:
+    """
+    (in-sample start, out-of-sample start, out-of-sample end) bar indices of each
+    window over ``times`` (ascending datetime64). The last out-of-sample window
+    may be shorter than the others.
+    """
+    times = np.asarray(times).astype('datetime64[ns]')
+    in_sample = np.timedelta64(int(in_sample_days * 86400e9), 'ns')
+    out_of_sample = np.timedelta64(int(out_of_sample_days * 86400e9), 'ns')
+    windows = []
+    start = times[0]
+    while True:
+        is_lo, oos_lo, oos_hi = np.searchsorted(times, [start, start + in_sample, start + in_sample + out_of_sample])
+        if oos_lo >= len(times):
+            break
+        if oos_lo > is_lo and oos_hi > oos_lo:
+            windows.append((int(is_lo), int(oos_lo), int(oos_hi)))
+        start = start + out_of_sample
+    return windows
+
+
+def simulate(data: Dict, params: Dict[str, float], lo: int, hi: int) -> Dict[str, np.ndarray]:
+    """
+    Trades of one parameter set over bars [lo, hi) as arrays of entry bar, exit
+    bar (both relative to ``lo``), direction and dollar profit.
+    """
+    corr, rsi1, rsi2 = (values[lo:hi] for values in
+                        data['indicators'][(int(params['correlationWindow']), int(params['rsiPeriod']))])
+    close1, close2 = data['close1'][lo:hi], data['close2'][lo:hi]
+    times = data['time'][lo:hi]
+    overbought, oversold = params['rsiOverbought'], params['rsiOversold']
+
+    both_extreme = ((rsi1 > overbought) & (rsi2 > overbought)) | ((rsi1 < oversold) & (rsi2 < oversold))
+    allowed = (corr <= params['entryThreshold']) & ~both_extreme
+    long_pair2 = allowed & (rsi1 > overbought) & (rsi2 < oversold)
+    long_pair1 = allowed & ~long_pair2 & (rsi1 < oversold) & (rsi2 > overbought)
+    exit_signal = corr > params['exitThreshold']
+
+    candidates = np.flatnonzero(long_pair1 | long_pair2)
+    candidate_times = times[candidates]
+    cooldown = int(np.ceil(params['cooldownPeriod'] * 3600e9))
+    pair1, pair2 = data['pair1'], data['pair2']
+    pip1, pip2 = pip_size(pair1), pip_size(pair2)
+    lot1, lot2 = data['lots']
+
+    entries, exits = [], []
+    k = 0
+    while k < len(candidates):
+        i = int(candidates[k])
+        if long_pair1[i]:
+            long_pair, short_pair, long_close, short_close, long_lot, short_lot = pair1, pair2, close1, close2, lot1, lot2
+        else:
+            long_pair, short_pair, long_close, short_close, long_lot, short_lot = pair2, pair1, close2, close1, lot2, lot1
+        trade = {'long_pair': long_pair, 'short_pair': short_pair, 'long_entry_price': long_close[i],
+                 'short_entry_price': short_close[i], 'long_lot': long_lot, 'short_lot': short_lot}
+        exit_i = exit_bar(exit_signal, long_close, short_close, trade, i)
+        exits.append(len(exit_signal) - 1 if exit_i is None else exit_i)
+        entries.append(i)
+        # Next candidate outside the cooldown of this entry
+        k = max(k + 1, int(np.searchsorted(candidate_times, times[i] + cooldown, side='left')))
+
+    entries = np.asarray(entries, dtype=np.int64)
+    exits = np.asarray(exits, dtype=np.int64)
+    long1 = long_pair1[entries]
+    change1 = (close1[exits] - close1[entries]) / pip1 * STANDARD_PIP_VALUE
+    change2 = (close2[exits] - close2[entries]) / pip2 * STANDARD_PIP_VALUE
+    profit1 = np.where(long1, change1 * lot1, -change1 * lot1)
+    profit2 = np.where(long1, -change2 * lot2, change2 * lot2)
+    return {'entry': entries, 'exit': exits, 'long_pair1': long1, 'profit1': profit1, 'profit2': profit2,
+            'profit': profit1 + profit2}
+
+
+def trade_metrics(profits: np.ndarray) -> Dict[str, float]:
+    """Closed-trade metrics, computed as in PairedTradingBacktester.calculate_performance_metrics."""
+    profits = np.asarray(profits, dtype=np.float64)
+    if len(profits) == 0:
+        return {'total_trades': 0, 'net_profit_dollars': 0.0, 'sharpe_ratio': 0.0, 'profit_factor': 0.0,
+                'win_rate': 0.0}
+    gains = float(profits[profits > 0].sum())
+    losses = float(-profits[profits <= 0].sum())
+    sharpe_ratio = np.sqrt(252) * profits.mean() / profits.std(ddof=1) if len(profits) > 1 else 0.0
+    return {
+        'total_trades': int(len(profits)),
+        'net_profit_dollars': float(profits.sum()),
+        'sharpe_ratio': 0.0 if not np.isfinite(sharpe_ratio) else float(sharpe_ratio),
+        'profit_factor': gains / losses if losses != 0 else 999999.0,
+        'win_rate': float((profits > 0).mean()),
+    }
+
+
+def optimize_window(data: Dict, candidates: List[Dict[str, float]], window: Tuple[int, int, int],
+                    objective: str, min_trades: int) -> Dict:
+    """
+    Best of ``candidates`` on the window's in-sample bars and its trades on the
+    out-of-sample bars. Parameter sets with fewer than ``min_trades`` in-sample
+    trades are not eligible; if none is, the window does not trade.
+    """
+    is_lo, oos_lo, oos_hi = window
+    best, best_metrics = None, None
+    for params in candidates:
+        metrics = trade_metrics(simulate(data, params, is_lo, oos_lo)['profit'])
+        if metrics['total_trades'] < min_trades:
+            continue
+        if best is None or metrics[objective] > best_metrics[objective]:
+            best, best_metrics = params, metrics
+
+    trades = simulate(data, best, oos_lo, oos_hi) if best is not None else None
+    times, bar = data['time'], data['time'][1] - data['time'][0]
+    return {
+        'window': window,
+        # Calendar days of each part, counting its last bar as a full bar
+        'days': tuple(float((times[hi - 1] - times[lo] + bar) / np.timedelta64(1, 'D'))
+                      for lo, hi in ((is_lo, oos_lo), (oos_lo, oos_hi))),
+        'params': best,
+        'in_sample': best_metrics,
+        'out_of_sample': trade_metrics(trades['profit'] if trades is not None else []),
+        'trades': trades,
+    }
+
+
+def _optimize_window_job(candidates, window, objective, min_trades) -> Dict:
+    return optimize_window(worker_data(), candidates, window, objective, min_trades)
+
+
+def run_windows(data: Dict, candidates: List[Dict[str, float]], windows: List[Tuple[int, int, int]],
+                objective: str = 'net_profit_dollars', min_trades: int = 1, processes: int = 1) -> List[Dict]:
+    """``optimize_window`` for every window, spread over ``processes`` worker processes."""
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}'. Available: {list(OBJECTIVES)}")
+    workers = min(processes, len(windows))
+    if workers <= 1:
+        return [optimize_window(data, candidates, window, objective, min_trades) for window in windows]
+    with spawn_pool(workers, data) as executor:
+        return list(executor.map(_optimize_window_job, itertools.repeat(candidates), windows,
+                                 itertools.repeat(objective), itertools.repeat(min_trades)))
+
+
+def _trade_rows(data: Dict, params: Dict[str, float], trades: Dict[str, np.ndarray], lo: int) -> np.ndarray:
+    """Trades of one out-of-sample window as TRADE_DTYPE rows."""
+    corr, rsi1, rsi2 = data['indicators'][(int(params['correlationWindow']), int(params['rsiPeriod']))]
+    entry, exit_ = trades['entry'] + lo, trades['exit'] + lo
+    long1 = trades['long_pair1']
+    lot1, lot2 = data['lots']
+
+    def by_side(on_pair1, on_pair2, long_side: bool):
+        return np.where(long1 == long_side, on_pair1, on_pair2)
+
+    rows = np.zeros(len(entry), dtype=TRADE_DTYPE)
+    rows['entry_time'] = data['time'][entry]
+    rows['exit_time'] = data['time'][exit_]
+    rows['long_pair'] = by_side(data['pair1'], data['pair2'], True)
+    rows['short_pair'] = by_side(data['pair1'], data['pair2'], False)
+    rows['long_entry_price'] = by_side(data['close1'][entry], data['close2'][entry], True)
+    rows['long_exit_price'] = by_side(data['close1'][exit_], data['close2'][exit_], True)
+    rows['short_entry_price'] = by_side(data['close1'][entry], data['close2'][entry], False)
+    rows['short_exit_price'] = by_side(data['close1'][exit_], data['close2'][exit_], False)
+    rows['long_lot'] = by_side(lot1, lot2, True)
+    rows['short_lot'] = by_side(lot1, lot2, False)
+    rows['entry_correlation'] = corr[entry]
+    rows['exit_correlation'] = corr[exit_]
+    rows['entry_long_rsi'] = by_side(rsi1[entry], rsi2[entry], True)
+    rows['entry_short_rsi'] = by_side(rsi1[entry], rsi2[entry], False)
+    rows['exit_long_rsi'] = by_side(rsi1[exit_], rsi2[exit_], True)
+    rows['exit_short_rsi'] = by_side(rsi1[exit_], rsi2[exit_], False)
+    rows['trade_duration'] = (rows['exit_time'] - rows['entry_time']) / np.timedelta64(1, 'h')
+    rows['long_profit'] = by_side(trades['profit1'], trades['profit2'], True)
+    rows['short_profit'] = by_side(trades['profit1'], trades['profit2'], False)
+    rows['total_profit'] = trades['profit']
+    return rows
+
+
+def stitch(data: Dict, results: List[Dict], initial_balance: float) -> Dict[str, np.ndarray]:
+    """Out-of-sample trades of all windows and their mark-to-market equity on the out-of-sample bars."""
+    first, last = results[0]['window'][1], results[-1]['window'][2]
+    trades = np.concatenate([np.zeros(0, dtype=TRADE_DTYPE)] + [
+        _trade_rows(data, result['params'], result['trades'], result['window'][1])
+        for result in results if result['trades'] is not None])
+    timeline = data['time'][first:last]
+    prices = {data['pair1']: data['close1'][first:last], data['pair2']: data['close2'][first:last]}
+    pnl = mark_to_market(timeline, prices, trades)['pnl']
+    return {'timeline': timeline, 'equity': initial_balance + pnl, 'trades': trades}
+
+
+def stability_report(results: List[Dict], optimized: Sequence[str]) -> Dict:
+    """
+    How much the chosen parameters move between windows, and how in-sample
+    performance carries over out of sample.
+
+    Per optimized parameter: the value chosen in each window, how many distinct
+    values were chosen, the most frequent one and its share of windows, and the
+    mean, standard deviation and relative standard deviation of the choices.
+    ``walk_forward_efficiency`` is out-of-sample profit per day over in-sample
+    profit per day, summed over the windows that traded.
+    """
+    traded = [result for result in results if result['params'] is not None]
+    parameters = {}
+    for name in optimized:
+        values = np.array([result['params'][name] for result in traded], dtype=np.float64)
+        if len(values) == 0:
+            parameters[name] = {'values': [], 'distinct': 0, 'mode': None, 'mode_share': 0.0,
+                                'mean': None, 'std': None, 'relative_std': None}
+            continue
+        distinct, counts = np.unique(values, return_counts=True)
+        mean, std = float(values.mean()), float(values.std())
+        parameters[name] = {
+            'values': values.tolist(),
+            'distinct': int(len(distinct)),
+            'mode': float(distinct[np.argmax(counts)]),
+            'mode_share': float(counts.max() / len(values)),
+            'mean': mean,
+            'std': std,
+            'relative_std': std / abs(mean) if mean != 0 else None,
+        }
+
+    efficiency = None
+    if traded:
+        in_sample = sum(r['in_sample']['net_profit_dollars'] for r in traded) / sum(r['days'][0] for r in traded)
+        out_of_sample = sum(r['out_of_sample']['net_profit_dollars'] for r in traded) / sum(r['days'][1] for r in traded)
+        efficiency = out_of_sample / in_sample if in_sample > 0 else None
+
+    return {
+        'windows': len(results),
+        'windows_traded': len(traded),
+        'profitable_windows': float(np.mean([r['out_of_sample']['net_profit_dollars'] > 0 for r in traded]))
+                              if traded else 0.0,
+        'walk_forward_efficiency': efficiency,
+        'parameters': parameters,
+    }
@@ -0,0 +1,28 @@
+"""
+Process pools whose workers all read the same large, read-only data.
+
+The data (prepared arrays, loaded closes) is sent to each worker once, when the
+worker starts, and kept in a module global; tasks then carry only their own
+small arguments and read the data through ``worker_data``. Workers are spawned,
+not forked, so they never inherit MT5 connections or locks.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+_worker_data = None
+
+
+def init_worker(data) -> None:
+    global _worker_data
+    _worker_data = data
+
+
+def worker_data():
+    """The data this worker process was started with."""
+    return _worker_data
+
+
+def spawn_pool(workers: int, data) -> ProcessPoolExecutor:
+    """Pool of ``workers`` spawned processes, each started with ``data``."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                               initializer=init_worker, initargs=(data,))
@@ -3,6 +3,32 @@ import useStore from '../../stores/useStore';
 import html2canvas from 'html2canvas';
 import { jsPDF } from 'jspdf';
 import axios from 'axios';
+import {
+    Chart as ChartJS,
+    CategoryScale,
+    LinearScale,
+    PointElement,
+    LineElement,
+    Title,
+    Tooltip,
+    Legend
+} from 'chart.js';
+import { Line } from 'react-chartjs-2';
+
+ChartJS.register(CategoryScale, LinearScale, PointElement, LineElement, Title, Tooltip, Legend);
+
+// Index of the series point closest in time to t (series times are sorted)
+const nearestIndex = (times, t) => {
+    let lo = 0;
+    let hi = times.length - 1;
+    while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (times[mid] < t) lo = mid + 1;
+        else hi = mid;
+    }
+    return lo > 0 && t - times[lo - 1] < times[lo] - t ? lo - 1 : lo;
+};
+
 const Analytics = () => {
     const { strategyToBackTest, setStrategyToBackTest, accountInfo, setIsLoading } = useStore((state) => state);
     const [startDate, setStartDate] = useState('');
@@ -11,6 +37,45 @@ const Analytics = () => {
     const [reportData, setReportData] = useState(false);
     const [dataRange, setDataRange] = useState([]);
     const [hasCalledApi, setHasCalledApi] = useState(false);
+    const [correlationSeries, setCorrelationSeries] = useState(null);
+
+    useEffect(() => {
+        if (!backtestData?.result_id) return;
+        // Downsampled server-side to about one point per pixel of the chart
+        axios.get(`http://localhost:5001/mt5/backtest-results/${backtestData.result_id}/series/correlation`, {
+            params: { width: Math.min(window.innerWidth, 2000) }
+        })
+            .then((response) => setCorrelationSeries(response.data))
+            .catch((error) => console.error('Error fetching correlation series:', error));
+    }, [backtestData?.result_id]);
+
+    // The backtest response carries the first page of trades; fetch the rest on demand
+    const loadMoreTrades = () => {
+        axios.get(`http://localhost:5001/mt5/backtest-results/${backtestData.result_id}/trades`, {
+            params: { offset: backtestData.trades.length, limit: 500 }
+        })
+            .then((response) => setBacktestData((prev) => ({ ...prev, trades: [...prev.trades, ...response.data.trades] })))
+            .catch((error) => console.error('Error fetching trades:', error));
+    };
+
+    const getCorrelationChartData = () => {
+        const { t, v, entries, exits, thresholds } = correlationSeries;
+        const markers = (points) => {
+            const data = new Array(t.length).fill(null);
+            points.t.forEach((time, i) => { data[nearestIndex(t, time)] = points.v[i]; });
+            return data;
+        };
+        return {
+            labels: t.map((time) => new Date(time * 1000).toLocaleString()),
+            datasets: [
+                { label: 'Correlation', data: v, borderColor: 'blue', borderWidth: 1, pointRadius: 0 },
+                { label: `Entry Threshold (${thresholds.entry})`, data: t.map(() => thresholds.entry), borderColor: 'red', borderDash: [6, 4], borderWidth: 1, pointRadius: 0 },
+                { label: `Exit Threshold (${thresholds.exit})`, data: t.map(() => thresholds.exit), borderColor: 'green', borderDash: [6, 4], borderWidth: 1, pointRadius: 0 },
+                { label: 'Trade Entry', data: markers(entries), showLine: false, pointStyle: 'triangle', pointRadius: 6, backgroundColor: 'green', borderColor: 'green' },
+                { label: 'Trade Exit', data: markers(exits), showLine: false, pointStyle: 'triangle', rotation: 180, pointRadius: 6, backgroundColor: 'red', borderColor: 'red' },
+            ],
+        };
+    };
 
     useEffect(() => {
         const fetchDataSequentially = async () => {
@@ -267,6 +332,7 @@ const Analytics = () => {
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Net Profit Dollars</th>
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Max Drawdown</th>
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Max Drawdown Percentage</th>
+                                <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Max Time Under Water</th>
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Profit Factor</th>
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Sharpe Ratio</th>
                                 <th style={{borderBottom: backtestData.metrics ? '1px solid #ccc' : 'none', fontWeight: '500', color: 'grey'}}>Final Balance</th>
@@ -279,6 +345,7 @@ const Analytics = () => {
                                 <td style={{textAlign: 'center'}}>{"$" + backtestData.metrics && backtestData?.metrics?.net_profit_dollars.toFixed(2)}</td>
                                 <td style={{textAlign: 'center'}}>{"$" + backtestData.metrics && backtestData?.metrics?.max_drawdown_dollars.toFixed(2)}</td>
                                 <td style={{textAlign: 'center'}}>{backtestData.metrics && backtestData?.metrics?.max_drawdown_percentage.toFixed(2) + "%"}</td>
+                                <td style={{textAlign: 'center'}}>{backtestData.metrics && (backtestData?.metrics?.max_time_under_water_hours ?? 0).toFixed(1) + "h"}</td>
                                 <td style={{textAlign: 'center'}}>{backtestData.metrics && backtestData?.metrics?.profit_factor.toFixed(2)}</td>
                                 <td style={{textAlign: 'center'}}>{backtestData.metrics && backtestData?.metrics?.sharpe_ratio.toFixed(2)}</td>
                                 <td style={{textAlign: 'center'}}>{"$" + backtestData.metrics && backtestData?.metrics?.final_balance.toFixed(2)}</td>
@@ -308,7 +375,7 @@ const Analytics = () => {
                                 <td style={{textAlign: 'center'}}>{backtestData?.metrics?.losing_trades}</td>
                                 <td style={{textAlign: 'center'}}>{backtestData.metrics && backtestData?.metrics?.win_rate.toFixed(2)*100 + "%"}</td>
                                 <td style={{textAlign: 'center'}}>{backtestData?.metrics?.avg_trade_duration.toFixed(2)}</td>
-                                <td style={{textAlign: 'center'}}>{backtestData.trades && "$"+backtestData?.trades?.reduce((acc, trade) => acc + trade.total_profit, 0).toFixed(5)}</td>
+                                <td style={{textAlign: 'center'}}>{backtestData.metrics && "$"+backtestData?.metrics?.net_profit_dollars.toFixed(5)}</td>
                             </tr>
                         </tbody>
                     </table>
@@ -348,25 +415,32 @@ const Analytics = () => {
                         </tbody>
                     </table>
                 </div>
+                {backtestData?.result_id && <div style={{ display: 'flex', flexDirection: 'row', gap: '15px', padding: '10px 0', alignItems: 'center' }}>
+                    <span style={{ color: 'grey' }}>{backtestData.trades.length} of {backtestData.trade_count ?? backtestData.trades.length} trades</span>
+                    {backtestData.trades.length < (backtestData.trade_count ?? 0) && <button onClick={() => loadMoreTrades()} style={{ cursor: 'pointer', backgroundColor: 'green', border: 'none', borderRadius: '5px', color: 'white', width: '120px', height: '30px' }}>Load More</button>}
+                    {['ndjson', 'arrow', 'parquet'].map((format) => (
+                        <a key={format} href={`http://localhost:5001/mt5/backtest-results/${backtestData.result_id}/trades/export?format=${format}`}>Export {format.toUpperCase()}</a>
+                    ))}
+                </div>}
             </div>
-            {backtestData?.correlation_timeline_plot !== null && backtestData?.correlation_timeline_plot !== undefined && <div style={{ display: 'flex', flexDirection: 'column', justifyContent: 'space-between', width: '100%', padding: '20px 10px', alignItems: 'flex-start' }}>
+            {backtestData?.result_id && <div style={{ display: 'flex', flexDirection: 'column', justifyContent: 'space-between', width: '100%', padding: '20px 10px', alignItems: 'flex-start' }}>
                 <h3>Correlation Timeline</h3>
                     <div style={{ width: '100%', border: '1px solid #ccc', borderRadius: '5px', display: 'flex', justifyContent: 'center', alignItems: 'center'}}>
-                    <img src={`data:image/png;base64,${backtestData?.correlation_timeline_plot}`} alt="Chart" style={{ maxHeight: '500px', objectFit: 'contain' }} />                
+                    {correlationSeries && <Line data={getCorrelationChartData()} options={{ animation: false, scales: { y: { min: -1, max: 1 } }, plugins: { title: { display: true, text: `Correlation Timeline: ${strategyToBackTest?.currencyPairs?.[0]} vs ${strategyToBackTest?.currencyPairs?.[1]}` } } }} />}
                 </div>
             </div>}
                 <div style={{ display: 'flex', flexDirection: 'row', justifyContent: 'space-between', width: '100%', padding: '20px 10px', alignItems: 'flex-start'}}>
                     <div style={{display: 'flex', flexDirection: 'row', justifyContent: 'space-between', width: '100%', padding: '20px 10px', alignItems: 'flex-start', border: '1px solid #ccc', borderRadius: '5px'}}>
-                        {backtestData?.correlation_vs_profit_plot !== null && backtestData?.correlation_vs_profit_plot !== undefined && <div style={{ width: '50%', padding: '20px 10px', alignItems: 'flex-start' }}>
+                        {backtestData?.result_id && <div style={{ width: '50%', padding: '20px 10px', alignItems: 'flex-start' }}>
                 <h3>Correlation vs Profit</h3>
                             <div style={{ width: '100%', display: 'flex', justifyContent: 'center', alignItems: 'center', marginLeft: '10px'}}>
-                                <img src={`data:image/png;base64,${backtestData?.correlation_vs_profit_plot}`} alt="Chart" style={{ maxHeight: '400px', objectFit: 'contain' }} />                
+                                <img src={`http://localhost:5001/mt5/backtest-results/${backtestData.result_id}/plots/correlation-vs-profit?dpi=100`} alt="Chart" style={{ maxHeight: '400px', objectFit: 'contain' }} />                
                 </div>
             </div>}
-                        {backtestData?.equity_curve_plot !== null && backtestData?.equity_curve_plot !== undefined && <div style={{ width: '50%', padding: '20px 10px', alignItems: 'flex-start' }}>
+                        {backtestData?.result_id && backtestData?.trades?.length > 0 && <div style={{ width: '50%', padding: '20px 10px', alignItems: 'flex-start' }}>
                 <h3>Equity Curve</h3>
                             <div style={{ width: '100%', display: 'flex', justifyContent: 'center', alignItems: 'center', marginLeft: '10px'}}>
-                                <img src={`data:image/png;base64,${backtestData?.equity_curve_plot}`} alt="Chart" style={{ maxHeight: '400px', objectFit: 'contain' }} />                
+                                <img src={`http://localhost:5001/mt5/backtest-results/${backtestData.result_id}/plots/equity-curve?dpi=100`} alt="Chart" style={{ maxHeight: '400px', objectFit: 'contain' }} />                
                 </div>
             </div>}
                     </div>